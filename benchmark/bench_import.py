@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+# @Author: Lewis Tian
+# @Date:   2026-10-20 10:05:47
+# @Desc:   用 python -X importtime 统计各入口脚本的导入耗时，超出预算时以非零状态码退出
+#
+# 用法：
+#   python benchmark/bench_import.py
+#   python benchmark/bench_import.py jingdong/bean.py --top 15
+#   python benchmark/bench_import.py --scale 2  # 较慢的机器上放宽预算
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+from typing import Dict, List, NamedTuple, Set, Tuple
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# 入口脚本 -> 导入耗时预算（毫秒，解释器启动之外的模块 -X importtime self 时间之和）
+BUDGETS_MS = {
+    "jingdong/bean.py": 80,
+    "ctrip/sign.py": 80,
+    "xiaomi/battery.py": 80,
+    "pixiv/ranking.py": 280,
+    "weibo/album.py": 380,
+}
+DEFAULT_BUDGET_MS = 300
+# 这些模块较重，报告中单独列出是否被导入
+HEAVY_MODULES = ["aiohttp", "requests", "pydantic", "numpy", "bitarray", "inspect"]
+LINE_PATTERN = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+class ImportEntry(NamedTuple):
+    name: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def import_command(entry: str) -> List[str]:
+    """
+    导入入口脚本但不执行 __main__ 部分：把脚本所在目录加入 sys.path 后按模块名导入
+    """
+    dirname, filename = os.path.split(entry)
+    module = os.path.splitext(filename)[0]
+    code = (
+        f"import sys; sys.path.insert(0, {os.path.join(project_root, dirname)!r}); "
+        f"import {module}"
+    )
+    return [sys.executable, "-X", "importtime", "-c", code]
+
+
+def measure(entry: str) -> Tuple[List[ImportEntry], float]:
+    """
+    返回:
+        Tuple[List[ImportEntry], float]: (导入明细, 进程总耗时秒数)
+    """
+    return run_importtime(import_command(entry), entry)
+
+
+def run_importtime(cmd: List[str], label: str) -> Tuple[List[ImportEntry], float]:
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=project_root, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if proc.returncode:
+        raise RuntimeError(f"import {label} failed:\n{proc.stderr[-2000:]}")
+
+    entries = []
+    for line in proc.stderr.splitlines():
+        match = LINE_PATTERN.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append(
+                ImportEntry(name, int(self_us), int(cumulative_us), len(indent) // 2)
+            )
+    return entries, elapsed
+
+
+def startup_modules() -> Set[str]:
+    """
+    解释器启动时（site、.pth 文件）就会导入的模块，与入口脚本无关，不计入预算
+    """
+    entries, _ = run_importtime([sys.executable, "-X", "importtime", "-c", "pass"], "")
+    return {e.name for e in entries}
+
+
+def report(
+    entry: str, entries: List[ImportEntry], elapsed: float, budget: float, top: int
+) -> bool:
+    total_ms = sum(e.self_us for e in entries) / 1000
+    ok = total_ms <= budget
+    imported = {e.name for e in entries}
+    heavy = [m for m in HEAVY_MODULES if m in imported]
+
+    status = "✅" if ok else "❌"
+    print(
+        f"{status} {entry}: {total_ms:.1f}ms / budget {budget:.0f}ms, "
+        f"process {elapsed * 1000:.0f}ms, {len(entries)} modules"
+    )
+    print(f"   heavy: {', '.join(heavy) or '-'}")
+    # 只列出顶层导入，避免同一段耗时在父子模块中重复出现
+    roots = sorted((e for e in entries if e.depth == 1), key=lambda e: -e.cumulative_us)
+    for e in roots[:top]:
+        print(f"   {e.cumulative_us / 1000:8.1f}ms  {e.name}")
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="入口脚本导入耗时预算")
+    parser.add_argument("entries", nargs="*", help="入口脚本，默认全部")
+    parser.add_argument("--top", type=int, default=8, help="列出最慢的顶层导入数")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数，取最小值")
+    parser.add_argument("--scale", type=float, default=1.0, help="预算倍数")
+    args = parser.parse_args()
+
+    budgets: Dict[str, float] = {
+        entry: BUDGETS_MS.get(entry, DEFAULT_BUDGET_MS) * args.scale
+        for entry in (args.entries or BUDGETS_MS)
+    }
+
+    failed = []
+    baseline = startup_modules()
+    for entry, budget in budgets.items():
+        # 第一次运行会生成 .pyc，结果不计入
+        measure(entry)
+        runs = []
+        for _ in range(args.repeat):
+            entries, elapsed = measure(entry)
+            runs.append(([e for e in entries if e.name not in baseline], elapsed))
+        entries, elapsed = min(runs, key=lambda r: sum(e.self_us for e in r[0]))
+        if not report(entry, entries, elapsed, budget, args.top):
+            failed.append(entry)
+
+    if failed:
+        print(f"❌ over budget: {', '.join(failed)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
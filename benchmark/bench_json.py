@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+# @Author: Lewis Tian
+# @Date:   2026-10-20 17:41:26
+# @Desc:   对比响应解析的写法：json.loads + model_validate（原来的写法）、
+#           orjson.loads + model_validate、model_validate_json（utils/jsoner）
+#
+# 用构造的响应模拟各接口的一页数据，输出每页的解析耗时
+#
+# 用法：python benchmark/bench_json.py --number 200
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+# 添加项目根目录到 sys.path，确保能导入 bootstrap.py
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+import bootstrap  # noqa: F401, E402
+from model.pixiv_illustration import (  # noqa: E402
+    PixivBody,
+    PixivItemUrlInfo,
+    PixivResponse,
+    PixivUserTopBody,
+    PixivUserTopItem,
+)
+from model.weibo_album import AlbumResponse  # noqa: E402
+from utils.jsoner import decode, loads, orjson  # noqa: E402
+
+
+def ranking_page(size: int) -> bytes:
+    contents = [
+        {
+            "title": f"作品 {i}",
+            "url": f"https://i.pximg.net/c/240x480/img-master/img/{i}_p0.jpg",
+            "illust_type": "0",
+            "user_name": f"画师 {i}",
+            "illust_id": 100000000 + i,
+            "user_id": 2000000 + i,
+            "illust_page_count": 1 + i % 3,
+            "tags": ["オリジナル", "女の子", "風景"],
+            "width": 1200,
+            "height": 1800,
+            "rank": i + 1,
+            "yes_rank": i + 3,
+        }
+        for i in range(size)
+    ]
+    return json.dumps(
+        {
+            "date": "20261020",
+            "prev_date": "20261019",
+            "page": 1,
+            "mode": "daily",
+            "contents": contents,
+        },
+        ensure_ascii=False,
+    ).encode()
+
+
+def user_top_page(size: int) -> bytes:
+    illusts = {
+        str(100000000 + i): {
+            "id": str(100000000 + i),
+            "title": f"作品 {i}",
+            "illustType": 0,
+            "url": f"https://i.pximg.net/c/250x250/img-master/img/{i}_p0.jpg",
+            "tags": ["オリジナル", "女の子"],
+            "userId": "2000000",
+            "userName": "画师",
+            "pageCount": 1,
+            "bookmarkData": None,
+        }
+        for i in range(size)
+    }
+    return json.dumps(
+        {"error": False, "message": "", "body": {"illusts": illusts, "manga": []}},
+        ensure_ascii=False,
+    ).encode()
+
+
+def illust_page() -> bytes:
+    body = {
+        "illustId": "100000000",
+        "title": "作品",
+        "viewCount": 12345,
+        "likeCount": 678,
+        "bookmarkCount": 910,
+        "pageCount": 1,
+        "urls": {
+            k: f"https://i.pximg.net/{k}/img/100000000_p0.jpg"
+            for k in ("mini", "thumb", "small", "regular", "original")
+        },
+        "description": "说明" * 200,
+        "tags": {"tags": [{"tag": f"tag{i}"} for i in range(20)]},
+    }
+    return json.dumps(
+        {"error": False, "message": "", "body": body}, ensure_ascii=False
+    ).encode()
+
+
+def album_page(size: int) -> bytes:
+    photos = [
+        {
+            "photo_id": str(4900000000000000 + i),
+            "uid": 1234567890,
+            "pic_host": "https://wx1.sinaimg.cn",
+            "pic_name": f"{i:032x}.jpg",
+            "caption_render": "说明" * 20,
+            "timestamp": 1792400000 - i * 60,
+        }
+        for i in range(size)
+    ]
+    return json.dumps(
+        {
+            "result": True,
+            "code": 0,
+            "data": {"total": 1000, "photo_list": photos},
+        },
+        ensure_ascii=False,
+    ).encode()
+
+
+def old_user_top(data: bytes) -> Dict[int, PixivUserTopItem]:
+    # 原来的写法：逐个作品校验
+    illusts = json.loads(data).get("body", {}).get("illusts", {})
+    return {int(k): PixivUserTopItem.model_validate(v) for k, v in illusts.items()}
+
+
+def orjson_user_top(data: bytes) -> Dict[int, PixivUserTopItem]:
+    return PixivBody[PixivUserTopBody].model_validate(loads(data)).body.illusts
+
+
+# 名称 -> (响应, [(写法, 函数)])
+Case = Tuple[bytes, List[Tuple[str, Callable[[bytes], Any]]]]
+
+
+def build_cases() -> Dict[str, Case]:
+    def paths(model: Any, unwrap: Callable[[Any], Any], target: Any = None) -> list:
+        result = [
+            (
+                "json + model_validate",
+                lambda d: model.model_validate(unwrap(json.loads(d))),
+            ),
+        ]
+        if orjson is not None:
+            result.append(
+                (
+                    "orjson + model_validate",
+                    lambda d: model.model_validate(unwrap(loads(d))),
+                )
+            )
+        result.append(("model_validate_json", lambda d: decode(d, target or model)))
+        return result
+
+    def body(resp: dict) -> dict:
+        return resp.get("body", {})
+
+    return {
+        "ranking (50)": (ranking_page(50), paths(PixivResponse, lambda r: r)),
+        "user top (200)": (
+            user_top_page(200),
+            [
+                ("json + per-item validate", old_user_top),
+                ("orjson + bulk validate", orjson_user_top),
+                (
+                    "model_validate_json",
+                    lambda d: decode(d, PixivBody[PixivUserTopBody]).body.illusts,
+                ),
+            ],
+        ),
+        "illust info": (
+            illust_page(),
+            paths(PixivItemUrlInfo, body, PixivBody[PixivItemUrlInfo]),
+        ),
+        "album (30)": (album_page(30), paths(AlbumResponse, lambda r: r)),
+    }
+
+
+def bench(fn: Callable[[bytes], Any], data: bytes, number: int) -> float:
+    fn(data)  # 预热：构建 TypeAdapter、泛型模型等
+    start = time.perf_counter()
+    for _ in range(number):
+        fn(data)
+    return (time.perf_counter() - start) / number
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="响应解析耗时对比")
+    parser.add_argument("--number", type=int, default=200, help="每种写法的重复次数")
+    args = parser.parse_args()
+
+    if orjson is None:
+        print("⚠️ 未安装 orjson，跳过 orjson 的写法")
+    for name, (data, paths) in build_cases().items():
+        print(f"📦 {name}: {len(data) / 1024:.1f} KiB")
+        baseline = None
+        for label, fn in paths:
+            elapsed = bench(fn, data, args.number)
+            baseline = baseline or elapsed
+            print(
+                f"  {label:<26} {elapsed * 1e6:8.1f}us/page  x{baseline / elapsed:4.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# @Author: Lewis Tian
+# @Date:   2026-10-20 18:52:04
+# @Desc:   构造多年的排行榜历史，测试 pixiv/rank_archive 的写入和查询耗时
+#
+# 用法：python benchmark/bench_rank_archive.py --years 3 --size 100
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+# 添加项目根目录到 sys.path，确保能导入 bootstrap.py
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+for path in (project_root, os.path.join(project_root, "pixiv")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from rank_archive import RankArchive, to_day  # noqa: E402
+
+import bootstrap  # noqa: F401, E402
+from model.pixiv_illustration import PixivItem  # noqa: E402
+
+MODES = ["daily", "weekly", "monthly", "rookie", "original", "daily_ai"]
+
+
+def fake_page(rng: random.Random, size: int, users: int) -> list:
+    return [
+        PixivItem(
+            title="",
+            url="",
+            illust_type="0",
+            user_name="",
+            illust_id=rng.randrange(10**8, 2 * 10**8),
+            # 少数用户经常上榜
+            user_id=int(rng.paretovariate(1.2) * 1000) % users,
+            illust_page_count=1 + rng.randrange(3),
+            rank=rank,
+        )
+        for rank in range(1, size + 1)
+    ]
+
+
+def timed(label: str, fn, number: int = 5):
+    fn()
+    start = time.perf_counter()
+    for _ in range(number):
+        result = fn()
+    print(f"  {label:<36} {(time.perf_counter() - start) / number * 1000:8.2f}ms")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="排行榜历史归档的写入和查询耗时")
+    parser.add_argument("--years", type=int, default=3, help="构造多少年的数据")
+    parser.add_argument("--size", type=int, default=100, help="每个榜单的条数")
+    parser.add_argument("--users", type=int, default=50000, help="用户数")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    dirpath = tempfile.mkdtemp(prefix="bench_rank_archive_")
+    try:
+        archive = RankArchive(dirpath)
+        first = date(2026, 10, 20) - timedelta(days=365 * args.years)
+        days = [first + timedelta(days=i) for i in range(365 * args.years)]
+        start = time.perf_counter()
+        for day in days:
+            for mode in MODES:
+                page = fake_page(rng, args.size, args.users)
+                archive.append(day.strftime("%Y%m%d"), mode, page)
+        elapsed = time.perf_counter() - start
+        rows = len(days) * len(MODES) * args.size
+        print(
+            f"📦 {rows} rows, {len(archive.months())} months, "
+            f"append {elapsed / len(days) / len(MODES) * 1000:.2f}ms/page"
+        )
+
+        until = to_day(days[-1].strftime("%Y%m%d"))
+        timed("load all", lambda: archive.load())
+        timed(
+            "frequent users, 30 days",
+            lambda: archive.frequent_users(10, days=30, until=until),
+        )
+        users = timed(
+            "frequent users, all years",
+            lambda: archive.frequent_users(10, until=until),
+        )
+        timed(
+            "frequent users, 365 days, daily",
+            lambda: archive.frequent_users(10, 365, ["daily"], until),
+        )
+        illust_id = int(archive.load()["illust_id"][0])
+        timed("trajectory of an illust", lambda: archive.trajectory(illust_id))
+        print(f"👥 {len(users)} users ranked >= 10 times")
+    finally:
+        shutil.rmtree(dirpath, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+# @Author: Lewis Tian
+# @Date:   2026-10-19 18:02:13
+# @Desc:   对比旧的逐块下载写入与 utils/writer 的大缓冲区写入
+#
+# 用法：python benchmark/bench_writer.py --size-mb 8 --count 20
+
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, List
+
+import aiohttp
+import requests
+from aiohttp import web
+
+# 添加项目根目录到 sys.path，确保能导入 bootstrap.py
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+import bootstrap  # noqa: F401, E402
+from utils.writer import (  # noqa: E402
+    get_content_length,
+    write_stream,
+    write_stream_async,
+)
+
+HOST = "127.0.0.1"
+
+
+def start_server(payload: bytes, port: int) -> None:
+    """
+    在后台线程中启动一个只返回固定内容的 HTTP 服务
+    """
+
+    async def handler(request: web.Request) -> web.Response:
+        return web.Response(body=payload, content_type="image/jpeg")
+
+    async def serve() -> None:
+        app = web.Application()
+        app.router.add_get("/{name}", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, HOST, port).start()
+        await asyncio.Event().wait()
+
+    threading.Thread(target=lambda: asyncio.run(serve()), daemon=True).start()
+    for _ in range(100):
+        try:
+            requests.get(f"http://{HOST}:{port}/ping", timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.05)
+
+
+def sync_old(session: requests.Session, url: str, save_path: str) -> None:
+    response = session.get(url, stream=True)
+    with open(save_path, "wb") as f:
+        for chunk in response.iter_content(chunk_size=8192):
+            f.write(chunk)
+
+
+def sync_new(session: requests.Session, url: str, save_path: str) -> None:
+    response = session.get(url, stream=True)
+    response.raw.decode_content = True
+    write_stream(response.raw, save_path, get_content_length(response.headers))
+
+
+async def async_old(session: aiohttp.ClientSession, url: str, save_path: str) -> None:
+    async with session.get(url) as resp:
+        with open(save_path, "wb") as f:
+            while True:
+                chunk = await resp.content.read(1024)
+                if not chunk:
+                    break
+                f.write(chunk)
+
+
+async def async_new(session: aiohttp.ClientSession, url: str, save_path: str) -> None:
+    async with session.get(url) as resp:
+        await write_stream_async(resp.content, save_path, resp.content_length)
+
+
+def bench_sync(fn: Callable, urls: List[str], out_dir: str) -> float:
+    session = requests.Session()
+    start = time.perf_counter()
+    for i, url in enumerate(urls):
+        fn(session, url, os.path.join(out_dir, f"{i}.jpg"))
+    return time.perf_counter() - start
+
+
+async def bench_async(fn: Callable, urls: List[str], out_dir: str) -> tuple:
+    """
+    并发下载，同时用一个心跳协程测量事件循环的最大阻塞时间
+    """
+    max_lag = 0.0
+    done = False
+
+    async def heartbeat() -> None:
+        nonlocal max_lag
+        while not done:
+            t = time.perf_counter()
+            await asyncio.sleep(0.001)
+            max_lag = max(max_lag, time.perf_counter() - t - 0.001)
+
+    hb = asyncio.create_task(heartbeat())
+    start = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(
+            *(
+                fn(session, url, os.path.join(out_dir, f"{i}.jpg"))
+                for i, url in enumerate(urls)
+            )
+        )
+    elapsed = time.perf_counter() - start
+    done = True
+    await hb
+    return elapsed, max_lag
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="下载写入性能对比")
+    parser.add_argument("--size-mb", type=float, default=8, help="单个文件大小 MiB")
+    parser.add_argument("--count", type=int, default=20, help="文件数量")
+    parser.add_argument("--port", type=int, default=18931, help="本地服务端口")
+    args = parser.parse_args()
+
+    size = int(args.size_mb * 1024 * 1024)
+    start_server(os.urandom(size), args.port)
+    urls = [f"http://{HOST}:{args.port}/{i}.jpg" for i in range(args.count)]
+    total_mb = size * args.count / 1024 / 1024
+
+    out_dir = tempfile.mkdtemp(prefix="bench_writer_")
+    try:
+        print(f"📦 {args.count} x {args.size_mb} MiB = {total_mb:.0f} MiB")
+        for name, fn in [("sync  old 8KiB", sync_old), ("sync  writer", sync_new)]:
+            elapsed = bench_sync(fn, urls, out_dir)
+            print(f"{name:<16} {elapsed:7.3f}s {total_mb / elapsed:8.1f} MiB/s")
+
+        for name, fn in [("async old 1KiB", async_old), ("async writer", async_new)]:
+            elapsed, lag = asyncio.run(bench_async(fn, urls, out_dir))
+            print(
+                f"{name:<16} {elapsed:7.3f}s {total_mb / elapsed:8.1f} MiB/s"
+                f"  max loop lag {lag * 1000:6.1f}ms"
+            )
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
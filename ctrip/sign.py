@@ -3,12 +3,10 @@
 # @Date:   2025-04-23 19:45:02
 
 import argparse
-import json
 import os
 import sys
 from logging import Logger
-
-import requests
+from typing import List, Optional
 
 # 添加项目根目录到 sys.path，确保能导入 bootstrap.py
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
@@ -16,83 +14,139 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 import bootstrap  # noqa: F401, E402
-from model.ctrip_sign import CtripSignResponse  # noqa: E402
-from utils.csver import save_and_clean  # noqa: E402
-from utils.filer import update_readme_with_table  # noqa: E402
+from utils.checkin import (  # noqa: E402
+    JOB_TIMEOUT,
+    Account,
+    fetch_json,
+    parse_accounts,
+    run_check_in,
+    save_fire_report,
+    save_results,
+)
+from utils.filer import update_readme_with_series  # noqa: E402
+from utils.jobs import job  # noqa: E402
+from utils.lazy import lazy_import  # noqa: E402
 from utils.logger import get_logger  # noqa: E402
+from utils.precise import next_fire_at  # noqa: E402
 from utils.timer import get_today_timestamp  # noqa: E402
 
+# 真正签到时才导入 pydantic 模型，缺少 Cookie 提前退出或只被调度器发现时不必导入
+ctrip_sign = lazy_import("model.ctrip_sign")
+
+SIGN_URL = "https://m.ctrip.com/restapi/soa2/22769/signToday"
+# 用作账号名的 Cookie 字段
+ACCOUNT_KEYS = ("login_uid",)
+
 
-def sign(logger: Logger, cookie: str = "") -> int:
-    session = requests.Session()
-    url = "https://m.ctrip.com/restapi/soa2/22769/signToday"
+async def sign(session, logger: Logger, account: Account) -> int:
     headers = {
         "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
-        "cookie": cookie,
+        "cookie": account.cookie,
     }
-    try:
-        response = session.get(url, headers=headers, timeout=10)
-        logger.info(f"Request URL: {response.url}")
-        resp = response.json()
-    except requests.RequestException as e:
-        logger.info(
-            f"Response Text: {response.text.replace(' ', '').replace('\n', '')}"
-        )
-        logger.error(f"Request failed: {e}")
-        return -1
-    except json.JSONDecodeError as e:
-        logger.error(f"JSON decode failed: {e}")
-        return -1
-
-    if not resp:
-        logger.warning("Empty response.")
+    csResp = await fetch_json(
+        session,
+        logger,
+        account,
+        "GET",
+        SIGN_URL,
+        headers,
+        model=ctrip_sign.CtripSignResponse,
+    )
+    if csResp is None:
         return -1
 
-    csResp = CtripSignResponse.model_validate(resp)
     if csResp.code == 400001:
-        logger.info("今日已签到")
+        logger.info(f"[{account.name}] 今日已签到")
         return -1
     elif csResp.code != 0:
-        logger.error(f"签到失败，错误代码：{csResp.code}，错误信息：{csResp.message}")
+        logger.error(
+            f"[{account.name}] 签到失败，错误代码：{csResp.code}，错误信息：{csResp.message}"
+        )
         return -1
 
-    logger.info(f"签到成功，今日获得积分：{csResp.baseIntegratedPoint}，连续签到天数：{csResp.continueDay}")
+    logger.info(
+        f"[{account.name}] 签到成功，今日获得积分：{csResp.baseIntegratedPoint}，"
+        f"连续签到天数：{csResp.continueDay}"
+    )
     return csResp.baseIntegratedPoint
 
 
-def sign_and_save():
+def sign_and_save(argv: Optional[List[str]] = None) -> None:
     parser = argparse.ArgumentParser(
-        description="携程自动签到",
-        epilog="例如：python sign.py --cookie 'pt_key=xxx;pt_pin=yyy;'",
+        description="携程自动签到，支持多个账号并发签到",
+        epilog="例如：python sign.py --cookie 'a=xxx;b=yyy;' --cookie 'a=zzz;b=www;'",
+    )
+    parser.add_argument(
+        "--cookie",
+        action="append",
+        default=[],
+        help="携程 Cookie，用于身份认证，可重复指定多个账号",
+    )
+    parser.add_argument(
+        "--fire-at",
+        default=os.getenv("CHECKIN_FIRE_AT"),
+        metavar="HH:MM[:SS]",
+        help="准点签到：提前预热连接，按服务器时钟在北京时间的该时刻发送请求，如 00:00",
     )
-    parser.add_argument("--cookie", required=False, help="携程 Cookie，用于身份认证")
-    args = parser.parse_args()
+    parser.add_argument(
+        "--primary",
+        default=os.getenv("CTRIP_PRIMARY_ACCOUNT"),
+        metavar="NAME",
+        help="README 展示的账号名，只有一个账号时可省略",
+    )
+    args = parser.parse_args(argv)
 
-    cookie = args.cookie or os.getenv("CTRIP_COOKIE", "")
     logger = get_logger()
-
-    if not cookie:
+    # 环境变量中多个账号的 Cookie 以换行分隔
+    accounts = parse_accounts(
+        args.cookie or [os.getenv("CTRIP_COOKIE", "")], ACCOUNT_KEYS
+    )
+    if not accounts:
         logger.error("未提供 Cookie")
         return
 
-    count = sign(logger, cookie)
-    if count < 0:
+    fire_at = next_fire_at(args.fire_at) if args.fire_at else None
+    results, report = run_check_in(
+        logger,
+        accounts,
+        lambda session, account: sign(session, logger, account),
+        fire_at=fire_at,
+        probe_url=SIGN_URL,
+    )
+    current_directory = os.path.dirname(__file__)
+    if report is not None:
+        save_fire_report(logger, current_directory, "ctrip_sign", report)
+
+    succeeded = sum(1 for count in results.values() if count >= 0)
+    if not succeeded:
         logger.warning("⚠️ 签到失败，未获得积分")
         return
-
-    current_directory = os.path.dirname(__file__)
-    csv_dir = os.path.join(current_directory, "csv")
-    os.makedirs(csv_dir, exist_ok=True)
-    filepath = os.path.join(csv_dir, "ctrip_sign.csv")
-    save_and_clean(
-        filepath, logger, ["timestamp", "count"], [get_today_timestamp(), count], 7
+    logger.info(f"✅ {succeeded}/{len(accounts)} 个账号签到成功")
+
+    dirpath = save_results(
+        logger,
+        current_directory,
+        "ctrip_sign",
+        ["timestamp", "count"],
+        get_today_timestamp(),
+        results,
+        7,
+        args.primary,
     )
+    if dirpath is None:
+        return
 
     parent_directory = os.path.dirname(current_directory)
-    update_readme_with_table(
-        logger, filepath, f"{parent_directory}/README.md", "ctrip_sign"
+    update_readme_with_series(
+        logger, dirpath, f"{parent_directory}/README.md", "ctrip_sign", 7
     )
 
 
+@job(timeout=JOB_TIMEOUT)
+def run() -> None:
+    # 调度器中运行时不解析命令行，Cookie 从环境变量读取
+    sign_and_save([])
+
+
 if __name__ == "__main__":
     sign_and_save()
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+# @Author: Lewis Tian
+# @Date:   2026-10-20 11:16:05
+# @Desc:   常驻进程：按 schedule.json 中的 cron 表达式定时执行监控任务
+#
+# 与 runner.py 每次启动一个进程不同，常驻进程只导入一次模块，共用的 requests Session
+# 在多次执行之间保持连接（DNS、TLS 握手只在第一次请求时发生），各模块的缓存也一直有效。
+# 配置文件修改后自动重新加载，格式有误时保留原配置。
+#
+# 用法：
+#   python daemon.py                       # 使用 schedule.json
+#   python daemon.py --config my.json
+#   python daemon.py --dry-run             # 打印各条目接下来的执行时间后退出
+
+import argparse
+import os
+import random
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+from logging import Logger
+from typing import Dict, List, Optional, Set
+from zoneinfo import ZoneInfo
+
+import bootstrap  # noqa: F401
+from runner import DEFAULT_TIMEOUT, discover
+from utils.jobs import get_jobs, log_timing, resolve, run_jobs
+from utils.logger import get_logger
+from utils.scheduler import ScheduleConfig, ScheduleEntry, load_schedule
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CONFIG = os.path.join(PROJECT_ROOT, "schedule.json")
+# 最长休眠时间，同时也是检查配置文件是否修改的间隔
+POLL_SECONDS = 30
+
+
+class Daemon:
+    def __init__(self, logger: Logger, config_path: str):
+        self.logger = logger
+        self.config_path = config_path
+        self.config = ScheduleConfig([])
+        self.config_mtime: Optional[float] = None
+        # 条目名 -> 下次执行的时间戳（已加上抖动）
+        self.plans: Dict[str, float] = {}
+        self.threads: Dict[str, threading.Thread] = {}
+        self.running_jobs: Set[str] = set()
+        # 超时后仍在运行的任务线程，结束前一直占用 running_jobs
+        self.lingering: Dict[str, threading.Thread] = {}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+    def now(self) -> datetime:
+        return datetime.now(ZoneInfo(self.config.timezone))
+
+    def plan(self, entry: ScheduleEntry) -> float:
+        """
+        从当前时间往后计算下次执行时间；错过的执行（如机器休眠）不会补跑
+        """
+        cron_at = entry.cron.next_after(self.now())
+        return cron_at.timestamp() + random.uniform(0, entry.jitter)
+
+    def reload(self) -> bool:
+        """
+        配置文件的修改时间变化时重新加载，返回是否加载了新配置
+
+        未变化的条目保留原来的执行计划，新增或修改的条目从当前时间重新计算。
+        """
+        try:
+            mtime = os.stat(self.config_path).st_mtime
+        except OSError as e:
+            if self.config_mtime is None:
+                raise
+            self.logger.error(f"❌ 无法读取配置 {self.config_path}: {e}")
+            return False
+        if mtime == self.config_mtime:
+            return False
+        first_load = self.config_mtime is None
+        self.config_mtime = mtime
+
+        try:
+            config = load_schedule(self.config_path)
+            jobs = get_jobs()
+            ZoneInfo(config.timezone)
+            for entry in config.entries:
+                resolve(jobs, entry.jobs)
+                # 例如 2 月 31 日这样永远不会匹配的表达式
+                entry.cron.next_after(self.now())
+        except (ValueError, KeyError, LookupError) as e:
+            if first_load:
+                raise
+            self.logger.error(f"❌ 配置有误，继续使用原配置: {e}")
+            return False
+
+        old = {e.name: e for e in self.config.entries}
+        self.config = config
+        plans = {}
+        for entry in config.entries:
+            if old.get(entry.name) == entry and entry.name in self.plans:
+                plans[entry.name] = self.plans[entry.name]
+            else:
+                plans[entry.name] = self.plan(entry)
+        self.plans = plans
+
+        self.logger.info(f"📅 已加载 {len(config.entries)} 个调度条目")
+        tz = ZoneInfo(config.timezone)
+        for entry in config.entries:
+            fire_at = datetime.fromtimestamp(plans[entry.name], tz)
+            self.logger.info(
+                f"  {entry.name} [{entry.cron.text}] "
+                f"next {fire_at:%Y-%m-%d %H:%M:%S}: {', '.join(entry.jobs)}"
+            )
+        return True
+
+    def run_entry(self, entry: ScheduleEntry, names: List[str]) -> None:
+        threads: Dict[str, threading.Thread] = {}
+        try:
+            selected = resolve(get_jobs(), entry.jobs)
+            self.logger.info(f"🚀 {entry.name}: {', '.join(selected)}")
+            results = run_jobs(
+                self.logger,
+                selected,
+                max_workers=self.config.max_workers,
+                group_limits=self.config.group_limits,
+                default_timeout=DEFAULT_TIMEOUT,
+                threads=threads,
+            )
+            log_timing(self.logger, results)
+        except Exception as e:
+            self.logger.exception(f"❌ {entry.name} failed: {e}")
+        finally:
+            with self.lock:
+                for name in names:
+                    thread = threads.get(name)
+                    if thread is not None and thread.is_alive():
+                        self.lingering[name] = thread
+                    else:
+                        self.running_jobs.discard(name)
+
+    def reap(self) -> None:
+        """
+        超时的任务线程结束后才释放 running_jobs，调用时需持有 self.lock
+        """
+        for name, thread in list(self.lingering.items()):
+            if not thread.is_alive():
+                del self.lingering[name]
+                self.running_jobs.discard(name)
+                self.logger.info(f"🧹 timed-out job {name} has exited")
+
+    def fire(self, entry: ScheduleEntry) -> None:
+        """
+        在后台线程中执行条目；与仍在运行的任务（包括超时后线程还没结束的）有重叠时跳过本次
+        """
+        names = list(resolve(get_jobs(), entry.jobs))
+        with self.lock:
+            self.reap()
+            busy = self.running_jobs.intersection(names)
+            if busy:
+                self.logger.warning(
+                    f"⏭️ {entry.name} skipped, still running: {', '.join(sorted(busy))}"
+                )
+                return
+            self.running_jobs.update(names)
+
+        thread = threading.Thread(
+            target=self.run_entry,
+            args=(entry, names),
+            name=f"schedule-{entry.name}",
+            daemon=True,
+        )
+        self.threads[entry.name] = thread
+        thread.start()
+
+    def run(self) -> None:
+        while not self.stop_event.is_set():
+            self.reload()
+            now = time.time()
+            for entry in self.config.entries:
+                if self.plans[entry.name] <= now:
+                    self.fire(entry)
+                    self.plans[entry.name] = self.plan(entry)
+
+            next_fire = min(self.plans.values(), default=None)
+            wait = POLL_SECONDS if next_fire is None else next_fire - time.time()
+            self.stop_event.wait(min(max(wait, 0), POLL_SECONDS))
+
+        self.logger.info("👋 停止调度，等待运行中的任务结束")
+        for thread in self.threads.values():
+            thread.join()
+
+    def stop(self, *_) -> None:
+        self.stop_event.set()
+
+
+def dry_run(daemon: Daemon, count: int) -> None:
+    daemon.reload()
+    now = daemon.now()
+    for entry in daemon.config.entries:
+        times = []
+        after = now
+        for _ in range(count):
+            after = entry.cron.next_after(after)
+            times.append(f"{after:%Y-%m-%d %H:%M}")
+        jitter = f" (+0~{entry.jitter:g}s)" if entry.jitter else ""
+        print(f"{entry.name} [{entry.cron.text}]{jitter}: {', '.join(times)}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="常驻进程，定时执行监控任务")
+    parser.add_argument("--config", default=DEFAULT_CONFIG, help="调度配置文件")
+    parser.add_argument(
+        "--dry-run", action="store_true", help="打印接下来的执行时间后退出"
+    )
+    parser.add_argument(
+        "--count", type=int, default=3, help="--dry-run 时每个条目打印的次数"
+    )
+    args = parser.parse_args()
+
+    logger = get_logger(use_queue=True)
+    if discover(logger):
+        logger.warning("⚠️ 部分模块导入失败，相关任务不会执行")
+
+    daemon = Daemon(logger, args.config)
+    if args.dry_run:
+        dry_run(daemon, args.count)
+        return 0
+
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    daemon.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,12 +5,10 @@
 # @Ref:    https://github.com/nibabashilkk/alipan_auto_sign
 
 import argparse
-import json
 import os
 import sys
 from logging import Logger
-
-import requests
+from typing import List, Optional
 
 # 添加项目根目录到 sys.path，确保能导入 bootstrap.py
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
@@ -18,47 +16,45 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 import bootstrap  # noqa: F401, E402
-from utils.csver import save_and_clean  # noqa: E402
-from utils.filer import update_readme_with_table  # noqa: E402
+from utils.checkin import (  # noqa: E402
+    JOB_TIMEOUT,
+    Account,
+    fetch_json,
+    parse_accounts,
+    run_check_in,
+    save_fire_report,
+    save_results,
+)
+from utils.filer import update_readme_with_series  # noqa: E402
+from utils.jobs import job  # noqa: E402
 from utils.logger import get_logger  # noqa: E402
+from utils.precise import next_fire_at  # noqa: E402
 from utils.timer import get_today_timestamp  # noqa: E402
 
+BEAN_URL = "https://api.m.jd.com/client.action?functionId=signBeanAct&appid=ld&client=apple"  # noqa: E501
+# 用作账号名的 Cookie 字段
+ACCOUNT_KEYS = ("pt_pin",)
+
 
-def get_bean(logger: Logger, cookie: str = "") -> int:
+async def get_bean(session, logger: Logger, account: Account) -> int:
     """
     通过京东签到接口请求今天的京豆数量
 
      参数:
+        session: 共用的 aiohttp 会话
         logger（Logger）: 日志记录器
-        cookie（str）: 京东登录的 Cookie
+        account（Account）: 京东账号，包含登录的 Cookie
 
      返回:
         成功则返回京豆数量，失败返回 -1
     """
-    session = requests.Session()
-    url = "https://api.m.jd.com/client.action?functionId=signBeanAct&appid=ld&client=apple"  # noqa: E501
-    if not cookie:
-        logger.error("empty cookie")
-        return -1
-
     headers = {
         "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
-        "cookie": cookie,
+        "cookie": account.cookie,
     }
-    try:
-        response = session.post(url, headers=headers, timeout=10)
-        logger.info(f"Request URL: {response.url}")
-        resp = response.json()
-    except requests.RequestException as e:
-        logger.info(f"Response Text: {response.text.replace('\n', '')}")
-        logger.error(f"Request failed: {e}")
-        return -1
-    except json.JSONDecodeError as e:
-        logger.error(f"JSON decode failed: {e}")
-        return -1
-
+    resp = await fetch_json(session, logger, account, "POST", BEAN_URL, headers)
     if not resp:
-        logger.warning("Empty response.")
+        logger.warning(f"[{account.name}] Empty response.")
         return -1
 
     data = resp.get("data", {})
@@ -69,50 +65,91 @@ def get_bean(logger: Logger, cookie: str = "") -> int:
     if not dailyAward:
         dailyAward = data.get("newUserAward", {})
     if not dailyAward:
-        logger.error("Fail to get 'dailyAward' data")
+        logger.error(f"[{account.name}] Fail to get 'dailyAward' data")
         return -1
     beanAward = dailyAward.get("beanAward", {})
     beanCount = beanAward.get("beanCount", -1)
 
+    logger.info(f"[{account.name}] ✅ 今日获得京豆数量：{beanCount}")
     return int(beanCount)
 
 
-def get_and_save_bean(logger: Logger) -> None:
+def get_and_save_bean(logger: Logger, argv: Optional[List[str]] = None) -> None:
     parser = argparse.ArgumentParser(
-        description="自动签到领京豆",
-        epilog="例如：python get_bean.py --cookie 'pt_key=xxx;pt_pin=yyy;'",
+        description="自动签到领京豆，支持多个账号并发签到",
+        epilog="例如：python bean.py --cookie 'pt_key=xxx;pt_pin=yyy;' "
+        "--cookie 'pt_key=zzz;pt_pin=www;'",
+    )
+    parser.add_argument(
+        "--cookie",
+        action="append",
+        default=[],
+        help="JD Cookie，用于身份认证，可重复指定多个账号",
+    )
+    parser.add_argument(
+        "--fire-at",
+        default=os.getenv("CHECKIN_FIRE_AT"),
+        metavar="HH:MM[:SS]",
+        help="准点签到：提前预热连接，按服务器时钟在北京时间的该时刻发送请求，如 00:00",
+    )
+    parser.add_argument(
+        "--primary",
+        default=os.getenv("JD_PRIMARY_ACCOUNT"),
+        metavar="NAME",
+        help="README 展示的账号名，只有一个账号时可省略",
     )
-    parser.add_argument("--cookie", required=False, help="JD Cookie，用于身份认证")
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
-    cookie = args.cookie or os.getenv("JD_COOKIE", "")
-    if not cookie:
+    # 环境变量中多个账号的 Cookie 以换行分隔
+    accounts = parse_accounts(args.cookie or [os.getenv("JD_COOKIE", "")], ACCOUNT_KEYS)
+    if not accounts:
         logger.error("未提供 Cookie")
         return
 
-    count = get_bean(logger, cookie)
-    if count < 0:
+    fire_at = next_fire_at(args.fire_at) if args.fire_at else None
+    results, report = run_check_in(
+        logger,
+        accounts,
+        lambda session, account: get_bean(session, logger, account),
+        fire_at=fire_at,
+        probe_url=BEAN_URL,
+    )
+    current_directory = os.path.dirname(__file__)
+    if report is not None:
+        save_fire_report(logger, current_directory, "bean", report)
+
+    succeeded = sum(1 for count in results.values() if count >= 0)
+    if not succeeded:
         logger.warning("⚠️ 签到失败，未获得京豆")
         return
-
-    logger.info(f"✅ 今日获得京豆数量：{count}")
+    logger.info(f"✅ {succeeded}/{len(accounts)} 个账号签到成功")
 
     # 创建文件夹 + 保存数据
-    current_directory = os.path.dirname(__file__)
-    csv_dir = os.path.join(current_directory, "csv")
-    os.makedirs(csv_dir, exist_ok=True)
-    filepath = os.path.join(csv_dir, "bean.csv")
-
-    save_and_clean(
-        filepath, logger, ["timestamp", "count"], [get_today_timestamp(), count], 7
+    dirpath = save_results(
+        logger,
+        current_directory,
+        "bean",
+        ["timestamp", "count"],
+        get_today_timestamp(),
+        results,
+        7,
+        args.primary,
     )
+    if dirpath is None:
+        return
 
     parent_directory = os.path.dirname(current_directory)
-    update_readme_with_table(
-        logger, filepath, f"{parent_directory}/README.md", "jingdongbean"
+    update_readme_with_series(
+        logger, dirpath, f"{parent_directory}/README.md", "jingdongbean", 7
     )
 
 
+@job(timeout=JOB_TIMEOUT)
+def run() -> None:
+    # 调度器中运行时不解析命令行，Cookie 从环境变量读取
+    get_and_save_bean(get_logger(), [])
+
+
 if __name__ == "__main__":
     logger = get_logger()
     get_and_save_bean(logger)
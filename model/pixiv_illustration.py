@@ -2,9 +2,21 @@
 # @Author: Lewis Tian
 # @Date:   2025-05-04 12:23:17
 
-from typing import List
+from typing import Any, Dict, Generic, List, TypeVar, Union
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+T = TypeVar("T")
+
+
+# pixiv ajax 接口的外层：{"error": false, "message": "", "body": ...}
+class PixivBody(BaseModel, Generic[T]):
+    error: bool = False
+    message: str = ""
+    body: T
+
+    class Config:
+        extra = "ignore"
 
 
 class PixivItem(BaseModel):
@@ -15,6 +27,7 @@ class PixivItem(BaseModel):
     illust_id: int
     user_id: int
     illust_page_count: int
+    rank: int = 0
 
     class Config:
         extra = "ignore"
@@ -44,6 +57,17 @@ class PixivUserTopItem(BaseModel):
         extra = "ignore"
 
 
+class PixivUserTopBody(BaseModel):
+    # 没有作品时返回的是空列表。不用 mode="before" 的校验器转换：
+    # 它会让 model_validate_json 先把整个字典构造成 Python 对象，解析耗时翻倍
+    illusts: Union[Dict[int, PixivUserTopItem], List[Any]] = Field(
+        default={}, union_mode="left_to_right"
+    )
+
+    class Config:
+        extra = "ignore"
+
+
 class PixivItemUrl(BaseModel):
     mini: str
     thumb: str
@@ -86,6 +110,17 @@ class PixivItemUrlInfo(BaseModel):
         extra = "ignore"
 
 
+# 作品信息缓存：收藏数、页数、原图链接，checked 为查询时的时间戳
+class PixivIllustMeta(BaseModel):
+    bookmark_count: int
+    page_count: int
+    url: str
+    checked: int
+
+    class Config:
+        extra = "ignore"
+
+
 class PixivFollowingUserInfo(BaseModel):
     userId: str
     userName: str
@@ -117,3 +152,18 @@ class PixivTagItemRespInfo(BaseModel):
     data: List[PixivTagItemInfo]
     lastPage: int
     total: int
+
+
+class PixivTagSearchBody(BaseModel):
+    illustManga: PixivTagItemRespInfo
+
+    class Config:
+        extra = "ignore"
+
+
+# 排行榜回填进度：模式 -> 已完成（已加入下载队列）的日期 YYYYMMDD
+class PixivRankBackfillCheckpoint(BaseModel):
+    done: Dict[str, List[str]] = {}
+
+    class Config:
+        extra = "ignore"
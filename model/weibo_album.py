@@ -2,7 +2,7 @@
 # @Author: Lewis Tian
 # @Date:   2025-05-04 00:50:17
 
-from typing import List
+from typing import List, Optional
 
 from pydantic import BaseModel
 
@@ -35,3 +35,32 @@ class AlbumResponse(BaseModel):
 
     class Config:
         extra = "ignore"
+
+
+# 相册增量游标：已入库的最新一张图片
+class AlbumCursor(BaseModel):
+    photo_id: str
+    timestamp: int
+
+    class Config:
+        extra = "ignore"
+
+    def reached(self, item: AlbumItem) -> bool:
+        """
+        图片是否已经在游标之前入库；同一秒上传的图片时间戳相同，只有早于游标的才算，
+        与游标同一秒、排在游标之后的图片由调用方按列表顺序判断
+        """
+        return item.photo_id == self.photo_id or item.timestamp < self.timestamp
+
+
+# 历史回填进度：已完成的页码，以及确认无需再翻的最后一页
+class AlbumBackfillCheckpoint(BaseModel):
+    uid: str
+    start_time: int
+    end_time: int
+    done_pages: List[int] = []
+    last_page: Optional[int] = None
+    finished: bool = False
+
+    class Config:
+        extra = "ignore"
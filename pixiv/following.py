@@ -11,19 +11,31 @@ from threading import Lock
 from typing import List
 
 import requests
+from pydantic import ValidationError
 
 # 添加项目根目录到 sys.path
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
+from image import (  # noqa: E402
+    close_downloader,
+    get_api_limiter,
+    get_meta_provider,
+    resume_downloads,
+)
 from user import download_user_top_images  # noqa: E402
 
 import bootstrap  # noqa: F401, E402
 from model.pixiv_illustration import (  # noqa: E402
+    PixivBody,
     PixivFollowingInfo,
     PixivFollowingUserInfo,
 )
+from utils.capture import CapturedBody  # noqa: E402
+from utils.httper import get_session  # noqa: E402
+from utils.jobs import job  # noqa: E402
+from utils.jsoner import decode  # noqa: E402
 from utils.logger import get_logger  # noqa: E402
 
 
@@ -42,7 +54,7 @@ def get_user_following(
         logger.error("❌ Invalid user ID or empty cookie.")
         return []
 
-    session = requests.Session()
+    session = get_session()
     headers = {
         "referer": "https://www.pixiv.net",
         "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
@@ -62,6 +74,7 @@ def get_user_following(
     for i in range(max_page):
         payload["offset"] = count * i
         payload["limit"] = count
+        get_api_limiter().acquire()
         try:
             response = session.get(
                 base_url, params=payload, headers=headers, timeout=10
@@ -69,20 +82,20 @@ def get_user_following(
             logger.info(
                 f"🌐 Request URL: {response.url}, page: {i+1}, offset: {count * i}"
             )
-            resp = response.json()
         except requests.RequestException as e:
-            logger.info(f"📄 Response Text: {response.text}")
             logger.error(f"❌ Request failed: {e}")
             return []
-        except json.JSONDecodeError as e:
-            logger.error(f"❌ JSON decode failed: {e}")
-            return []
 
-        if not resp or not resp.get("body", {}):
+        if not response.content:
             logger.warning("❌ Empty response.")
             return []
 
-        pfiResp = PixivFollowingInfo.model_validate(resp.get("body", {}))
+        try:
+            pfiResp = decode(response.content, PixivBody[PixivFollowingInfo]).body
+        except ValidationError as e:
+            logger.info("📄 Response Text: %s", CapturedBody(response.text))
+            logger.error(f"❌ Failed to parse following users: {e}")
+            return []
 
         result += pfiResp.users
         logger.info(f"📄 Page {i+1}, user: {len(pfiResp.users)}...")
@@ -94,8 +107,10 @@ def get_user_following(
     return result
 
 
+# 排行榜任务会更新 rank.json，之后再处理用户
+@job(depends=["pixiv.ranking"], timeout=2 * 60 * 60)
 def main():
-    logger = get_logger()
+    logger = get_logger(use_queue=True)
     user_id = os.getenv("PIXIV_UID", "")
     cookie = os.getenv("PIXIV_COOKIE", "")
     ufs = get_user_following(logger, user_id, cookie)
@@ -130,8 +145,11 @@ def main():
         except Exception as e:
             logger.error(f"❌ Error processing user {uid}: {e}")
 
+    resume_downloads(logger)
     with ThreadPoolExecutor(max_workers=10) as executor:
         executor.map(process_user, user_ids)
+    close_downloader(logger)
+    get_meta_provider().save()
 
     with open(download_images_map_global_filepath, "w") as f:
         json.dump(download_images_global_map, f, ensure_ascii=False, indent=0)
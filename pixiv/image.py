@@ -4,13 +4,17 @@
 
 import json
 import os
+import re
 import sys
+import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from logging import Logger
-from typing import Dict, List
+from threading import Lock
+from typing import Dict, List, NamedTuple, Optional
 from urllib.parse import urlparse
 
 import requests
+from pydantic import ValidationError
 
 # 添加项目根目录到 sys.path
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
@@ -18,11 +22,55 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 import bootstrap  # noqa: F401, E402
-from model.pixiv_illustration import PixivItemUrlInfo  # noqa: E402
+from model.pixiv_illustration import (  # noqa: E402
+    PixivBody,
+    PixivIllustMeta,
+    PixivItemUrlInfo,
+)
+from utils.capture import CapturedBody  # noqa: E402
+from utils.downloader import Downloader, DownloadJob, RetryPolicy  # noqa: E402
+from utils.httper import get_session  # noqa: E402
+from utils.jsoner import decode, loads  # noqa: E402
+from utils.logger import get_sampler  # noqa: E402
+from utils.ratelimit import TokenBucket, get_rate_limiter  # noqa: E402
 
 MAX_RETRIES = 3
 CONCURRENT_LIMIT = 10
 IMAGE_QUALITY = ["original", "regular", "small", "thumb_mini"]
+DOWNLOAD_HEADERS = {
+    "referer": "https://www.pixiv.net/",
+    "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
+}
+DOWNLOAD_QUEUE_FILEPATH = os.path.join(os.path.dirname(__file__), "download_queue.json")
+# 逐张图片的高频日志：每个调用位置每 N 条记 1 条 / 每种消息每秒最多 K 条
+LOG_SAMPLE_EVERY = 20
+LOG_PER_SECOND = 5
+# www.pixiv.net 接口（排行榜、作品信息、用户主页）共用的限速：每秒请求数、突发上限
+API_RATE = 10
+API_BURST = 20
+# 下载的截止时间：任务开始后 DOWNLOAD_BUDGET 秒（pixiv 任务超时 2 小时，留出保存记录的时间），
+# 环境变量 DOWNLOAD_DEADLINE（Unix 时间戳）可以给出更早的截止时间，如 CI 的时间上限
+DOWNLOAD_BUDGET = 2 * 60 * 60 - 10 * 60
+DOWNLOAD_DEADLINE_ENV = "DOWNLOAD_DEADLINE"
+META_CACHE_FILEPATH = os.path.join(
+    os.path.dirname(__file__), "data", "illust_meta.json"
+)
+# 收藏数不足的作品隔多久重新查询（收藏数只增不减，达标的作品不再查询）
+BOOKMARK_TTL = 7 * 24 * 60 * 60
+# 缩略图 / 原图链接中的上传时间路径和 pid，如 .../img/2026/10/19/00/00/12/123_p0...
+IMAGE_PATH_PATTERN = re.compile(r"/img/(\d{4}(?:/\d{2}){5})/(\d+)_p0")
+
+_downloader: Optional[Downloader] = None
+_downloader_lock = Lock()
+_meta_provider: Optional["IllustMetaProvider"] = None
+_meta_provider_lock = Lock()
+
+
+def get_api_limiter() -> TokenBucket:
+    """
+    获取 Pixiv 接口共用的令牌桶，图片下载（i.pximg.net）不受限制
+    """
+    return get_rate_limiter("pixiv", API_RATE, API_BURST)
 
 
 class PixivImage:
@@ -44,12 +92,13 @@ class PixivImage:
         }
         url = f"https://www.pixiv.net/ajax/illust/{self.pid}/pages?lang=zh"
 
+        get_api_limiter().acquire()
         try:
-            response = requests.get(url, headers=headers, timeout=10)
+            response = get_session().get(url, headers=headers, timeout=10)
             self.logger.info(f"Request URL: {response.url}")
-            resp = response.json()
+            resp = loads(response.content)
         except requests.RequestException as e:
-            self.logger.info(f"Response Text: {response.text.replace('\n', '')}")
+            self.logger.info("Response Text: %s", CapturedBody(response.text))
             self.logger.error(f"Request failed: {e}")
             return []
         except json.JSONDecodeError as e:
@@ -71,7 +120,9 @@ class PixivImage:
                     urls.append(url)
                     break
 
-        self.logger.info(f"pid: {self.pid}, urls: {urls}")
+        get_sampler(self.logger).info(
+            "pid: %s, urls: %s", self.pid, urls, every=LOG_SAMPLE_EVERY
+        )
         return urls
 
     def get_image_info(self) -> PixivItemUrlInfo:
@@ -85,25 +136,27 @@ class PixivImage:
         }
         url = f"https://www.pixiv.net/ajax/illust/{self.pid}?lang=zh"
 
+        sampler = get_sampler(self.logger)
+        get_api_limiter().acquire()
         try:
-            response = requests.get(url, headers=headers, timeout=10)
-            self.logger.info(f"🔎 Request URL: {response.url}")
-            resp = response.json()
+            response = get_session().get(url, headers=headers, timeout=10)
+            sampler.info("🔎 Request URL: %s", response.url, every=LOG_SAMPLE_EVERY)
         except requests.RequestException as e:
-            self.logger.info(f"📄 Response Text: {response.text}")
             self.logger.error(f"❌ Request failed: {e}")
             return None
-        except json.JSONDecodeError as e:
-            self.logger.error(f"❌ JSON decode failed: {e}")
-            return None
 
-        if not resp:
+        if not response.content:
             self.logger.warning("⚠️  Empty response.")
             return None
 
         try:
-            return PixivItemUrlInfo.model_validate(resp.get("body", {}))
-        except Exception as e:
+            return decode(response.content, PixivBody[PixivItemUrlInfo]).body
+        except ValidationError as e:
+            sampler.info(
+                "📄 Response Text: %s",
+                CapturedBody(response.text),
+                every=LOG_SAMPLE_EVERY,
+            )
             self.logger.error(f"❌ Failed to parse PixivItemUrlInfo: {e}")
             return None
 
@@ -165,53 +218,258 @@ def batch_get_image_urls(
     return result
 
 
-def download_image_stream(logger: Logger, url: str, save_path: str) -> None:
+class IllustHint(NamedTuple):
+    """列表接口（排行榜、用户主页）中已有的作品信息"""
+
+    user_id: int
+    page_count: int
+    thumb: str  # 缩略图链接
+
+
+def derive_original_url(thumb: str, url: str) -> str:
+    """
+    用缩略图中的上传时间路径更新原图链接（作者更新图片后路径会变，扩展名取自 url）
+
+    参数:
+        thumb (str): 列表接口中的缩略图，如 .../c/240x480/img-master/img/<时间>/123_p0_master1200.jpg
+        url (str): 之前查询到的原图，如 .../img-original/img/<时间>/123_p0.png
+    """
+    thumb_match = IMAGE_PATH_PATTERN.search(thumb)
+    url_match = IMAGE_PATH_PATTERN.search(url)
+    if not thumb_match or not url_match or "/img-original/" not in url:
+        return url
+    if thumb_match.group(2) != url_match.group(2):
+        return url
+    start, end = url_match.span(1)
+    return url[:start] + thumb_match.group(1) + url[end:]
+
+
+class IllustMetaProvider:
+    """
+    作品信息（收藏数、页数、原图链接）的提供者，减少 /ajax/illust/{pid} 请求：
+
+    - 多页作品：列表接口已有页数，直接跳过
+    - 缓存（data/illust_meta.json）：收藏数达标的作品不再查询，未达标的 BOOKMARK_TTL 后再查
+    - 链接：缓存的原图链接按最新的缩略图更新上传时间路径
+
+    Pixiv 按 id 批量查询的接口（/ajax/user/{id}/profile/illusts?ids[]=）只有缩略图和页数，
+    与列表接口相同，没有收藏数，因此收藏数仍需逐个查询
+    """
+
+    def __init__(self, filepath: str = META_CACHE_FILEPATH):
+        self.filepath = filepath
+        self.lock = Lock()
+        self.entries: Dict[int, PixivIllustMeta] = {}
+        self.dirty = False
+        if os.path.exists(filepath):
+            try:
+                with open(filepath, "rb") as f:
+                    self.entries = decode(f.read(), Dict[int, PixivIllustMeta])
+            except (OSError, ValidationError):
+                self.entries = {}
+
+    def cached(
+        self, pid: int, favorite_count: int, now: float
+    ) -> Optional[PixivIllustMeta]:
+        entry = self.entries.get(pid)
+        if entry is None:
+            return None
+        if entry.bookmark_count >= favorite_count or now - entry.checked < BOOKMARK_TTL:
+            return entry
+        return None
+
+    def resolve(
+        self,
+        logger: Logger,
+        illusts: Dict[int, IllustHint],
+        favorite_count: int,
+        max_workers: int = CONCURRENT_LIMIT,
+    ) -> Dict[int, PixivIllustMeta]:
+        """
+        选出单页、收藏数不少于 favorite_count 的作品
+
+        返回:
+            Dict[int, PixivIllustMeta]: pid -> 作品信息，url 为下载链接
+        """
+        sampler = get_sampler(logger)
+        now = time.time()
+        result: Dict[int, PixivIllustMeta] = {}
+        todo: List[int] = []
+        multi_page = hits = 0
+        with self.lock:
+            for pid, hint in illusts.items():
+                # 过滤掉多页的图片
+                if hint.page_count > 1:
+                    multi_page += 1
+                    continue
+                entry = self.cached(pid, favorite_count, now)
+                if entry is None:
+                    todo.append(pid)
+                    continue
+                hits += 1
+                if entry.page_count <= 1 and entry.bookmark_count >= favorite_count:
+                    url = derive_original_url(hint.thumb, entry.url)
+                    result[pid] = entry.model_copy(update={"url": url})
+
+        infoMap = batch_get_image_infos(logger, todo, max_workers)
+        for pid, info in infoMap.items():
+            if not info:
+                sampler.warning(
+                    "⚠️ Failed to get image info for pid %s",
+                    pid,
+                    per_second=LOG_PER_SECOND,
+                )
+                continue
+
+            url = info.urls.get_url()
+            entry = PixivIllustMeta(
+                bookmark_count=info.bookmarkCount,
+                page_count=info.pageCount,
+                url=url,
+                checked=int(now),
+            )
+            with self.lock:
+                self.entries[pid] = entry
+                self.dirty = True
+
+            if info.pageCount > 1:
+                sampler.info(
+                    "📖 %s has %s pages, skip!",
+                    pid,
+                    info.pageCount,
+                    per_second=LOG_PER_SECOND,
+                )
+                continue
+
+            if info.bookmarkCount < favorite_count:
+                sampler.info(
+                    "💔 %s' favorite count: %s, skip!",
+                    pid,
+                    info.bookmarkCount,
+                    per_second=LOG_PER_SECOND,
+                )
+                continue
+
+            if len(url) == 0:
+                logger.warning(f"⚠️ {pid} has no valid URL, skip!")
+                continue
+            result[pid] = entry
+
+        logger.info(
+            f"🔎 {len(illusts)} illusts: {multi_page} multi-page, "
+            f"{hits} cached, {len(todo)} requested, {len(result)} selected"
+        )
+        return result
+
+    def save(self) -> None:
+        with self.lock:
+            if not self.dirty:
+                return
+            os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
+            data = {
+                str(pid): entry.model_dump()
+                for pid, entry in sorted(self.entries.items())
+            }
+            with open(self.filepath + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(self.filepath + ".tmp", self.filepath)
+            self.dirty = False
+
+
+def get_meta_provider() -> IllustMetaProvider:
+    """
+    获取进程内共用的作品信息提供者，各任务结束时调用 save 保存缓存
+    """
+    global _meta_provider
+    with _meta_provider_lock:
+        if _meta_provider is None:
+            _meta_provider = IllustMetaProvider()
+        return _meta_provider
+
+
+def get_download_deadline(logger: Logger) -> float:
+    deadline = time.time() + DOWNLOAD_BUDGET
+    value = os.getenv(DOWNLOAD_DEADLINE_ENV, "")
+    if value:
+        try:
+            deadline = min(deadline, float(value))
+        except ValueError:
+            logger.warning(f"⚠️ Invalid {DOWNLOAD_DEADLINE_ENV}: {value}")
+    return deadline
+
+
+def get_downloader(logger: Logger, max_workers: int = CONCURRENT_LIMIT) -> Downloader:
+    """
+    获取进程内共用的下载器，所有排行榜/用户线程共享同一个线程池和连接池
+    :param logger: 日志记录器
+    :param max_workers: 最大并发数，仅在首次创建时生效
+    """
+    global _downloader
+    with _downloader_lock:
+        if _downloader is None:
+            _downloader = Downloader(
+                logger,
+                deadline=get_download_deadline(logger),
+                headers=DOWNLOAD_HEADERS,
+                max_concurrency=max_workers,
+                retry=RetryPolicy(max_retries=MAX_RETRIES),
+                queue_path=DOWNLOAD_QUEUE_FILEPATH,
+            )
+        return _downloader
+
+
+def resume_downloads(logger: Logger) -> None:
+    """
+    重试上次运行遗留（中断或失败）的下载任务
+    """
+    get_downloader(logger).download_all([], resume=True)
+
+
+def close_downloader(logger: Logger) -> None:
+    """
+    等待下载结束，保存任务队列并输出下载统计；之后再次调用 get_downloader 会新建下载器
+    """
+    global _downloader
+    with _downloader_lock:
+        downloader, _downloader = _downloader, None
+    if downloader is None:
+        return
+    downloader.close()
+    downloader.log_summary()
+
+
+def download_image_stream(logger: Logger, url: str, save_path: str) -> bool:
     """
     下载图片
     :param logger: 日志记录器
     :param url: 图片 URL
     :param save_path: 保存路径
+    :return: 是否下载成功
     """
-    headers = {
-        "referer": "https://www.pixiv.net/",
-        "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
-    }
-    for attempt in range(1, MAX_RETRIES + 1):
-        try:
-            response = requests.get(url, headers=headers, stream=True)
-            if response.status_code != 200:
-                logger.warning(f"⚠️ 状态码 {response.status_code}，第 {attempt} 次重试: {url}")
-                continue
-            os.makedirs(os.path.dirname(save_path), exist_ok=True)
-            with open(save_path, "wb") as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            logger.info(f"✅ 下载成功: {os.path.basename(save_path)}")
-            return
-
-        except requests.RequestException as e:
-            logger.error(f"请求失败: {e}, 尝试重试第 {attempt} 次: {url}")
-
-    logger.error(f"❌ 最终失败: {url}")
+    return get_downloader(logger).download(url, save_path)
 
 
 def batch_download_images(
-    logger: Logger, urls: List[str], save_paths: List[str], max_workers: int = 10
+    logger: Logger,
+    urls: List[str],
+    save_paths: List[str],
+    max_workers: int = 10,
+    scores: Optional[List[float]] = None,
 ) -> None:
     """
-    批量下载图片
+    批量下载图片，score 高的先下载，来不及在截止时间前完成的留到下次运行
     :param logger: 日志记录器
     :param urls: 图片 URL 列表
     :param save_paths: 保存路径列表
     :param max_workers: 最大线程数
+    :param scores: 每张图片的优先级，如收藏数，为空时都为 0
     """
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = [
-            executor.submit(download_image_stream, logger, url, save_path)
-            for url, save_path in zip(urls, save_paths)
-        ]
-        for future in futures:
-            future.result()
+    scores = scores or [0] * len(urls)
+    jobs = [
+        DownloadJob(url=url, save_path=save_path, score=score)
+        for url, save_path, score in zip(urls, save_paths, scores)
+    ]
+    get_downloader(logger, max_workers).download_all(jobs)
 
 
 def get_url_basename(url: str) -> str:
@@ -236,14 +494,29 @@ def filter_and_save_image_by_map(
     :param local_map: 本地映射
     :return: 如果图片已经存在于全局或本地映射中，则返回 True，否则返回 False
     """
+    sampler = get_sampler(logger)
     if basename in global_map.get(user_id, []):
-        logger.info(f"📂 Exists in global, skip: {basename}")
+        sampler.info(
+            "📂 Exists in global, skip: %s", basename, per_second=LOG_PER_SECOND
+        )
         return True
     if basename in local_map.get(user_id, []):
-        logger.info(f"📂 Exists in local, skip: {basename}")
+        sampler.info(
+            "📂 Exists in local, skip: %s", basename, per_second=LOG_PER_SECOND
+        )
         return True
     else:
         local_map[user_id] = []
     local_map[user_id].append(basename)
 
     return False
+
+
+def is_downloaded(user_id: str, pid: int, *maps: Dict[str, List[str]]) -> bool:
+    """
+    作品是否已经下载过（记录的文件名以 {pid}_p0 开头，不需要先知道下载链接）
+    """
+    prefix = f"{pid}_p0"
+    return any(
+        basename.startswith(prefix) for m in maps for basename in m.get(user_id, [])
+    )
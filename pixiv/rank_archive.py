@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+# @Author: Lewis Tian
+# @Date:   2026-10-20 18:20:36
+# @Desc:   排行榜历史的列式归档：每次抓取的排行榜整页保存，按用户上榜次数、作品名次走势查询
+#
+# 目录结构（data/rank_archive）：
+#   modes.json          排行榜模式 -> 编号，新模式追加在末尾，编号不变
+#   2026-10/day.npy     每月一个目录，每列一个 .npy，读取时 mmap
+#   2026-10/mode.npy ...
+#
+# 只追加写：新记录接在各列末尾，写当月的各列文件（先写临时文件再替换）。
+# 中途退出时各列长度可能不一致，读取时截到最短的一列，已有的行仍然对齐。
+# 同一天、同一模式、同一名次的记录只保留第一次写入的。
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import threading
+from datetime import date, datetime
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
+# 添加项目根目录到 sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+import bootstrap  # noqa: F401, E402
+from model.pixiv_illustration import PixivItem  # noqa: E402
+from utils.lazy import lazy_import  # noqa: E402
+
+if TYPE_CHECKING:
+    import numpy as np
+else:
+    np = lazy_import("numpy")
+
+ARCHIVE_DIRPATH = os.path.join(os.path.dirname(__file__), "data", "rank_archive")
+MODES_FILENAME = "modes.json"
+# 列名 -> dtype
+COLUMNS = {
+    "day": "<i4",  # 日期，距 1970-01-01 的天数
+    "mode": "u1",  # modes.json 中的编号
+    "rank": "<u2",
+    "illust_id": "<i8",
+    "user_id": "<i8",
+    "page_count": "<u2",
+}
+TIMEZONE = ZoneInfo("Asia/Shanghai")
+
+
+def to_day(value: str) -> int:
+    """排行榜日期 "20261020" 转为距 1970-01-01 的天数"""
+    return (datetime.strptime(value, "%Y%m%d").date() - date(1970, 1, 1)).days
+
+
+def from_day(day: int) -> str:
+    return str(np.datetime64(int(day), "D"))
+
+
+def today() -> int:
+    return (datetime.now(TIMEZONE).date() - date(1970, 1, 1)).days
+
+
+def month_of(day: int) -> str:
+    return str(np.datetime64(int(day), "D").astype("datetime64[M]"))
+
+
+class RankArchive:
+    """
+    排行榜历史归档，进程内多个线程共用一个实例
+    """
+
+    def __init__(self, dirpath: str = ARCHIVE_DIRPATH):
+        self.dirpath = dirpath
+        self.lock = threading.Lock()
+        os.makedirs(dirpath, exist_ok=True)
+        self.modes: Dict[str, int] = {}
+        modes_path = os.path.join(dirpath, MODES_FILENAME)
+        if os.path.exists(modes_path):
+            with open(modes_path, "r", encoding="utf-8") as f:
+                self.modes = json.load(f)
+
+    def mode_code(self, mode: str) -> int:
+        if mode not in self.modes:
+            self.modes[mode] = len(self.modes)
+            path = os.path.join(self.dirpath, MODES_FILENAME)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(self.modes, f, indent=0)
+            os.replace(path + ".tmp", path)
+        return self.modes[mode]
+
+    def months(self) -> List[str]:
+        return sorted(
+            name
+            for name in os.listdir(self.dirpath)
+            if os.path.isdir(os.path.join(self.dirpath, name))
+        )
+
+    def first_day(self) -> Optional[int]:
+        """最早一条记录的日期（天数），还没有记录时返回 None"""
+        for month in self.months():
+            days = self.read_month(month)["day"]
+            if len(days):
+                return int(days.min())
+        return None
+
+    def read_month(self, month: str) -> Dict[str, np.ndarray]:
+        """
+        以 mmap 方式读取一个月的各列，长度截到最短的一列
+        """
+        month_dir = os.path.join(self.dirpath, month)
+        columns = {}
+        for name, dtype in COLUMNS.items():
+            path = os.path.join(month_dir, f"{name}.npy")
+            if os.path.exists(path):
+                columns[name] = np.load(path, mmap_mode="r")
+            else:
+                columns[name] = np.zeros(0, dtype=dtype)
+        length = min(len(c) for c in columns.values())
+        return {name: c[:length] for name, c in columns.items()}
+
+    def append(self, day: str, mode: str, items: Sequence[PixivItem]) -> int:
+        """
+        追加一页排行榜，已有的 (日期, 模式, 名次) 跳过
+
+        参数:
+            day (str): 排行榜日期，如 PixivResponse.date 的 "20261020"
+            mode (str): 排行榜模式，如 daily
+
+        返回:
+            int: 写入的条数
+        """
+        if not items:
+            return 0
+        day_value = to_day(day)
+        with self.lock:
+            code = self.mode_code(mode)
+            new = {
+                "day": np.full(len(items), day_value, dtype=COLUMNS["day"]),
+                "mode": np.full(len(items), code, dtype=COLUMNS["mode"]),
+                "rank": np.array([x.rank for x in items], dtype=COLUMNS["rank"]),
+                "illust_id": np.array(
+                    [x.illust_id for x in items], dtype=COLUMNS["illust_id"]
+                ),
+                "user_id": np.array(
+                    [x.user_id for x in items], dtype=COLUMNS["user_id"]
+                ),
+                "page_count": np.array(
+                    [x.illust_page_count for x in items], dtype=COLUMNS["page_count"]
+                ),
+            }
+
+            month = month_of(day_value)
+            old = self.read_month(month)
+            keep = ~np.isin(row_keys(new), row_keys(old))
+            # 同一批中重复的名次也只保留第一条
+            _, first = np.unique(row_keys(new), return_index=True)
+            keep &= np.isin(np.arange(len(items)), first)
+            if not keep.any():
+                return 0
+
+            month_dir = os.path.join(self.dirpath, month)
+            os.makedirs(month_dir, exist_ok=True)
+            for name, dtype in COLUMNS.items():
+                data = np.concatenate([old[name], new[name][keep]]).astype(dtype)
+                path = os.path.join(month_dir, f"{name}.npy")
+                with open(path + ".tmp", "wb") as f:
+                    np.save(f, data)
+                os.replace(path + ".tmp", path)
+            return int(keep.sum())
+
+    def load(
+        self, start: Optional[int] = None, end: Optional[int] = None
+    ) -> Dict[str, np.ndarray]:
+        """
+        读取日期在 [start, end) 内的记录（天数），只读取覆盖该范围的月份
+        """
+        first = month_of(start) if start is not None else None
+        last = month_of(end - 1) if end is not None else None
+        parts = [
+            self.read_month(m)
+            for m in self.months()
+            if (first is None or m >= first) and (last is None or m <= last)
+        ]
+        columns = {
+            name: (
+                np.concatenate([p[name] for p in parts])
+                if parts
+                else np.zeros(0, dtype=dtype)
+            )
+            for name, dtype in COLUMNS.items()
+        }
+        mask = np.ones(len(columns["day"]), dtype=bool)
+        if start is not None:
+            mask &= columns["day"] >= start
+        if end is not None:
+            mask &= columns["day"] < end
+        return {name: c[mask] for name, c in columns.items()}
+
+    def mode_codes(self, modes: Optional[Iterable[str]]) -> Optional[List[int]]:
+        if modes is None:
+            return None
+        return [self.modes[m] for m in modes if m in self.modes]
+
+    def frequent_users(
+        self,
+        min_times: int,
+        days: Optional[int] = None,
+        modes: Optional[Iterable[str]] = None,
+        until: Optional[int] = None,
+    ) -> Dict[int, int]:
+        """
+        最近 days 天内（含 until 当天，默认今天）在 modes 排行榜上榜不少于 min_times 次的用户
+
+        同一作品在多个模式、多天上榜只算一次，即上榜次数是上榜的不同作品数
+
+        返回:
+            Dict[int, int]: user_id -> 上榜次数，按次数从多到少排列
+        """
+        end = (until if until is not None else today()) + 1
+        data = self.load(end - days if days is not None else None, end)
+        codes = self.mode_codes(modes)
+        pairs = np.stack([data["user_id"], data["illust_id"]], axis=1)
+        if codes is not None:
+            pairs = pairs[np.isin(data["mode"], codes)]
+        users = np.unique(pairs, axis=0)[:, 0]
+
+        ids, counts = np.unique(users, return_counts=True)
+        selected = counts >= min_times
+        ids, counts = ids[selected], counts[selected]
+        order = np.argsort(-counts, kind="stable")
+        return {int(i): int(c) for i, c in zip(ids[order], counts[order])}
+
+    def trajectory(self, illust_id: int) -> List[Tuple[str, str, int]]:
+        """
+        作品的名次走势
+
+        返回:
+            List[Tuple[str, str, int]]: (日期 YYYY-MM-DD, 模式, 名次)，按日期和模式排序
+        """
+        data = self.load()
+        mask = data["illust_id"] == illust_id
+        names = {code: mode for mode, code in self.modes.items()}
+        order = np.lexsort((data["mode"][mask], data["day"][mask]))
+        return [
+            (from_day(d), names.get(int(m), str(m)), int(r))
+            for d, m, r in zip(
+                data["day"][mask][order],
+                data["mode"][mask][order],
+                data["rank"][mask][order],
+            )
+        ]
+
+
+def row_keys(columns: Dict[str, np.ndarray]) -> np.ndarray:
+    """(日期, 模式, 名次) 合成一个 int64 用于判重"""
+    return (
+        columns["day"].astype(np.int64) << 24
+        | columns["mode"].astype(np.int64) << 16
+        | columns["rank"].astype(np.int64)
+    )
@@ -2,22 +2,34 @@
 # @Author: Lewis Tian
 # @Date:   2025-04-27 19:28:54
 
+import argparse
 import json
 import os
 import sys
 from collections import defaultdict
 from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from glob import glob
 from logging import Logger
-from typing import List
+from typing import Dict, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
 
 import requests
 from image import (
+    LOG_PER_SECOND,
+    LOG_SAMPLE_EVERY,
+    IllustHint,
     batch_download_images,
-    batch_get_image_infos,
+    close_downloader,
     filter_and_save_image_by_map,
+    get_api_limiter,
+    get_meta_provider,
     get_url_basename,
+    is_downloaded,
+    resume_downloads,
 )
+from pydantic import ValidationError
+from rank_archive import RankArchive
 
 # 添加项目根目录到 sys.path
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
@@ -25,18 +37,44 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 import bootstrap  # noqa: F401, E402
-from model.pixiv_illustration import PixivItem, PixivResponse  # noqa: E402
-from utils.logger import get_logger  # noqa: E402
+from model.pixiv_illustration import (  # noqa: E402
+    PixivItem,
+    PixivRankBackfillCheckpoint,
+    PixivResponse,
+)
+from utils.capture import CapturedBody  # noqa: E402
+from utils.httper import get_session  # noqa: E402
+from utils.jobs import job  # noqa: E402
+from utils.jsoner import decode  # noqa: E402
+from utils.logger import get_logger, get_sampler  # noqa: E402
 
 MAX_RETRIES = 3
 CONCURRENT_LIMIT = 10
 IMAGE_QUALITY = ["original", "regular", "small", "thumb_mini"]
+MODES = ["daily", "weekly", "monthly", "rookie", "original", "daily_ai"]
+FAVORITE_COUNT = 1000  # 仅下载红心数超过1k的图片
+# 回填时同时抓取的排行榜数，请求速率另受 Pixiv 接口的共用限速约束
+BACKFILL_WORKERS = 8
+# 回填时每批处理的天数，每批下载入队后记录一次进度
+BACKFILL_CHUNK_DAYS = 7
+BACKFILL_FILEPATH = os.path.join(os.path.dirname(__file__), "backfill", "ranking.json")
+TIMEZONE = ZoneInfo("Asia/Shanghai")
 
 
-def rank_today_list(
-    logger: Logger, date: str = "", mode: str = "daily", max_page: int = 10
-) -> List[PixivItem]:
-    session = requests.Session()
+def fetch_rank_items(
+    logger: Logger,
+    date: str = "",
+    mode: str = "daily",
+    max_page: int = 10,
+    archive: Optional[RankArchive] = None,
+) -> Optional[List[PixivItem]]:
+    """
+    获取排行榜，跳过多页的作品；给出 archive 时每页完整写入排行榜历史
+
+    返回:
+        Optional[List[PixivItem]]: 任意一页请求或解析失败时返回 None
+    """
+    session = get_session()
     headers = {
         "referer": "https://www.pixiv.net/ranking.php",
         "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
@@ -50,32 +88,49 @@ def rank_today_list(
     if date:
         payload["date"] = date
 
+    sampler = get_sampler(logger)
+    limiter = get_api_limiter()
     pixiv_list = []
+    position = 0
     for p in range(1, max_page + 1):
         payload["p"] = str(p)
+        limiter.acquire()
         try:
             response = session.get(
                 base_url, params=payload, headers=headers, timeout=10
             )
             logger.info(f"Request URL: {response.url}")
-            logger.info(f"Response Text: {response.text}")
-            resp = response.json()
+            sampler.info(
+                "Response Text: %s", CapturedBody(response.text), every=LOG_SAMPLE_EVERY
+            )
         except requests.RequestException as e:
             logger.error(f"Request failed: {e}")
-            return []
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON decode failed: {e}")
-            return []
+            return None
 
-        if not resp:
+        if not response.content:
             logger.warning("Empty response.")
-            return []
+            return None
+
+        try:
+            pixivResponse = decode(response.content, PixivResponse)
+        except ValidationError as e:
+            logger.error(f"Failed to parse ranking page: {e}")
+            return None
+
+        if archive is not None:
+            # 名次缺失时按在榜单中的位置推算
+            for i, item in enumerate(pixivResponse.contents, position + 1):
+                item.rank = item.rank or i
+            archive.append(pixivResponse.date, mode, pixivResponse.contents)
+        position += len(pixivResponse.contents)
 
-        pixivResponse = PixivResponse.model_validate(resp)
         for item in pixivResponse.contents:
             if item.illust_page_count > 1:
-                logger.warning(
-                    f"📖 {item.illust_id} has {item.illust_page_count} pages, skip!"
+                sampler.warning(
+                    "📖 %s has %s pages, skip!",
+                    item.illust_id,
+                    item.illust_page_count,
+                    per_second=LOG_PER_SECOND,
                 )
                 continue
 
@@ -84,73 +139,203 @@ def rank_today_list(
     return pixiv_list
 
 
-def download_today_rank_image(logger: Logger, mode: str, favorite_count: int) -> None:
-    pixiv_list = rank_today_list(logger, mode=mode, max_page=2)
-    pids = [pixiv.illust_id for pixiv in pixiv_list]
-
-    infoMap = batch_get_image_infos(logger, pids, CONCURRENT_LIMIT)
-    to_be_downloaded_pids = []
-    urls = []
-    for pid, info in infoMap.items():
-        if not info:
-            logger.warning(f"⚠️ Failed to get image info for pid {pid}")
-            continue
+def rank_today_list(
+    logger: Logger,
+    date: str = "",
+    mode: str = "daily",
+    max_page: int = 10,
+    archive: Optional[RankArchive] = None,
+) -> List[PixivItem]:
+    """
+    获取排行榜，失败时返回空列表
+    """
+    return fetch_rank_items(logger, date, mode, max_page, archive) or []
 
-        # 过滤掉多页的图片
-        if info.pageCount > 1:
-            logger.info(f"📖 {pid} has {info.pageCount} pages, skip!")
-            continue
 
-        if info.bookmarkCount < favorite_count:
-            logger.info(f"💔 {pid}' favorite count: {info.bookmarkCount}, skip!")
-            continue
+def download_rank_items(
+    logger: Logger,
+    ranked: Dict[str, List[PixivItem]],
+    favorite_count: int,
+    seen: Optional[Set[int]] = None,
+) -> None:
+    """
+    下载多个排行榜中红心数不少于 favorite_count 的单页作品
 
-        url = info.urls.get_url()
-        if len(url) == 0:
-            logger.warning(f"⚠️ {pid} has no valid URL, skip!")
-            continue
-        urls.append(url)
-        to_be_downloaded_pids.append(pid)
+    同一作品只处理一次，记在第一次出现的排行榜模式下；已下载过的作品不再查询信息
 
+    参数:
+        ranked (Dict[str, List[PixivItem]]): 排行榜模式 -> 作品列表
+        seen (Optional[Set[int]]): 之前已经处理过的作品，跳过并加入本次处理的作品
+    """
     current_directory = os.path.dirname(__file__)
-    all_urls = []
-    all_save_paths = []
 
     # 已经下载的图片的 JSON 历史
-    download_images_local_map = {}
     download_images_global_map = {}
-    download_images_map_local_filepath = f"{current_directory}/rank_{mode}.json"
     download_images_map_global_filepath = f"{current_directory}/rank.json"
-    if os.path.exists(download_images_map_local_filepath):
-        with open(download_images_map_local_filepath, "r") as f:
-            download_images_local_map = json.load(f)
     if os.path.exists(download_images_map_global_filepath):
         with open(download_images_map_global_filepath, "r") as f:
             download_images_global_map = json.load(f)
+    local_maps: Dict[str, Dict[str, List[str]]] = {}
+    for mode in ranked:
+        local_maps[mode] = {}
+        download_images_map_local_filepath = f"{current_directory}/rank_{mode}.json"
+        if os.path.exists(download_images_map_local_filepath):
+            with open(download_images_map_local_filepath, "r") as f:
+                local_maps[mode] = json.load(f)
+
+    first_seen: Dict[int, Tuple[str, PixivItem]] = {}
+    for mode, pixiv_list in ranked.items():
+        for pixiv in pixiv_list:
+            if seen is None or pixiv.illust_id not in seen:
+                first_seen.setdefault(pixiv.illust_id, (mode, pixiv))
+    if seen is not None:
+        seen.update(first_seen)
+    hints = {
+        pid: IllustHint(pixiv.user_id, pixiv.illust_page_count, pixiv.url)
+        for pid, (mode, pixiv) in first_seen.items()
+        if not is_downloaded(
+            str(pixiv.user_id), pid, download_images_global_map, local_maps[mode]
+        )
+    }
+    total = sum(len(x) for x in ranked.values())
+    logger.info(
+        f"🔎 {len(first_seen)} unique pids in {total} ranking items, "
+        f"{len(first_seen) - len(hints)} downloaded"
+    )
+    metas = get_meta_provider().resolve(logger, hints, favorite_count)
+
+    all_urls = []
+    all_save_paths = []
+    all_scores = []
+    for mode, download_images_local_map in local_maps.items():
+        for pid, (pid_mode, pixiv) in first_seen.items():
+            if pid_mode != mode or pid not in metas:
+                continue
+            basename = get_url_basename(metas[pid].url)
+            if filter_and_save_image_by_map(
+                logger,
+                str(pixiv.user_id),
+                basename,
+                download_images_global_map,
+                download_images_local_map,
+            ):
+                continue
+            save_dir = os.path.join(current_directory, "images", f"{pixiv.user_id}")
+            save_path = os.path.join(save_dir, f"{basename}")
+            all_urls.append(metas[pid].url)
+            all_save_paths.append(save_path)
+            all_scores.append(metas[pid].bookmark_count)
 
-    for pixiv, url in zip(pixiv_list, urls):
-        basename = get_url_basename(url)
-        if filter_and_save_image_by_map(
-            logger,
-            str(pixiv.user_id),
-            basename,
-            download_images_global_map,
-            download_images_local_map,
-        ):
-            continue
-        save_dir = os.path.join(current_directory, "images", f"{pixiv.user_id}")
-        save_path = os.path.join(save_dir, f"{basename}")
-        all_urls.append(url)
-        all_save_paths.append(save_path)
-
-    with open(download_images_map_local_filepath, "w") as f:
-        json.dump(download_images_local_map, f, ensure_ascii=False, indent=0)
+        download_images_map_local_filepath = f"{current_directory}/rank_{mode}.json"
+        with open(download_images_map_local_filepath, "w") as f:
+            json.dump(download_images_local_map, f, ensure_ascii=False, indent=0)
 
     batch_download_images(
-        logger, all_urls, all_save_paths, max_workers=CONCURRENT_LIMIT
+        logger,
+        all_urls,
+        all_save_paths,
+        max_workers=CONCURRENT_LIMIT,
+        scores=all_scores,
     )
 
 
+def download_today_rank_image(
+    logger: Logger, mode: str, favorite_count: int, archive: RankArchive
+) -> None:
+    pixiv_list = rank_today_list(logger, mode=mode, max_page=2, archive=archive)
+    download_rank_items(logger, {mode: pixiv_list}, favorite_count)
+
+
+def load_backfill_checkpoint(logger: Logger) -> PixivRankBackfillCheckpoint:
+    if os.path.exists(BACKFILL_FILEPATH):
+        try:
+            with open(BACKFILL_FILEPATH, "r", encoding="utf-8") as f:
+                return PixivRankBackfillCheckpoint.model_validate(json.load(f))
+        except Exception as e:
+            logger.error(f"❌ Failed to load checkpoint {BACKFILL_FILEPATH}: {e}")
+
+    return PixivRankBackfillCheckpoint()
+
+
+def save_backfill_checkpoint(checkpoint: PixivRankBackfillCheckpoint) -> None:
+    os.makedirs(os.path.dirname(BACKFILL_FILEPATH), exist_ok=True)
+    data = {k: sorted(v) for k, v in sorted(checkpoint.done.items())}
+    with open(BACKFILL_FILEPATH + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"done": data}, f, ensure_ascii=False, indent=0)
+    os.replace(BACKFILL_FILEPATH + ".tmp", BACKFILL_FILEPATH)
+
+
+def backfill_rankings(
+    logger: Logger,
+    dates: List[str],
+    modes: List[str],
+    favorite_count: int,
+    archive: RankArchive,
+) -> List[Tuple[str, str]]:
+    """
+    回填多个日期、多个模式的排行榜
+
+    每 BACKFILL_CHUNK_DAYS 天为一批：并发抓取这一批的 (日期, 模式) 排行榜（请求速率
+    受 Pixiv 接口的共用限速约束），去重后查询信息、下载。整个范围内同一作品只处理
+    一次。每批图片加入下载队列（中断后可恢复）后，记录这一批的 (日期, 模式) 已完成，
+    中断后重新运行时跳过
+
+    参数:
+        dates (List[str]): 排行榜日期 YYYYMMDD
+
+    返回:
+        List[Tuple[str, str]]: 抓取失败的 (日期, 模式)，重新运行时会重试
+    """
+    checkpoint = load_backfill_checkpoint(logger)
+    done = {mode: set(checkpoint.done.get(mode, [])) for mode in modes}
+    pairs = [(d, m) for d in dates for m in modes if d not in done[m]]
+    logger.info(
+        f"🚀 Backfill {len(dates)} days x {len(modes)} modes, "
+        f"{len(pairs)} rankings to fetch"
+    )
+
+    seen: Set[int] = set()
+    failed: List[Tuple[str, str]] = []
+    with ThreadPoolExecutor(max_workers=BACKFILL_WORKERS) as executor:
+        for start in range(0, len(dates), BACKFILL_CHUNK_DAYS):
+            end = start + BACKFILL_CHUNK_DAYS
+            chunk = set(dates[start:end])
+            futures = {
+                executor.submit(fetch_rank_items, logger, d, m, 2, archive): (d, m)
+                for d, m in pairs
+                if d in chunk
+            }
+            if not futures:
+                continue
+
+            ranked: Dict[str, List[PixivItem]] = defaultdict(list)
+            fetched: List[Tuple[str, str]] = []
+            # 按日期、模式的顺序收集，靠前的日期的作品先下载
+            for future, (d, m) in futures.items():
+                try:
+                    pixiv_list = future.result()
+                except Exception as e:
+                    logger.error(f"❌ Failed to fetch ranking {m} {d}: {e}")
+                    pixiv_list = None
+                if pixiv_list is None:
+                    failed.append((d, m))
+                    continue
+                ranked[m].extend(pixiv_list)
+                fetched.append((d, m))
+
+            if ranked:
+                download_rank_items(logger, ranked, favorite_count, seen)
+            for d, m in fetched:
+                done[m].add(d)
+            for mode, days in done.items():
+                checkpoint.done[mode] = sorted(days)
+            save_backfill_checkpoint(checkpoint)
+
+    if failed:
+        logger.warning(f"⚠️ {len(failed)} rankings failed, rerun to resume: {failed}")
+    return failed
+
+
 def merge_all_json_files(logger: Logger) -> None:
     current_directory = os.path.dirname(__file__)
     json_files = glob(os.path.join(current_directory, "rank*.json"))
@@ -178,16 +363,66 @@ def merge_all_json_files(logger: Logger) -> None:
         logger.error(f"Error writing output file: {e}")
 
 
-if __name__ == "__main__":
-    modes = ["daily", "weekly", "monthly", "rookie", "original", "daily_ai"]
-    logger = get_logger()
-    favorite_count = 1000  # 仅下载红心数超过1k的图片
-    with ThreadPoolExecutor(max_workers=len(modes)) as executor:
+def backfill_dates(start: str, end: str) -> List[str]:
+    """
+    [start, end] 内的每一天（YYYY-MM-DD），转为排行榜日期 YYYYMMDD
+    """
+    first = datetime.strptime(start, "%Y-%m-%d").date()
+    last = datetime.strptime(end, "%Y-%m-%d").date()
+    return [
+        (first + timedelta(days=i)).strftime("%Y%m%d")
+        for i in range((last - first).days + 1)
+    ]
+
+
+@job(timeout=2 * 60 * 60)
+def main():
+    logger = get_logger(use_queue=True)
+    archive = RankArchive()
+    resume_downloads(logger)
+    with ThreadPoolExecutor(max_workers=len(MODES)) as executor:
         futures = [
-            executor.submit(download_today_rank_image, logger, mode, favorite_count)
-            for mode in modes
+            executor.submit(
+                download_today_rank_image, logger, mode, FAVORITE_COUNT, archive
+            )
+            for mode in MODES
         ]
         for future in futures:
             future.result()
+    close_downloader(logger)
+    get_meta_provider().save()
 
     merge_all_json_files(logger)
+
+
+def run(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="下载 Pixiv 排行榜图片")
+    parser.add_argument("--start", help="回填开始日期 YYYY-MM-DD，指定后进入回填模式")
+    parser.add_argument("--end", help="回填结束日期 YYYY-MM-DD（包含），默认昨天")
+    parser.add_argument(
+        "--mode", action="append", choices=MODES, help="只回填指定的模式，可重复指定"
+    )
+    args = parser.parse_args(argv)
+    if not args.start:
+        main()
+        return
+
+    logger = get_logger(use_queue=True)
+    end = args.end or (datetime.now(TIMEZONE).date() - timedelta(days=1)).isoformat()
+    archive = RankArchive()
+    resume_downloads(logger)
+    backfill_rankings(
+        logger,
+        backfill_dates(args.start, end),
+        args.mode or MODES,
+        FAVORITE_COUNT,
+        archive,
+    )
+    close_downloader(logger)
+    get_meta_provider().save()
+
+    merge_all_json_files(logger)
+
+
+if __name__ == "__main__":
+    run()
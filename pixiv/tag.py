@@ -2,13 +2,13 @@
 # @Author: Lewis Tian
 # @Date:   2025-05-17 15:51:59
 
-import json
 import os
 import sys
 from logging import Logger
 from typing import List
 
 import requests
+from pydantic import ValidationError
 
 # 添加项目根目录到 sys.path
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
@@ -17,9 +17,12 @@ if project_root not in sys.path:
 
 import bootstrap  # noqa: F401, E402
 from model.pixiv_illustration import (  # noqa: E402
+    PixivBody,
     PixivTagItemInfo,
-    PixivTagItemRespInfo,
+    PixivTagSearchBody,
 )
+from utils.httper import get_session  # noqa: E402
+from utils.jsoner import decode  # noqa: E402
 
 
 def get_tag_pid_info(
@@ -29,7 +32,7 @@ def get_tag_pid_info(
         logger.error("❌ Empty tag.")
         return []
 
-    session = requests.Session()
+    session = get_session()
     headers = {
         "referer": "https://www.pixiv.net",
         "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
@@ -53,21 +56,21 @@ def get_tag_pid_info(
                 base_url, params=payload, headers=headers, timeout=10
             )
             logger.info(f"🌐 Request URL: {response.url}, page: {page}")
-            resp = response.json()
         except requests.RequestException as e:
             logger.error(f"❌ Request failed: {e}")
             return result
-        except json.JSONDecodeError as e:
-            logger.error(f"❌ JSON decode failed: {e}")
-            return result
 
-        if not resp:
+        if not response.content:
             logger.warning("⚠️ Empty response.")
             return result
 
-        illustManga = resp.get("body", {}).get("illustManga", {})
+        try:
+            body = decode(response.content, PixivBody[PixivTagSearchBody]).body
+        except ValidationError as e:
+            logger.error(f"❌ Failed to parse tag search result: {e}")
+            return result
 
-        ptiResp = PixivTagItemRespInfo.model_validate(illustManga)
+        ptiResp = body.illustManga
         result.extend(ptiResp.data)
 
         if page >= ptiResp.total:
@@ -12,11 +12,19 @@ from typing import Dict, List
 
 import requests
 from image import (
+    LOG_SAMPLE_EVERY,
+    IllustHint,
     batch_download_images,
-    batch_get_image_infos,
+    close_downloader,
     filter_and_save_image_by_map,
+    get_api_limiter,
+    get_meta_provider,
     get_url_basename,
+    is_downloaded,
+    resume_downloads,
 )
+from pydantic import ValidationError
+from rank_archive import RankArchive, today
 
 # 添加项目根目录到 sys.path
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
@@ -24,14 +32,24 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 import bootstrap  # noqa: F401, E402
-from model.pixiv_illustration import PixivUserTopItem  # noqa: E402
-from utils.logger import get_logger  # noqa: E402
+from model.pixiv_illustration import (  # noqa: E402
+    PixivBody,
+    PixivUserTopBody,
+    PixivUserTopItem,
+)
+from utils.capture import CapturedBody  # noqa: E402
+from utils.httper import get_session  # noqa: E402
+from utils.jobs import job  # noqa: E402
+from utils.jsoner import decode  # noqa: E402
+from utils.logger import get_logger, get_sampler  # noqa: E402
 
 CONCURRENT_LIMIT = 10
+# 统计最近多少天的上榜次数
+RANKING_DAYS = 365
 
 
 def get_user_top_items(logger: Logger, user_id: str) -> Dict[int, PixivUserTopItem]:
-    session = requests.Session()
+    session = get_session()
     headers = {
         "referer": "https://www.pixiv.net/ranking.php",
         "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
@@ -41,34 +59,34 @@ def get_user_top_items(logger: Logger, user_id: str) -> Dict[int, PixivUserTopIt
         "lang": "zh",
         "sensitiveFilterMode": "userSetting",
     }
-    result = {}
+    get_api_limiter().acquire()
     try:
         response = session.get(base_url, params=payload, headers=headers, timeout=10)
         logger.info(f"🌐 Request URL: {response.url}")
-        resp = response.json()
     except requests.RequestException as e:
-        logger.info(f"📄 Response Text: {response.text}")
         logger.error(f"❌ Request failed: {e}")
-        return result
-    except json.JSONDecodeError as e:
-        logger.error(f"❌ JSON decode failed: {e}")
-        return result
+        return {}
 
-    if not resp:
+    if not response.content:
         logger.warning("⚠️ Empty response.")
-        return result
+        return {}
+
+    # 整页一次校验，作品字典的键（pid）直接转为 int
+    try:
+        illusts = decode(response.content, PixivBody[PixivUserTopBody]).body.illusts
+    except ValidationError as e:
+        get_sampler(logger).info(
+            "📄 Response Text: %s", CapturedBody(response.text), every=LOG_SAMPLE_EVERY
+        )
+        logger.error(f"❌ Failed to parse user top illustrations: {e}")
+        return {}
 
-    illusts = resp.get("body", {}).get("illusts", {})
     if not illusts:
         logger.warning("⚠️ No illustrations found.")
-        return result
-
-    for pid, illust in illusts.items():
-        item = PixivUserTopItem.model_validate(illust)
-        result[int(pid)] = item
+        return {}
 
-    logger.info(f"✅ Found {len(result)} top illustrations for user {user_id}")
-    return result
+    logger.info(f"✅ Found {len(illusts)} top illustrations for user {user_id}")
+    return illusts
 
 
 def download_user_top_images(
@@ -80,38 +98,21 @@ def download_user_top_images(
     download_images_local_map = {}
     current_directory = os.path.dirname(__file__)
     user_top_images = get_user_top_items(logger, user_id)
-    pids = list(user_top_images.keys())
-    logger.info(f"🚀 Processing user: {user_id}, pids: {pids}")
-
-    infoMap = batch_get_image_infos(logger, pids, CONCURRENT_LIMIT)
-    to_be_downloaded_pids = []
-    urls = []
-    for pid, info in infoMap.items():
-        if not info:
-            logger.warning(f"⚠️ Failed to get image info for pid {pid}")
-            continue
-
-        # 过滤掉多页的图片
-        if info.pageCount > 1:
-            logger.warning(f"📖 {pid} has {info.pageCount} pages, skip!")
-            continue
-
-        if info.bookmarkCount < favorite_count:
-            logger.warning(f"💔 {pid}' favorite count: {info.bookmarkCount}, skip!")
-            continue
-
-        url = info.urls.get_url()
-        if len(url) == 0:
-            logger.warning(f"⚠️ {pid} has no valid URL, skip!")
-            continue
-        urls.append(url)
-        to_be_downloaded_pids.append(pid)
+    # 已下载过的作品不再查询信息
+    hints = {
+        pid: IllustHint(item.userId, item.pageCount, item.url)
+        for pid, item in user_top_images.items()
+        if not is_downloaded(str(item.userId), pid, download_images_global_map)
+    }
+    logger.info(f"🚀 Processing user: {user_id}, pids: {list(hints)}")
 
-    pixiv_list = [user_top_images[k] for k in to_be_downloaded_pids]
+    metas = get_meta_provider().resolve(logger, hints, favorite_count)
     all_urls = []
     all_save_paths = []
-    for pixiv, url in zip(pixiv_list, urls):
-        basename = get_url_basename(url)
+    all_scores = []
+    for pid, meta in metas.items():
+        pixiv = user_top_images[pid]
+        basename = get_url_basename(meta.url)
         if filter_and_save_image_by_map(
             logger,
             str(pixiv.userId),
@@ -122,22 +123,55 @@ def download_user_top_images(
             continue
         save_dir = os.path.join(current_directory, "images", f"{pixiv.userId}")
         save_path = os.path.join(save_dir, f"{basename}")
-        all_urls.append(url)
+        all_urls.append(meta.url)
         all_save_paths.append(save_path)
+        all_scores.append(meta.bookmark_count)
     try:
         if len(all_urls) > 0:
             logger.info(
                 f"📥 Start downloading {len(all_urls)} images for user {user_id}"
             )
-            batch_download_images(logger, all_urls, all_save_paths, CONCURRENT_LIMIT)
+            batch_download_images(
+                logger, all_urls, all_save_paths, CONCURRENT_LIMIT, all_scores
+            )
         return download_images_local_map
     except Exception as e:
         logger.error(f"❌ Error downloading images: {e}")
         return {}
 
 
+def select_users(
+    logger: Logger,
+    download_images_global_map: Dict[str, List[str]],
+    ranking_times: int,
+    days: int,
+) -> List[str]:
+    """
+    选出最近 days 天上榜超过 ranking_times 个不同作品的用户（排行榜历史归档中的全部模式）；
+    归档还不满 days 天时退回按 rank.json 中已下载的图片数计算，避免刚开始归档时
+    只按几天的记录选用户
+    """
+    archive = RankArchive()
+    first_day = archive.first_day()
+    if first_day is not None and first_day <= today() - days + 1:
+        ranked = archive.frequent_users(ranking_times + 1, days=days)
+        logger.info(
+            f"📊 {len(ranked)} users ranked > {ranking_times} times in {days} days"
+        )
+        return [str(uid) for uid in ranked]
+
+    logger.info(f"📊 Ranking archive covers < {days} days, select users by rank.json")
+    return [
+        uid
+        for uid, images in download_images_global_map.items()
+        if len(images) > ranking_times
+    ]
+
+
+# 排行榜任务会更新 rank.json 和排行榜历史，之后再处理用户
+@job(depends=["pixiv.ranking"], timeout=2 * 60 * 60)
 def main():
-    logger = get_logger()
+    logger = get_logger(use_queue=True)
 
     current_directory = os.path.dirname(__file__)
     download_images_map_global_filepath = f"{current_directory}/rank.json"
@@ -164,14 +198,15 @@ def main():
         except Exception as e:
             logger.error(f"❌ Error processing user {uid}: {e}")
 
-    user_ids = [
-        uid
-        for uid, images in download_images_global_map.items()
-        if len(images) > user_ranking_times
-    ]
+    user_ids = select_users(
+        logger, download_images_global_map, user_ranking_times, RANKING_DAYS
+    )
     logger.info(f"👥 Processing {len(user_ids)} users")
+    resume_downloads(logger)
     with ThreadPoolExecutor(max_workers=CONCURRENT_LIMIT) as executor:
         executor.map(process_user, user_ids)
+    close_downloader(logger)
+    get_meta_provider().save()
 
     with open(download_images_map_global_filepath, "w") as f:
         json.dump(download_images_global_map, f, ensure_ascii=False, indent=0)
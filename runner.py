@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# @Author: Lewis Tian
+# @Date:   2026-10-19 23:38:12
+# @Desc:   在同一个进程中发现并执行所有监控任务，替代 run_python.sh 为每个文件启动 python3
+#
+# 用法：
+#   python runner.py                      # 执行全部任务
+#   python runner.py pixiv.user           # 只执行 pixiv.user 及其依赖
+#   python runner.py --list
+#   python runner.py --group-limit pixiv=2 --max-workers 6
+
+import argparse
+import importlib
+import os
+import sys
+from logging import Logger
+from typing import Dict, List
+
+import bootstrap  # noqa: F401
+from utils.jobs import get_jobs, log_timing, resolve, run_jobs
+from utils.logger import get_logger
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+# 公共库与性能测试目录不是监控任务
+SKIP_DIRS = {"benchmark", "model", "utils"}
+MAX_WORKERS = 4
+DEFAULT_TIMEOUT = 60 * 60
+
+
+def discover(logger: Logger) -> List[str]:
+    """
+    导入各任务目录下的所有模块，@job 装饰的函数在导入时完成注册
+
+    各目录内的模块以文件名互相导入（如 pixiv 下的 from image import ...），
+    因此把目录本身加入 sys.path，并用文件名作为模块名导入。
+
+    返回:
+        List[str]: 导入失败的模块
+    """
+    failed = []
+    for dirname in sorted(os.listdir(PROJECT_ROOT)):
+        dirpath = os.path.join(PROJECT_ROOT, dirname)
+        if (
+            dirname in SKIP_DIRS
+            or dirname.startswith((".", "_"))
+            or not os.path.isdir(dirpath)
+        ):
+            continue
+
+        if dirpath not in sys.path:
+            sys.path.insert(0, dirpath)
+        for filename in sorted(os.listdir(dirpath)):
+            if not filename.endswith(".py"):
+                continue
+            module = filename[:-3]
+            try:
+                importlib.import_module(module)
+            except Exception as e:
+                logger.error(f"❌ Failed to import {dirname}/{filename}: {e}")
+                failed.append(f"{dirname}.{module}")
+    return failed
+
+
+def parse_group_limits(values: List[str]) -> Dict[str, int]:
+    """
+    解析 GROUP=N 形式的分组并发限制，N 至少为 1，格式错误时抛出 ValueError
+    """
+    limits = {}
+    for value in values or []:
+        group, sep, limit = value.partition("=")
+        if not sep or not group or not limit.strip().isdigit() or int(limit) < 1:
+            raise ValueError(
+                f"invalid --group-limit {value!r}, expected GROUP=N (N >= 1)"
+            )
+        limits[group] = int(limit)
+    return limits
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="执行监控任务")
+    parser.add_argument("jobs", nargs="*", help="要执行的任务，默认全部")
+    parser.add_argument("--list", action="store_true", help="列出任务后退出")
+    parser.add_argument(
+        "--max-workers", type=int, default=MAX_WORKERS, help="同时运行的任务数"
+    )
+    parser.add_argument(
+        "--group-limit",
+        action="append",
+        metavar="GROUP=N",
+        help="分组内同时运行的任务数，默认 1，如 pixiv=2",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=DEFAULT_TIMEOUT,
+        help="未单独设置超时的任务的超时秒数",
+    )
+    parser.add_argument(
+        "--strict", action="store_true", help="有任务失败时以非零状态码退出"
+    )
+    args = parser.parse_args()
+    try:
+        group_limits = parse_group_limits(args.group_limit)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.max_workers < 1:
+        parser.error("--max-workers must be >= 1")
+
+    logger = get_logger(use_queue=True)
+    import_failed = discover(logger)
+    jobs = get_jobs()
+
+    if args.list:
+        for job in jobs.values():
+            depends = f" <- {', '.join(job.depends)}" if job.depends else ""
+            timeout = f" timeout={job.timeout:.0f}s" if job.timeout else ""
+            print(f"{job.name} [{job.group}]{timeout}{depends}")
+        return 0
+
+    selected = resolve(jobs, args.jobs) if args.jobs else jobs
+    logger.info(f"🌟 Running {len(selected)} jobs: {', '.join(selected)}")
+    results = run_jobs(
+        logger,
+        selected,
+        max_workers=args.max_workers,
+        group_limits=group_limits,
+        default_timeout=args.timeout,
+    )
+    log_timing(logger, results)
+
+    failed = [r for r in results if r.status != "ok"]
+    if args.strict and (failed or import_failed):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,7 +7,9 @@ import math
 import os
 import pickle
 
-import bitarray
+from utils.lazy import lazy_import
+
+bitarray = lazy_import("bitarray")
 
 
 class BloomFilter:
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# @Author: Lewis Tian
+# @Date:   2026-10-19 21:48:25
+# @Desc:   响应内容记录：日志中只保留截断的预览，完整内容按需写入压缩归档
+#
+# 设置环境变量 RESPONSE_CAPTURE_DIR 后，完整响应以 sha256 为 key 压缩保存在该目录，
+# 日志中记录 key；查看：python utils/capture.py <key>
+
+import argparse
+import gzip
+import hashlib
+import os
+from typing import Optional
+
+CAPTURE_DIR_ENV = "RESPONSE_CAPTURE_DIR"
+PREVIEW_LENGTH = 200
+KEY_LENGTH = 16
+
+_capture_dir: Optional[str] = os.environ.get(CAPTURE_DIR_ENV) or None
+
+
+def set_capture_dir(capture_dir: Optional[str]) -> None:
+    """
+    设置归档目录，为 None 时不保存完整响应
+    """
+    global _capture_dir
+    _capture_dir = capture_dir
+
+
+def get_capture_path(key: str, capture_dir: str) -> str:
+    return os.path.join(capture_dir, key[:2], f"{key}.gz")
+
+
+def preview(text: str, length: int = PREVIEW_LENGTH) -> str:
+    """
+    合并空白字符并截断，超出部分以剩余长度代替
+    """
+    text = " ".join(text.split())
+    if len(text) <= length:
+        return text
+    return f"{text[:length]}…(+{len(text) - length} chars)"
+
+
+def archive(text: str, capture_dir: Optional[str] = None) -> Optional[str]:
+    """
+    把完整响应压缩写入归档目录，相同内容只保存一份
+
+    参数:
+        text (str): 响应内容
+        capture_dir (Optional[str]): 归档目录，默认使用 set_capture_dir / 环境变量的设置
+
+    返回:
+        Optional[str]: 归档 key，未配置归档目录时返回 None
+    """
+    capture_dir = capture_dir or _capture_dir
+    if not capture_dir:
+        return None
+
+    data = text.encode("utf-8")
+    key = hashlib.sha256(data).hexdigest()[:KEY_LENGTH]
+    filepath = get_capture_path(key, capture_dir)
+    if not os.path.exists(filepath):
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        tmp_filepath = f"{filepath}.{os.getpid()}.tmp"
+        with gzip.open(tmp_filepath, "wb") as f:
+            f.write(data)
+        os.replace(tmp_filepath, filepath)
+    return key
+
+
+def read_capture(key: str, capture_dir: Optional[str] = None) -> str:
+    capture_dir = capture_dir or _capture_dir
+    if not capture_dir:
+        raise ValueError(f"capture dir not configured, set {CAPTURE_DIR_ENV}")
+    with gzip.open(get_capture_path(key, capture_dir), "rb") as f:
+        return f.read().decode("utf-8")
+
+
+class CapturedBody:
+    """
+    作为日志参数使用：logger.info("Response Text: %s", CapturedBody(response.text))
+
+    只有日志真正输出时才生成预览并写入归档，被过滤或采样掉的日志没有额外开销
+    """
+
+    __slots__ = ("text", "rendered")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.rendered: Optional[str] = None
+
+    def __str__(self) -> str:
+        if self.rendered is None:
+            try:
+                key = archive(self.text)
+            except OSError as e:
+                key = f"failed: {e}"
+            self.rendered = (
+                f"{preview(self.text)} "
+                f"[{len(self.text)} chars, capture={key or 'off'}]"
+            )
+        return self.rendered
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="查看归档的完整响应")
+    parser.add_argument("key", help="日志中 capture= 后面的 key")
+    parser.add_argument("--dir", default=_capture_dir, help="归档目录")
+    args = parser.parse_args()
+    print(read_capture(args.key, args.dir))
+
+
+if __name__ == "__main__":
+    main()
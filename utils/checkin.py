@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+# @Author: Lewis Tian
+# @Date:   2026-10-20 13:10:27
+# @Desc:   多账号并发签到：共用一个 aiohttp 会话，每个账号独立的 Cookie 与重试，
+#           全部完成后把结果批量写入各账号的时间序列
+
+import logging
+import os
+import re
+import time
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+from urllib.parse import unquote
+
+from utils.capture import CapturedBody
+from utils.jsoner import decode, loads
+from utils.lazy import lazy_import
+from utils.precise import MAX_LEAD, FireReport, prepare_fire
+from utils.retry import RETRY_STATUS, RetryPolicy, parse_retry_after
+from utils.timeseries import TimeSeriesStore, save_and_export
+
+# asyncio 和 aiohttp 合计导入约 200ms，签到时才需要
+asyncio = lazy_import("asyncio")
+aiohttp = lazy_import("aiohttp")
+
+# 同时进行的签到请求数
+MAX_CONCURRENCY = 16
+REQUEST_TIMEOUT = 10
+# 准点签到时任务最长的运行时间：等待目标时刻 + 签到
+JOB_TIMEOUT = MAX_LEAD + 60
+LATENCY_COLUMNS = ["offset_ms", "error_ms", "send_ms", "response_ms"]
+
+
+class Account(NamedTuple):
+    name: str  # 用于日志和时间序列目录名
+    cookie: str
+
+
+CheckIn = Callable[["aiohttp.ClientSession", Account], Awaitable[int]]
+
+
+def get_cookie_value(cookie: str, key: str) -> Optional[str]:
+    for item in cookie.split(";"):
+        name, _, value = item.strip().partition("=")
+        if name == key and value:
+            return value
+    return None
+
+
+def account_name(value: str) -> str:
+    """账号名会用作目录名，Cookie 中的中文等通常经过 URL 编码"""
+    return re.sub(r"[^\w.-]", "_", unquote(value))
+
+
+def parse_accounts(
+    values: Iterable[str], name_keys: Iterable[str] = ()
+) -> List[Account]:
+    """
+    解析账号列表，每个值可以包含多个以换行分隔的 Cookie（便于放在一个环境变量中）
+
+    参数:
+        values (Iterable[str]): 命令行 --cookie 或环境变量的值
+        name_keys (Iterable[str]): 用作账号名的 Cookie 字段，依次尝试，如京东的 pt_pin
+
+    返回:
+        List[Account]: 按出现顺序排列，同名账号只保留第一个
+    """
+    accounts: Dict[str, Account] = {}
+    cookies = [c.strip() for v in values for c in v.splitlines() if c.strip()]
+    for i, cookie in enumerate(cookies, 1):
+        names = [get_cookie_value(cookie, key) for key in name_keys]
+        name = account_name(next((n for n in names if n), f"account{i}"))
+        accounts.setdefault(name, Account(name, cookie))
+    return list(accounts.values())
+
+
+async def fetch_json(
+    session: "aiohttp.ClientSession",
+    logger: logging.Logger,
+    account: Account,
+    method: str,
+    url: str,
+    headers: Dict[str, str],
+    retry: Optional[RetryPolicy] = None,
+    model: Optional[Any] = None,
+) -> Optional[Any]:
+    """
+    发送请求并解析 JSON，网络错误和可重试的状态码按 retry 退避重试
+
+    参数:
+        model (Optional[Any]): 给出时直接从响应的 bytes 校验为该 pydantic 模型
+
+    返回:
+        Optional[Any]: 解析后的 JSON 或模型，失败时返回 None
+    """
+    retry = retry or RetryPolicy(max_retries=2)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+    error = ""
+    for attempt in range(1, retry.attempts + 1):
+        retry_after = None
+        try:
+            async with session.request(
+                method, url, headers=headers, timeout=timeout
+            ) as resp:
+                body = await resp.read()
+                logger.info(f"[{account.name}] Request URL: {resp.url}")
+                if resp.status not in RETRY_STATUS:
+                    try:
+                        return loads(body) if model is None else decode(body, model)
+                    except ValueError as e:
+                        # json.JSONDecodeError 和 pydantic.ValidationError 都是 ValueError
+                        text = body.decode(resp.get_encoding(), "replace")
+                        logger.info(
+                            "[%s] Response Text: %s", account.name, CapturedBody(text)
+                        )
+                        logger.error(f"[{account.name}] JSON decode failed: {e}")
+                        return None
+                error = f"HTTP {resp.status}"
+                retry_after = parse_retry_after(resp.headers)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error = str(e) or type(e).__name__
+
+        if attempt < retry.attempts:
+            delay = retry.delay(attempt, retry_after)
+            logger.warning(
+                f"[{account.name}] 请求失败: {error}，{delay:.1f}s 后重试第 {attempt} 次"
+            )
+            await asyncio.sleep(delay)
+
+    logger.error(f"[{account.name}] Request failed: {error}")
+    return None
+
+
+async def check_in_all(
+    logger: logging.Logger,
+    accounts: List[Account],
+    check_in: CheckIn,
+    max_concurrency: int = MAX_CONCURRENCY,
+    fire_at: Optional[float] = None,
+    probe_url: str = "",
+) -> Tuple[Dict[str, int], Optional[FireReport]]:
+    """
+    在同一个会话中并发签到；会话不保存服务器返回的 Cookie，账号之间互不影响，
+    某个账号出错也不会中断其他账号
+
+    参数:
+        fire_at (Optional[float]): 准点签到的目标时间戳（服务器时间），为 None 时立即签到
+        probe_url (str): 估计服务器时钟、预热连接用的 URL，与签到接口同一 host
+
+    返回:
+        Tuple[Dict[str, int], Optional[FireReport]]:
+            (账号名 -> 签到结果，失败为 -1; 准点签到时各请求的发出时间)
+    """
+    sem = asyncio.Semaphore(max_concurrency)
+    timings: Dict[str, Tuple[float, float]] = {}
+
+    async def run_one(session: "aiohttp.ClientSession", account: Account) -> int:
+        async with sem:
+            sent = time.time()
+            try:
+                return await check_in(session, account)
+            except Exception as e:
+                logger.exception(f"[{account.name}] 签到出错: {e}")
+                return -1
+            finally:
+                timings[account.name] = (sent, time.time())
+
+    connector = aiohttp.TCPConnector(limit=max_concurrency)
+    async with aiohttp.ClientSession(
+        connector=connector, cookie_jar=aiohttp.DummyCookieJar()
+    ) as session:
+        clock = None
+        if fire_at is not None:
+            connections = min(len(accounts), max_concurrency)
+            clock = await prepare_fire(session, logger, probe_url, fire_at, connections)
+        results = await asyncio.gather(*(run_one(session, a) for a in accounts))
+
+    report = FireReport(fire_at, clock, timings) if clock is not None else None
+    return {a.name: r for a, r in zip(accounts, results)}, report
+
+
+def run_check_in(
+    logger: logging.Logger,
+    accounts: List[Account],
+    check_in: CheckIn,
+    fire_at: Optional[float] = None,
+    probe_url: str = "",
+) -> Tuple[Dict[str, int], Optional[FireReport]]:
+    return asyncio.run(
+        check_in_all(logger, accounts, check_in, fire_at=fire_at, probe_url=probe_url)
+    )
+
+
+def save_fire_report(
+    logger: logging.Logger, directory: str, series: str, report: FireReport
+) -> None:
+    """
+    记录准点签到的时钟偏差、最晚的发出时间和最长的耗时到 data/{series}_latency
+    """
+    report.log(logger)
+    send = max(report.send_delays().values())
+    response = max(done - sent for sent, done in report.timings.values())
+    store = TimeSeriesStore(
+        os.path.join(directory, "data", f"{series}_latency"),
+        LATENCY_COLUMNS,
+        retention_days=30,
+    )
+    store.append(
+        int(report.target),
+        [
+            report.clock.offset * 1000,
+            report.clock.error * 1000,
+            send * 1000,
+            response * 1000,
+        ],
+    )
+
+
+def save_results(
+    logger: logging.Logger,
+    directory: str,
+    series: str,
+    header: List[str],
+    timestamp: int,
+    results: Dict[str, int],
+    expire: int = 14,
+    primary: Optional[str] = None,
+) -> Optional[str]:
+    """
+    批量写入各账号的时间序列，跳过失败（结果小于 0）的账号
+
+    每个账号按账号名写入 data/{series}_{账号名} 和 csv/{series}_{账号名}.csv，
+    账号的顺序或数量变化时各账号的历史不会混在一起
+
+    参数:
+        primary (Optional[str]): README 展示的账号名，为 None 时只有一个账号才展示该账号
+
+    返回:
+        Optional[str]: 展示账号的时间序列目录，没有展示账号或该账号签到失败时返回 None
+    """
+    if primary is not None:
+        primary = account_name(primary)
+        if primary not in results:
+            logger.warning(f"⚠️ README 展示的账号 {primary} 不在本次签到的账号中")
+    elif len(results) == 1:
+        primary = next(iter(results))
+    else:
+        logger.warning("⚠️ 有多个账号但未指定 README 展示的账号，不更新 README")
+
+    csv_dir = os.path.join(directory, "csv")
+    os.makedirs(csv_dir, exist_ok=True)
+
+    primary_dir = None
+    for name, value in results.items():
+        if value < 0:
+            continue
+        stem = f"{series}_{name}"
+        dirpath = os.path.join(directory, "data", stem)
+        save_and_export(
+            dirpath,
+            os.path.join(csv_dir, f"{stem}.csv"),
+            logger,
+            header,
+            [timestamp, value],
+            expire,
+        )
+        if name == primary:
+            primary_dir = dirpath
+    return primary_dir
@@ -0,0 +1,571 @@
+# -*- coding: utf-8 -*-
+# @Author: Lewis Tian
+# @Date:   2026-10-19 19:11:36
+# @Desc:   统一的下载管理：重试退避、按 host 的连接池、并发限制、进度回调、持久化任务队列
+#           同步下载按 score 从高到低执行，给定截止时间时不再开始来不及完成的任务
+
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from logging import Logger
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from pydantic import BaseModel
+
+from utils.lazy import lazy_import
+from utils.logger import get_sampler
+from utils.retry import RETRY_STATUS, RetryPolicy, parse_retry_after
+from utils.writer import get_content_length, write_stream, write_stream_async
+
+# 同步下载只用 requests，异步下载只用 aiohttp（导入约 170ms），各自在第一次使用时导入
+aiohttp = lazy_import("aiohttp")
+requests = lazy_import("requests")
+urllib3 = lazy_import("urllib3")
+
+# 任务跨多次运行仍失败时丢弃
+MAX_JOB_RUNS = 3
+# 下载成功的日志每秒最多记录的条数，总数见 log_summary
+SUCCESS_LOG_PER_SECOND = 10
+# 单个任务耗时（含重试）的指数加权平均系数
+JOB_SECONDS_ALPHA = 0.2
+
+
+class DownloadJob(BaseModel):
+    url: str
+    save_path: str
+    headers: Dict[str, str] = {}
+    runs: int = 0  # 已经尝试过的运行次数
+    error: str = ""
+    score: float = 0  # 优先级，越大越先下载，如作品的收藏数
+
+    class Config:
+        extra = "ignore"
+
+
+class DownloadProgress(NamedTuple):
+    job: DownloadJob
+    downloaded: int  # 已下载字节数
+    total: Optional[int]  # Content-Length，未知时为 None
+    elapsed: float  # 已耗时（秒）
+    done: bool  # 是否结束
+    ok: bool  # 结束时是否成功
+
+    @property
+    def throughput(self) -> float:
+        """下载速度（字节/秒）"""
+        return self.downloaded / self.elapsed if self.elapsed > 0 else 0.0
+
+
+ProgressCallback = Callable[[DownloadProgress], None]
+
+
+class DownloadQueue:
+    """
+    持久化的下载任务队列，记录尚未完成（pending）和失败（failed）的任务，
+    进程中断或下载失败的任务可以在下次运行时继续
+    """
+
+    SAVE_INTERVAL = 1.0
+
+    def __init__(self, filepath: Optional[str] = None, logger: Optional[Logger] = None):
+        self.filepath = filepath
+        self.logger = logger
+        self.pending: Dict[str, DownloadJob] = {}
+        self.failed: Dict[str, DownloadJob] = {}
+        self.lock = threading.Lock()
+        # 多个线程同时保存时，快照和写文件整体串行，后写入的总是更新的快照
+        self.write_lock = threading.Lock()
+        self.dirty = False
+        self.saved_at = 0.0
+        self.load()
+
+    def load(self) -> None:
+        if not self.filepath or not os.path.exists(self.filepath):
+            return
+        try:
+            with open(self.filepath, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            loaded = {}
+            for key in ("pending", "failed"):
+                jobs = {}
+                for item in data.get(key, []):
+                    job = DownloadJob.model_validate(item)
+                    jobs[job.save_path] = job
+                loaded[key] = jobs
+        except (OSError, ValueError, AttributeError) as e:
+            # 文件损坏（如写到一半）时从空队列开始，不影响本次下载
+            if self.logger:
+                self.logger.error(f"❌ Failed to load queue {self.filepath}: {e}")
+            return
+        self.pending = loaded["pending"]
+        self.failed = loaded["failed"]
+
+    def save(self, force: bool = True) -> None:
+        """写入队列文件，force 为 False 时按 SAVE_INTERVAL 限频"""
+        if not self.filepath:
+            return
+        if not force and not self.write_lock.acquire(blocking=False):
+            # 其他线程正在保存，限频的保存直接跳过，dirty 保留到下次
+            return
+        if force:
+            self.write_lock.acquire()
+        try:
+            with self.lock:
+                if not self.dirty:
+                    return
+                now = time.monotonic()
+                if not force and now - self.saved_at < self.SAVE_INTERVAL:
+                    return
+                data = {
+                    "pending": [j.model_dump() for j in self.pending.values()],
+                    "failed": [j.model_dump() for j in self.failed.values()],
+                }
+                self.dirty = False
+                self.saved_at = now
+
+            dirpath = os.path.dirname(os.path.abspath(self.filepath))
+            os.makedirs(dirpath, exist_ok=True)
+            tmp_filepath = self.filepath + ".tmp"
+            with open(tmp_filepath, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=0)
+            os.replace(tmp_filepath, self.filepath)
+        finally:
+            self.write_lock.release()
+
+    def add(self, job: DownloadJob) -> None:
+        with self.lock:
+            self.failed.pop(job.save_path, None)
+            self.pending[job.save_path] = job
+            self.dirty = True
+        self.save(force=False)
+
+    def succeed(self, job: DownloadJob) -> None:
+        with self.lock:
+            self.pending.pop(job.save_path, None)
+            self.failed.pop(job.save_path, None)
+            self.dirty = True
+        self.save(force=False)
+
+    def fail(self, job: DownloadJob, error: str) -> None:
+        job.error = error
+        with self.lock:
+            self.pending.pop(job.save_path, None)
+            self.failed[job.save_path] = job
+            self.dirty = True
+        self.save(force=False)
+
+    def leftovers(self) -> List[DownloadJob]:
+        """取出上次运行遗留的任务，超过 MAX_JOB_RUNS 的直接丢弃"""
+        with self.lock:
+            jobs = list(self.pending.values()) + list(self.failed.values())
+            self.pending = {}
+            self.failed = {}
+            self.dirty = True
+        return [j for j in jobs if j.runs < MAX_JOB_RUNS]
+
+
+class DownloadManager:
+    """
+    同步/异步下载共用的部分：重试策略、任务队列、进度回调、吞吐统计和日志
+    """
+
+    def __init__(
+        self,
+        logger: Logger,
+        headers: Optional[Dict[str, str]] = None,
+        max_concurrency: int = 10,
+        per_host_limit: int = 10,
+        retry: Optional[RetryPolicy] = None,
+        queue_path: Optional[str] = None,
+        on_progress: Optional[ProgressCallback] = None,
+        timeout: float = 30,
+    ):
+        """
+        :param logger: 日志记录器
+        :param headers: 所有请求共用的请求头
+        :param max_concurrency: 同时下载的最大数量
+        :param per_host_limit: 每个 host 的最大连接数
+        :param retry: 重试策略
+        :param queue_path: 持久化任务队列路径，为空则不持久化
+        :param on_progress: 进度回调，每写入一块以及结束时调用
+        :param timeout: 单次读写超时（秒）
+        """
+        self.logger = logger
+        self.sampler = get_sampler(logger)
+        self.headers = headers or {}
+        self.max_concurrency = max_concurrency
+        self.per_host_limit = per_host_limit
+        self.retry = retry or RetryPolicy()
+        self.queue = DownloadQueue(queue_path, logger)
+        self.on_progress = on_progress
+        self.timeout = timeout
+
+        self.stats_lock = threading.Lock()
+        self.started_at = time.monotonic()
+        self.total_bytes = 0
+        self.succeeded = 0
+        self.failed = 0
+
+    def report(
+        self,
+        job: DownloadJob,
+        downloaded: int,
+        total: Optional[int],
+        started: float,
+        done: bool = False,
+        ok: bool = False,
+    ) -> None:
+        if not self.on_progress:
+            return
+        elapsed = time.monotonic() - started
+        try:
+            self.on_progress(
+                DownloadProgress(job, downloaded, total, elapsed, done, ok)
+            )
+        except Exception as e:
+            self.logger.error(f"❌ Progress callback failed: {e}")
+
+    def finish(self, job: DownloadJob, ok: bool, size: int, error: str = "") -> bool:
+        with self.stats_lock:
+            if ok:
+                self.succeeded += 1
+                self.total_bytes += size
+            else:
+                self.failed += 1
+        if ok:
+            self.queue.succeed(job)
+            self.sampler.info(
+                "✅ 下载成功: %s",
+                os.path.basename(job.save_path),
+                per_second=SUCCESS_LOG_PER_SECOND,
+            )
+        else:
+            self.queue.fail(job, error)
+            self.logger.error(f"❌ 最终失败: {job.url}")
+        return ok
+
+    def start(self, jobs: Iterable[DownloadJob], resume: bool) -> List[DownloadJob]:
+        """登记本次的任务，resume 时合并上次运行遗留的任务"""
+        jobs = list(jobs)
+        if resume:
+            keys = {j.save_path for j in jobs}
+            leftovers = [j for j in self.queue.leftovers() if j.save_path not in keys]
+            if leftovers:
+                self.logger.info(f"🔁 Resume {len(leftovers)} unfinished downloads")
+            jobs += leftovers
+        for job in jobs:
+            job.runs += 1
+            self.queue.add(job)
+        self.queue.save()
+        return jobs
+
+    def throughput(self) -> float:
+        """整体下载速度（字节/秒）"""
+        elapsed = time.monotonic() - self.started_at
+        return self.total_bytes / elapsed if elapsed > 0 else 0.0
+
+    def log_summary(self) -> None:
+        self.logger.info(
+            f"📊 下载完成: 成功 {self.succeeded}，失败 {self.failed}，"
+            f"{self.total_bytes / 1024 / 1024:.1f} MiB，"
+            f"{self.throughput() / 1024 / 1024:.2f} MiB/s"
+        )
+
+
+class Downloader(DownloadManager):
+    """
+    同步下载：线程池并发，requests 连接池按 host 限制连接数
+
+    download_all 的任务进入共用的优先队列，空闲的线程总是取 score 最高的任务，
+    多个线程同时提交的任务也按 score 统一排序。给定 deadline 时，按最近任务的平均耗时
+    估计，来不及在截止前完成的任务不再开始，留在任务队列中等下次运行
+    """
+
+    def __init__(self, logger: Logger, deadline: Optional[float] = None, **kwargs):
+        """
+        :param deadline: 截止时间（time.time() 的时间戳），为空则不限
+        """
+        super().__init__(logger, **kwargs)
+        self.deadline = deadline
+        # (-score, 序号, 任务, 结果)
+        self.heap: List[Tuple[float, int, DownloadJob, Future]] = []
+        self.heap_lock = threading.Lock()
+        self.seq = itertools.count()
+        self.job_seconds: Optional[float] = None
+        self.deferred = 0
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        # pool_block=True：同一 host 的连接数达到上限时等待，而不是新建连接
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=self.max_concurrency,
+            pool_maxsize=self.per_host_limit,
+            pool_block=True,
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+
+    def download(self, url: str, save_path: str) -> bool:
+        """
+        下载单个文件
+        :param url: 文件 URL
+        :param save_path: 保存路径
+        :return: 是否成功
+        """
+        job = DownloadJob(url=url, save_path=save_path)
+        job.runs += 1
+        self.queue.add(job)
+        return self.download_job(job)
+
+    def download_job(self, job: DownloadJob) -> bool:
+        error = ""
+        for attempt in range(1, self.retry.attempts + 1):
+            retry_after = None
+            started = time.monotonic()
+            try:
+                response = self.session.get(
+                    job.url, headers=job.headers, stream=True, timeout=self.timeout
+                )
+                with response:
+                    if response.status_code != 200:
+                        error = f"status {response.status_code}"
+                        if response.status_code not in RETRY_STATUS:
+                            self.logger.warning(
+                                f"⚠️ 状态码 {response.status_code}，不再重试: {job.url}"
+                            )
+                            break
+                        self.logger.warning(
+                            f"⚠️ 状态码 {response.status_code}，"
+                            f"第 {attempt} 次重试: {job.url}"
+                        )
+                        retry_after = parse_retry_after(response.headers)
+                    else:
+                        total = get_content_length(response.headers)
+                        downloaded = 0
+
+                        def progress(n: int) -> None:
+                            nonlocal downloaded
+                            downloaded += n
+                            self.report(job, downloaded, total, started)
+
+                        # 由 urllib3 负责解压 Content-Encoding
+                        response.raw.decode_content = True
+                        size = write_stream(
+                            response.raw, job.save_path, total, progress
+                        )
+                        self.report(job, size, total, started, done=True, ok=True)
+                        return self.finish(job, True, size)
+            except (
+                requests.RequestException,
+                urllib3.exceptions.HTTPError,
+                OSError,
+            ) as e:
+                error = str(e)
+                self.logger.error(f"请求失败: {e}, 尝试重试第 {attempt} 次: {job.url}")
+
+            if attempt < self.retry.attempts:
+                delay = self.retry.delay(attempt, retry_after)
+                if self.deadline is not None and time.time() + delay > self.deadline:
+                    break
+                time.sleep(delay)
+
+        self.report(job, 0, None, time.monotonic(), done=True, ok=False)
+        return self.finish(job, False, 0, error)
+
+    def estimate_job_seconds(self) -> float:
+        """单个任务的预计耗时，还没有完成的任务时按超时时间估计"""
+        with self.stats_lock:
+            return self.job_seconds if self.job_seconds is not None else self.timeout
+
+    def admit(self, job: DownloadJob) -> bool:
+        """预计能在截止时间前完成时才开始下载"""
+        if self.deadline is None:
+            return True
+        return time.time() + self.estimate_job_seconds() <= self.deadline
+
+    def run_next(self) -> None:
+        """取出 score 最高的任务执行，每个任务对应提交一次"""
+        with self.heap_lock:
+            _, _, job, future = heapq.heappop(self.heap)
+        if not self.admit(job):
+            # 不算一次运行，留在 pending 中下次继续
+            job.runs -= 1
+            self.queue.add(job)
+            with self.stats_lock:
+                self.deferred += 1
+            self.sampler.info(
+                "⏳ 来不及在截止前完成，推迟: %s",
+                os.path.basename(job.save_path),
+                per_second=SUCCESS_LOG_PER_SECOND,
+            )
+            future.set_result(False)
+            return
+
+        started = time.monotonic()
+        try:
+            future.set_result(self.download_job(job))
+        except BaseException as e:
+            future.set_exception(e)
+        elapsed = time.monotonic() - started
+        with self.stats_lock:
+            if self.job_seconds is None:
+                self.job_seconds = elapsed
+            else:
+                self.job_seconds += JOB_SECONDS_ALPHA * (elapsed - self.job_seconds)
+
+    def download_all(
+        self, jobs: Iterable[DownloadJob], resume: bool = False
+    ) -> Dict[str, bool]:
+        """
+        并发下载一批任务，按 score 从高到低开始
+        :param jobs: 下载任务
+        :param resume: 是否同时重试上次运行遗留的任务
+        :return: 保存路径 -> 是否成功（推迟的任务为 False）
+        """
+        jobs = self.start(jobs, resume)
+        futures: Dict[str, Future] = {}
+        with self.heap_lock:
+            for j in jobs:
+                future: Future = Future()
+                heapq.heappush(self.heap, (-j.score, next(self.seq), j, future))
+                futures[j.save_path] = future
+            queued = len(self.heap)
+        if jobs and self.deadline is not None:
+            estimate = queued * self.estimate_job_seconds() / self.max_concurrency
+            self.logger.info(
+                f"⏱️ {queued} 个下载排队，预计 {estimate:.0f}s，"
+                f"距截止 {self.deadline - time.time():.0f}s"
+            )
+        for _ in jobs:
+            self.executor.submit(self.run_next)
+        result = {path: future.result() for path, future in futures.items()}
+        self.queue.save()
+        return result
+
+    def log_summary(self) -> None:
+        super().log_summary()
+        if self.deferred:
+            self.logger.warning(
+                f"⏳ {self.deferred} 个下载因截止时间推迟，下次运行时继续"
+            )
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
+        self.session.close()
+        self.queue.save()
+
+
+class AsyncDownloader(DownloadManager):
+    """
+    异步下载：信号量限制并发，aiohttp 连接器按 host 限制连接数
+
+    可以传入外部的 aiohttp 会话共用连接池，否则在 async with 时自行创建。
+    """
+
+    def __init__(
+        self,
+        logger: Logger,
+        session: Optional["aiohttp.ClientSession"] = None,
+        **kwargs,
+    ):
+        super().__init__(logger, **kwargs)
+        self.session = session
+        self.owns_session = session is None
+        self.sem = asyncio.Semaphore(self.max_concurrency)
+
+    async def __aenter__(self) -> "AsyncDownloader":
+        if self.session is None:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_concurrency, limit_per_host=self.per_host_limit
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector, headers=self.headers
+            )
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        if self.owns_session and self.session is not None:
+            await self.session.close()
+        self.queue.save()
+
+    async def download(self, url: str, save_path: str) -> bool:
+        """
+        下载单个文件
+        :param url: 文件 URL
+        :param save_path: 保存路径
+        :return: 是否成功
+        """
+        job = DownloadJob(url=url, save_path=save_path)
+        job.runs += 1
+        self.queue.add(job)
+        return await self.download_job(job)
+
+    async def download_job(self, job: DownloadJob) -> bool:
+        assert self.session is not None, "use `async with AsyncDownloader(...)`"
+        timeout = aiohttp.ClientTimeout(
+            sock_connect=self.timeout, sock_read=self.timeout
+        )
+        error = ""
+        async with self.sem:
+            for attempt in range(1, self.retry.attempts + 1):
+                retry_after = None
+                started = time.monotonic()
+                try:
+                    async with self.session.get(
+                        job.url, headers=job.headers, timeout=timeout
+                    ) as resp:
+                        if resp.status != 200:
+                            error = f"status {resp.status}"
+                            if resp.status not in RETRY_STATUS:
+                                self.logger.warning(
+                                    f"⚠️ 状态码 {resp.status}，不再重试: {job.url}"
+                                )
+                                break
+                            self.logger.warning(
+                                f"⚠️ 状态码 {resp.status}，第 {attempt} 次重试: {job.url}"
+                            )
+                            retry_after = parse_retry_after(resp.headers)
+                        else:
+                            total = resp.content_length
+                            downloaded = 0
+
+                            def progress(n: int) -> None:
+                                nonlocal downloaded
+                                downloaded += n
+                                self.report(job, downloaded, total, started)
+
+                            size = await write_stream_async(
+                                resp.content, job.save_path, total, progress
+                            )
+                            self.report(job, size, total, started, done=True, ok=True)
+                            return self.finish(job, True, size)
+                except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                    error = str(e) or type(e).__name__
+                    self.logger.error(
+                        f"⚠️ 异常: {job.url}，第 {attempt} 次重试，错误: {error}"
+                    )
+
+                if attempt < self.retry.attempts:
+                    await asyncio.sleep(self.retry.delay(attempt, retry_after))
+
+        self.report(job, 0, None, time.monotonic(), done=True, ok=False)
+        return self.finish(job, False, 0, error)
+
+    async def download_all(
+        self, jobs: Iterable[DownloadJob], resume: bool = False
+    ) -> Dict[str, bool]:
+        """
+        并发下载一批任务
+        :param jobs: 下载任务
+        :param resume: 是否同时重试上次运行遗留的任务
+        :return: 保存路径 -> 是否成功
+        """
+        jobs = self.start(jobs, resume)
+        results = await asyncio.gather(*(self.download_job(j) for j in jobs))
+        self.queue.save()
+        return {j.save_path: ok for j, ok in zip(jobs, results)}
@@ -4,33 +4,39 @@
 # @Desc:   将 CSV 转换为 Markdown 表格，并插入 README 指定区域
 
 import csv
+import hashlib
+import json
 import logging
+import os
+import re
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
 
 from timer import to_beijing_time_str
 
+from utils.timeseries import TimeSeriesStore, format_value
 
-def csv_to_markdown_table(csv_path: str) -> str:
-    """
-    读取 CSV 文件并将其内容转换为 Markdown 表格，默认第一列为时间戳。
+try:
+    import fcntl
+except ImportError:  # Windows 下不加锁
+    fcntl = None
 
-    参数:
-        csv_path (str): CSV 文件路径
+# README 同目录下的登记文件：section_id -> CSV 路径或时间序列目录、内容 hash、渲染结果
+REGISTRY_FILENAME = ".readme_sections.json"
+SECTION_PATTERN = re.compile(
+    r"(<!-- (?P<id>[\w-]+)-start -->).*?(<!-- (?P=id)-end -->)", re.S
+)
 
-    返回:
-        str: Markdown 表格内容
-    """
-    with open(csv_path, newline="", encoding="utf-8") as f:
-        rows = list(csv.reader(f))
 
-    if not rows:
-        return ""
-
-    headers = rows[0]
+def rows_to_markdown_table(headers: List[str], rows: List[List[str]]) -> str:
+    """
+    把表头和数据行转换为 Markdown 表格，第一列为时间戳时转换为北京时间
+    """
     header_line = "| " + " | ".join(headers) + " |"
     divider_line = "| " + " | ".join(["---"] * len(headers)) + " |"
 
     data_lines = []
-    for row in rows[1:]:
+    for row in rows:
         formatted_row = []
         for i, val in enumerate(row):
             if i == 0:  # 默认第一列为时间戳
@@ -45,44 +51,232 @@ def csv_to_markdown_table(csv_path: str) -> str:
     return "\n".join([header_line, divider_line] + data_lines)
 
 
+def csv_to_markdown_table(csv_path: str) -> str:
+    """
+    读取 CSV 文件并将其内容转换为 Markdown 表格，默认第一列为时间戳。
+
+    参数:
+        csv_path (str): CSV 文件路径
+
+    返回:
+        str: Markdown 表格内容
+    """
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+
+    if not rows:
+        return ""
+    return rows_to_markdown_table(rows[0], rows[1:])
+
+
+def series_to_markdown_table(store: TimeSeriesStore, days: int) -> str:
+    """
+    把时间序列最近 days 天的数据转换为 Markdown 表格，超出原始数据保留期时读取聚合层
+    """
+    rows = [
+        [str(timestamp)] + [format_value(v) for v in values]
+        for timestamp, values in store.recent(days)
+    ]
+    if not rows:
+        return ""
+    return rows_to_markdown_table(["timestamp"] + store.columns, rows)
+
+
+@contextmanager
+def locked(path: str) -> Iterator[None]:
+    """
+    以 path + .lock 为锁文件加排它锁，并行运行的脚本依次更新 README
+    """
+    with open(path + ".lock", "w") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def file_hash(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def load_registry(registry_path: str) -> Dict[str, Dict[str, Any]]:
+    try:
+        with open(registry_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_registry(registry_path: str, registry: Dict[str, Dict[str, Any]]) -> None:
+    tmp_path = registry_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(registry, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp_path, registry_path)
+
+
+def render_sections(
+    logger: logging.Logger, readme_dir: str, registry: Dict[str, Dict[str, Any]]
+) -> Dict[str, str]:
+    """
+    渲染所有登记的章节，CSV 内容没变的章节直接使用缓存的渲染结果
+
+    返回:
+        Dict[str, str]: section_id -> Markdown 表格
+    """
+    tables = {}
+    for section_id, entry in registry.items():
+        if "series" in entry:
+            # 时间序列以最后一条记录的时间判断是否变化
+            dirpath = os.path.join(readme_dir, entry["series"])
+            try:
+                store = TimeSeriesStore.load(dirpath, entry["retention"])
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"series not found for section {section_id}: {e}")
+                continue
+            digest = f"{store.last_timestamp}:{entry['days']}"
+            if entry.get("hash") != digest:
+                entry["rendered"] = series_to_markdown_table(store, entry["days"])
+                entry["hash"] = digest
+        else:
+            csv_path = os.path.join(readme_dir, entry["csv"])
+            try:
+                digest = file_hash(csv_path)
+            except OSError:
+                logger.warning(f"csv not found for section {section_id}: {csv_path}")
+                continue
+            if entry.get("hash") != digest:
+                entry["rendered"] = csv_to_markdown_table(csv_path)
+                entry["hash"] = digest
+        if not entry["rendered"]:
+            logger.warning(f"empty data for section {section_id}")
+            continue
+        tables[section_id] = entry["rendered"]
+    return tables
+
+
+def render_readme(logger: logging.Logger, readme_path: str) -> bool:
+    """
+    按登记文件一次性渲染 README 中所有 <!-- id-start --> 区域，内容不变时不写文件
+
+    返回:
+        bool: README 是否被改写
+    """
+    readme_dir = os.path.dirname(os.path.abspath(readme_path))
+    registry_path = os.path.join(readme_dir, REGISTRY_FILENAME)
+
+    with locked(readme_path):
+        registry = load_registry(registry_path)
+        return render_with_registry(logger, readme_path, registry_path, registry)
+
+
+def render_with_registry(
+    logger: logging.Logger,
+    readme_path: str,
+    registry_path: str,
+    registry: Dict[str, Dict[str, Any]],
+) -> bool:
+    readme_dir = os.path.dirname(os.path.abspath(readme_path))
+    before = json.dumps(registry, sort_keys=True)
+    tables = render_sections(logger, readme_dir, registry)
+    if json.dumps(registry, sort_keys=True) != before:
+        save_registry(registry_path, registry)
+
+    with open(readme_path, "r", encoding="utf-8") as f:
+        content = f.read()
+
+    def replace(match: re.Match) -> str:
+        table_md = tables.get(match.group("id"))
+        if table_md is None:
+            return match.group(0)
+        # 插入内容，保留原标记
+        return f"{match.group(1)}\n\n{table_md}\n\n{match.group(3)}"
+
+    new_content = SECTION_PATTERN.sub(replace, content)
+    if new_content == content:
+        return False
+
+    tmp_path = readme_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(new_content)
+    os.replace(tmp_path, readme_path)
+    return True
+
+
 def update_readme_with_table(
     logger: logging.Logger, csv_path: str, readme_path: str, section_id: str
 ) -> None:
     """
-    将 Markdown 表格内容插入 README 文件指定的标记区域。
+    登记 section_id 对应的 CSV，并重新渲染 README 中所有登记过的区域。
 
     参数:
-        csv_path (str): 要插入的 Markdown 表格内容
+        csv_path (str): 该区域的 CSV 文件路径
         readme_path (str): README 文件路径
         section_id (str): 章节 ID，找到该插入的位置
     """
-    table_md = csv_to_markdown_table(csv_path)
-    if len(table_md) == 0:
-        logger.warning("empty csv data")
-        return
+    register_section(logger, readme_path, section_id, {"csv": csv_path})
 
-    with open(readme_path, "r", encoding="utf-8") as f:
-        content = f.read()
 
-    # 构造动态标记
-    start_tag = f"<!-- {section_id}-start -->"
-    end_tag = f"<!-- {section_id}-end -->"
+def update_readme_with_series(
+    logger: logging.Logger,
+    dirpath: str,
+    readme_path: str,
+    section_id: str,
+    days: int = 14,
+    retention_days: Optional[int] = None,
+) -> None:
+    """
+    登记 section_id 对应的时间序列，并重新渲染 README 中所有登记过的区域。
+    表格经 TimeSeriesStore.query_range 读取最近 days 天的数据，只读取匹配的一层。
+
+    参数:
+        dirpath (str): 时间序列目录
+        days (int): 展示最近多少天
+        retention_days (Optional[int]): 原始数据的保留天数，默认与 days 相同
+    """
+    entry = {
+        "series": dirpath,
+        "days": days,
+        "retention": retention_days if retention_days is not None else days,
+    }
+    register_section(logger, readme_path, section_id, entry)
 
-    start_index = content.find(start_tag)
-    end_index = content.find(end_tag)
 
-    if start_index == -1 or end_index == -1 or start_index > end_index:
-        logger.error(f"invalid section_id: {section_id} ")
-        return
+def register_section(
+    logger: logging.Logger,
+    readme_path: str,
+    section_id: str,
+    source: Dict[str, Any],
+) -> None:
+    """
+    登记 section_id 的数据来源（csv 或 series 为相对 README 目录的路径），并重新渲染
+    """
+    readme_dir = os.path.dirname(os.path.abspath(readme_path))
+    registry_path = os.path.join(readme_dir, REGISTRY_FILENAME)
 
-    # 插入内容，保留原标记
-    new_content = (
-        content[: start_index + len(start_tag)]
-        + "\n\n"
-        + table_md
-        + "\n\n"
-        + content[end_index:]
-    )
+    with locked(readme_path):
+        with open(readme_path, "r", encoding="utf-8") as f:
+            content = f.read()
+        if not re.search(
+            rf"<!-- {re.escape(section_id)}-start -->.*?"
+            rf"<!-- {re.escape(section_id)}-end -->",
+            content,
+            re.S,
+        ):
+            logger.error(f"invalid section_id: {section_id} ")
+            return
 
-    with open(readme_path, "w", encoding="utf-8") as f:
-        f.write(new_content)
+        registry = load_registry(registry_path)
+        source = dict(source)
+        for key in ("csv", "series"):
+            if key in source:
+                source[key] = os.path.relpath(os.path.abspath(source[key]), readme_dir)
+        entry = registry.get(section_id, {})
+        if {k: v for k, v in entry.items() if k not in ("hash", "rendered")} != source:
+            registry[section_id] = source
+
+        if render_with_registry(logger, readme_path, registry_path, registry):
+            logger.info(f"README updated: {section_id}")
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# @Author: Lewis Tian
+# @Date:   2026-10-19 23:21:54
+# @Desc:   进程内共用的 requests Session，同一进程中的各个任务复用连接池
+
+import threading
+from typing import Optional
+
+from utils.lazy import lazy_import
+
+# 第一次创建 Session 时才导入，没有发出请求的任务（如缺少 Cookie 直接退出）不必导入
+requests = lazy_import("requests")
+cookiejar = lazy_import("http.cookiejar")
+
+POOL_CONNECTIONS = 16  # 缓存连接池的 host 数量
+POOL_MAXSIZE = 32  # 每个 host 保留的连接数
+
+_session: Optional["requests.Session"] = None
+_session_lock = threading.Lock()
+
+
+def reject_cookie_policy() -> "cookiejar.CookiePolicy":
+    """
+    不保存服务器返回的 Cookie：各任务通过请求头自行携带 Cookie，
+    共用 Session 时不会把一个任务的登录态带给另一个任务
+
+    基类来自 http.cookiejar（会导入 urllib.request 等），因此在创建 Session 时才定义
+    """
+
+    class RejectCookiePolicy(cookiejar.DefaultCookiePolicy):
+        def set_ok(self, cookie, request) -> bool:
+            return False
+
+    return RejectCookiePolicy()
+
+
+def get_session() -> "requests.Session":
+    """
+    获取进程内共用的 Session（线程安全地懒加载）
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.cookies.set_policy(reject_cookie_policy())
+            _session = session
+        return _session
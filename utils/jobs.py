@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+# @Author: Lewis Tian
+# @Date:   2026-10-19 23:05:37
+# @Desc:   监控任务注册与进程内调度：依赖顺序、分组并发限制、超时、耗时统计
+
+import os
+import queue
+import threading
+import time
+from logging import Logger
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+
+class Job(NamedTuple):
+    name: str  # 目录名.文件名，如 pixiv.ranking
+    func: Callable[[], None]
+    group: str  # 同组任务受同一个并发限制，默认为目录名
+    depends: Tuple[str, ...] = ()
+    timeout: Optional[float] = None  # 秒，None 时使用调度器的默认值
+
+
+class JobResult(NamedTuple):
+    name: str
+    status: str  # ok / failed / timeout / skipped
+    elapsed: float
+    error: str = ""
+
+
+_registry: Dict[str, Job] = {}
+
+
+def job(
+    name: Optional[str] = None,
+    group: Optional[str] = None,
+    depends: Iterable[str] = (),
+    timeout: Optional[float] = None,
+) -> Callable:
+    """
+    把无参函数注册为监控任务，函数本身不变，仍可直接调用
+
+    参数:
+        name (Optional[str]): 任务名，默认 目录名.文件名
+        group (Optional[str]): 并发分组，默认目录名
+        depends (Iterable[str]): 依赖的任务名，依赖全部成功后才会执行
+        timeout (Optional[float]): 超时秒数
+    """
+
+    def decorator(func: Callable[[], None]) -> Callable[[], None]:
+        filepath = func.__code__.co_filename
+        dirname = os.path.basename(os.path.dirname(os.path.abspath(filepath)))
+        stem = os.path.splitext(os.path.basename(filepath))[0]
+        job_name = name or f"{dirname}.{stem}"
+        _registry[job_name] = Job(
+            job_name, func, group or dirname, tuple(depends), timeout
+        )
+        return func
+
+    return decorator
+
+
+def get_jobs() -> Dict[str, Job]:
+    return dict(_registry)
+
+
+def resolve(jobs: Dict[str, Job], names: Iterable[str]) -> Dict[str, Job]:
+    """
+    选出指定的任务及其全部依赖
+    """
+    selected: Dict[str, Job] = {}
+    stack = list(names)
+    while stack:
+        name = stack.pop()
+        if name in selected:
+            continue
+        if name not in jobs:
+            raise KeyError(f"unknown job: {name}")
+        selected[name] = jobs[name]
+        stack.extend(jobs[name].depends)
+    return selected
+
+
+def check_cycles(jobs: Dict[str, Job]) -> None:
+    visiting, visited = set(), set()
+
+    def visit(name: str) -> None:
+        if name in visited:
+            return
+        if name in visiting:
+            raise ValueError(f"dependency cycle at job: {name}")
+        visiting.add(name)
+        for dep in jobs[name].depends:
+            if dep in jobs:
+                visit(dep)
+        visiting.discard(name)
+        visited.add(name)
+
+    for name in jobs:
+        visit(name)
+
+
+def run_jobs(
+    logger: Logger,
+    jobs: Dict[str, Job],
+    max_workers: int = 4,
+    group_limits: Optional[Dict[str, int]] = None,
+    default_timeout: Optional[float] = None,
+    threads: Optional[Dict[str, threading.Thread]] = None,
+) -> List[JobResult]:
+    """
+    在当前进程中执行任务
+
+    每个任务运行在独立的守护线程中：依赖全部成功后才启动，同组任务同时最多运行
+    group_limits[group] 个（默认 1），全局最多 max_workers 个。超时的任务被标记为
+    timeout，依赖它的任务跳过；线程无法强制结束，但不会阻止进程退出。
+
+    参数:
+        threads (Optional[Dict[str, threading.Thread]]): 给出时记录各任务的线程，
+            返回后超时的任务可能仍在运行，调用方据此判断任务是否真正结束
+
+    返回:
+        List[JobResult]: 按结束顺序排列的结果
+    """
+    check_cycles(jobs)
+    group_limits = group_limits or {}
+    pending = dict(jobs)
+    running: Dict[str, Tuple[Job, float]] = {}
+    group_running: Dict[str, int] = {}
+    results: Dict[str, JobResult] = {}
+    finished: "queue.Queue[Tuple[str, str]]" = queue.Queue()
+
+    def worker(j: Job) -> None:
+        try:
+            j.func()
+            finished.put((j.name, ""))
+        except BaseException as e:
+            finished.put((j.name, f"{type(e).__name__}: {e}"))
+
+    def finish(name: str, status: str, error: str = "") -> None:
+        j, started = running.pop(name)
+        group_running[j.group] -= 1
+        results[name] = JobResult(name, status, time.monotonic() - started, error)
+        if status == "ok":
+            logger.info(f"✅ {name} finished in {results[name].elapsed:.1f}s")
+        else:
+            logger.error(
+                f"❌ {name} {status} after {results[name].elapsed:.1f}s: {error}"
+            )
+
+    while pending or running:
+        # 启动所有可以运行的任务
+        progressed = False
+        for name, j in list(pending.items()):
+            failed_deps = [
+                d for d in j.depends if d in results and results[d].status != "ok"
+            ]
+            if failed_deps or any(d not in jobs for d in j.depends):
+                pending.pop(name)
+                results[name] = JobResult(
+                    name, "skipped", 0.0, f"dependency not ok: {failed_deps}"
+                )
+                logger.warning(f"⏭️ {name} skipped, dependency not ok")
+                progressed = True
+                continue
+            if any(d not in results for d in j.depends):
+                continue
+            if len(running) >= max_workers:
+                break
+            if group_running.get(j.group, 0) >= group_limits.get(j.group, 1):
+                continue
+
+            pending.pop(name)
+            progressed = True
+            running[name] = (j, time.monotonic())
+            group_running[j.group] = group_running.get(j.group, 0) + 1
+            logger.info(f"🚀 {name} started")
+            thread = threading.Thread(
+                target=worker, args=(j,), name=f"job-{name}", daemon=True
+            )
+            if threads is not None:
+                threads[name] = thread
+            thread.start()
+
+        if not running:
+            if not progressed:
+                # 没有运行中的任务，剩下的任务也都无法启动（如分组限制为 0），全部跳过
+                for name in list(pending):
+                    pending.pop(name)
+                    results[name] = JobResult(name, "skipped", 0.0, "cannot start")
+                    logger.warning(f"⏭️ {name} skipped, cannot start")
+            continue
+
+        # 等待任一任务结束，或最早的超时到期
+        now = time.monotonic()
+        deadlines = [
+            started + (j.timeout or default_timeout)
+            for j, started in running.values()
+            if j.timeout or default_timeout
+        ]
+        wait = max(min(deadlines) - now, 0) if deadlines else None
+        try:
+            name, error = finished.get(timeout=wait)
+            if name in running:
+                finish(name, "failed" if error else "ok", error)
+        except queue.Empty:
+            pass
+
+        now = time.monotonic()
+        for name, (j, started) in list(running.items()):
+            limit = j.timeout or default_timeout
+            if limit and now - started >= limit:
+                finish(name, "timeout", f"> {limit:g}s")
+
+    return list(results.values())
+
+
+def log_timing(logger: Logger, results: List[JobResult]) -> None:
+    logger.info("📊 Job summary:")
+    for r in sorted(results, key=lambda r: -r.elapsed):
+        suffix = f" ({r.error})" if r.error else ""
+        logger.info(f"  {r.status:<8} {r.elapsed:7.1f}s  {r.name}{suffix}")
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+# @Author: Lewis Tian
+# @Date:   2026-10-20 17:05:12
+# @Desc:   响应解析的快速路径：直接从响应的 bytes 校验 pydantic 模型，不经过中间的 dict
+#
+# - 模型：Model.model_validate_json(bytes)，由 pydantic-core 解析并校验，
+#   比 json.loads + model_validate 少构造一遍 dict / list
+# - 其它类型（如 Dict[str, Model]）：TypeAdapter.validate_json，
+#   TypeAdapter 每次构建要几毫秒，按类型缓存
+# - 不需要校验的 JSON：安装了 orjson 时用 orjson.loads
+#
+# python benchmark/bench_json.py 对比各种写法每页的解析耗时
+
+import functools
+import json
+from typing import Any, Type, TypeVar, Union
+
+from utils.lazy import lazy_import
+
+try:
+    import orjson
+except ImportError:  # 未安装时使用标准库
+    orjson = None
+
+pydantic = lazy_import("pydantic")
+
+T = TypeVar("T")
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """
+    解析 JSON，格式错误时抛出 json.JSONDecodeError（orjson 的异常是它的子类）
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+@functools.lru_cache(maxsize=None)
+def get_adapter(tp: Any) -> "pydantic.TypeAdapter":
+    return pydantic.TypeAdapter(tp)
+
+
+def decode(data: Union[bytes, str], tp: Type[T]) -> T:
+    """
+    把 JSON 直接校验为 tp
+
+    参数:
+        data (Union[bytes, str]): JSON 文本，如 response.content
+        tp (Type[T]): pydantic 模型，或任意类型注解，如 List[Model]、Dict[str, Model]
+
+    返回:
+        T: 校验后的对象，JSON 格式错误或校验失败时抛出 pydantic.ValidationError
+    """
+    if isinstance(tp, type) and issubclass(tp, pydantic.BaseModel):
+        return tp.model_validate_json(data)
+    return get_adapter(tp).validate_json(data)
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# @Author: Lewis Tian
+# @Date:   2026-10-20 09:42:18
+# @Desc:   延迟导入：模块在第一次访问属性时才真正导入，缩短只用到部分功能的任务的启动时间
+#
+# 用法：
+#   np = lazy_import("numpy")
+#   np.zeros(3)  # 此时才导入 numpy
+#
+# 注意：用作类型注解时会立即触发导入，需要配合 from __future__ import annotations
+
+import importlib
+import sys
+from types import ModuleType
+
+
+class LazyModule(ModuleType):
+    """
+    模块占位对象：第一次访问属性时导入真正的模块，并把其属性复制到自身，
+    之后的访问与直接访问模块一样，不再经过 __getattr__
+    """
+
+    def __getattr__(self, attr: str):
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+    def __repr__(self) -> str:
+        return f"<lazy module {self.__name__!r}>"
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    返回延迟导入的模块，已导入的模块直接返回
+
+    参数:
+        name (str): 模块全名，如 "requests.adapters"
+
+    返回:
+        ModuleType: 模块或其占位对象
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+# @Author: Lewis Tian
+# @Date:   2026-10-19 21:12:47
+# @Desc:   统计各脚本 log 目录下的 .log / .log.gz 日志：按天、按级别、错误签名、请求数与下载成功率
+#
+# 用法：
+#   python utils/log_analyzer.py                   # 统计所有 */log 目录
+#   python utils/log_analyzer.py pixiv/log --days 7 --top 20
+#   python utils/log_analyzer.py ctrip/log/sign.log.2025-08-15 --json
+
+import argparse
+import glob
+import gzip
+import json
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterator, List, Optional
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+CACHE_FILEPATH = os.path.join(PROJECT_ROOT, ".cache", "log_analyzer.json")
+# 解析逻辑变化时递增，旧缓存自动失效
+CACHE_VERSION = 3
+
+# get_logger 的格式："%(asctime)s - %(filename)s:%(lineno)d - %(levelname)s: %(message)s"
+LINE_PATTERN = re.compile(
+    r"^(\d{4}-\d{2}-\d{2}) \d{2}:\d{2}:\d{2},\d{3} - (.+?):(\d+) - ([A-Z]+): (.*)$"
+)
+# LogSampler.summary 的汇总行：某个调用位置被采样抑制的条数
+SUPPRESSED_PATTERN = re.compile(r"🔇 (.+?):(\d+) suppressed (\d+)/\d+ log lines")
+# DownloadManager.log_summary 的汇总行，成功日志被限流时以它为准
+DOWNLOAD_SUMMARY_PATTERN = re.compile(r"📊 下载完成: 成功 (\d+)，失败 (\d+)")
+LOG_FILE_PATTERN = re.compile(r".*\.log(\.\d{4}-\d{2}-\d{2})?(\.gz)?$")
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+SIGNATURE_LEVELS = ("WARNING", "ERROR", "CRITICAL")
+
+# 错误签名归一化：URL、十六进制、数字替换为占位符，相同原因的日志归为一类
+NORMALIZE_RULES = [
+    (re.compile(r"https?://\S+"), "<url>"),
+    (re.compile(r"\b0x[0-9a-fA-F]+\b"), "<hex>"),
+    (re.compile(r"\d+"), "N"),
+]
+MAX_SIGNATURE_LENGTH = 120
+
+# 按天统计的字段
+DAY_FIELDS = LEVELS + ("lines", "requests", "download_ok", "download_failed")
+
+
+def normalize_message(message: str) -> str:
+    for pattern, repl in NORMALIZE_RULES:
+        message = pattern.sub(repl, message)
+    return message[:MAX_SIGNATURE_LENGTH]
+
+
+def iter_lines(filepath: str) -> Iterator[str]:
+    """
+    逐行读取日志，.gz 文件边解压边读，不落盘
+    """
+    if filepath.endswith(".gz"):
+        f = gzip.open(filepath, "rt", encoding="utf-8", errors="replace")
+    else:
+        f = open(filepath, "r", encoding="utf-8", errors="replace")
+    with f:
+        yield from f
+
+
+def parse_file(filepath: str) -> Dict:
+    """
+    解析单个日志文件
+
+    多行日志（如 pydantic 的校验错误）只统计第一行，后续不匹配格式的行跳过。
+    日期取自每一行的时间，而不是文件名后缀。
+    请求日志被采样时，按进程退出时的抑制统计把未输出的请求补回请求数。
+
+    返回:
+        Dict: {"days": {日期: {字段: 数量}}, "signatures": {签名: 数量}}
+    """
+    days: Dict[str, Counter] = defaultdict(Counter)
+    signatures: Counter = Counter()
+    # 输出过 Request URL 的调用位置 (文件名, 行号)
+    request_sites = set()
+
+    for line in iter_lines(filepath):
+        match = LINE_PATTERN.match(line.rstrip("\r\n"))
+        if not match:
+            continue
+
+        day, filename, lineno, level, message = match.groups()
+        stats = days[day]
+        stats["lines"] += 1
+        stats[level] += 1
+
+        summary = DOWNLOAD_SUMMARY_PATTERN.search(message)
+        if summary:
+            stats["summary_ok"] += int(summary.group(1))
+            stats["summary_failed"] += int(summary.group(2))
+        elif "Request URL" in message:
+            stats["requests"] += 1
+            request_sites.add((filename, lineno))
+        elif message.startswith("🔇"):
+            suppressed = SUPPRESSED_PATTERN.match(message)
+            if suppressed and suppressed.group(1, 2) in request_sites:
+                stats["requests"] += int(suppressed.group(3))
+        elif "下载成功" in message:
+            stats["download_ok"] += 1
+        elif "最终失败" in message:
+            stats["download_failed"] += 1
+
+        if level in SIGNATURE_LEVELS:
+            signatures[f"{level} {filename}: {normalize_message(message)}"] += 1
+
+    for stats in days.values():
+        # 有汇总行时用汇总数字，逐条的成功日志可能被限流
+        summary_ok = stats.pop("summary_ok", 0)
+        summary_failed = stats.pop("summary_failed", 0)
+        if summary_ok or summary_failed:
+            stats["download_ok"] = summary_ok
+            stats["download_failed"] = summary_failed
+
+    return {
+        "days": {day: dict(stats) for day, stats in days.items()},
+        "signatures": dict(signatures),
+    }
+
+
+def find_log_files(paths: List[str]) -> List[str]:
+    """
+    展开目录，返回其中的 .log / .log.YYYY-MM-DD / .log.YYYY-MM-DD.gz 文件
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                full_path = os.path.join(path, name)
+                if LOG_FILE_PATTERN.match(name) and os.path.isfile(full_path):
+                    files.append(os.path.abspath(full_path))
+        elif os.path.isfile(path):
+            files.append(os.path.abspath(path))
+    return files
+
+
+def load_cache(cache_path: str) -> Dict:
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+        if cache.get("version") == CACHE_VERSION:
+            return cache["files"]
+    except (OSError, ValueError, KeyError):
+        pass
+    return {}
+
+
+def save_cache(cache_path: str, files: Dict) -> None:
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {"version": CACHE_VERSION, "files": files},
+            f,
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+    os.replace(tmp_path, cache_path)
+
+
+def analyze(files: List[str], cache_path: Optional[str] = CACHE_FILEPATH) -> Dict:
+    """
+    汇总多个日志文件的统计结果
+
+    每个文件的解析结果按 (路径, 大小, mtime) 缓存，文件未变化时直接复用，
+    只有新增或仍在写入的文件会被重新读取。
+
+    参数:
+        files (List[str]): 日志文件路径
+        cache_path (Optional[str]): 缓存文件路径，为 None 时不使用缓存
+
+    返回:
+        Dict: {"days": ..., "signatures": ..., "parsed": 重新解析的文件数}
+    """
+    cache = load_cache(cache_path) if cache_path else {}
+    # 保留本次未涉及的文件的缓存，只删除已经不存在的文件
+    new_cache = {path: entry for path, entry in cache.items() if os.path.exists(path)}
+    parsed = 0
+
+    days: Dict[str, Counter] = defaultdict(Counter)
+    signatures: Counter = Counter()
+
+    for filepath in files:
+        st = os.stat(filepath)
+        entry = cache.get(filepath)
+        if not entry or entry["size"] != st.st_size or entry["mtime"] != st.st_mtime_ns:
+            entry = {
+                "size": st.st_size,
+                "mtime": st.st_mtime_ns,
+                "stats": parse_file(filepath),
+            }
+            parsed += 1
+        new_cache[filepath] = entry
+
+        for day, stats in entry["stats"]["days"].items():
+            days[day].update(stats)
+        signatures.update(entry["stats"]["signatures"])
+
+    if cache_path and (parsed or len(new_cache) != len(cache)):
+        save_cache(cache_path, new_cache)
+
+    return {"days": days, "signatures": signatures, "parsed": parsed}
+
+
+def print_report(result: Dict, last_days: Optional[int], top: int) -> None:
+    days = sorted(result["days"])
+    if last_days:
+        days = days[-last_days:]
+
+    header = (
+        f"{'date':<10} {'lines':>7} {'INFO':>7} {'WARN':>6} {'ERROR':>6} "
+        f"{'reqs':>6} {'dl_ok':>6} {'dl_fail':>7} {'dl_rate':>7}"
+    )
+    print(header)
+    print("-" * len(header))
+    for day in days:
+        stats = result["days"][day]
+        ok, failed = stats["download_ok"], stats["download_failed"]
+        rate = f"{ok / (ok + failed):.1%}" if ok + failed else "-"
+        print(
+            f"{day:<10} {stats['lines']:>7} {stats['INFO']:>7} {stats['WARNING']:>6} "
+            f"{stats['ERROR'] + stats['CRITICAL']:>6} {stats['requests']:>6} "
+            f"{ok:>6} {failed:>7} {rate:>7}"
+        )
+
+    if top and result["signatures"]:
+        print(f"\nTop {top} error signatures:")
+        for signature, count in result["signatures"].most_common(top):
+            print(f"{count:>7}  {signature}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="日志统计")
+    parser.add_argument(
+        "paths", nargs="*", help="日志文件或目录，默认所有脚本的 log 目录"
+    )
+    parser.add_argument("--days", type=int, help="只显示最近 N 天")
+    parser.add_argument("--top", type=int, default=10, help="显示前 N 个错误签名")
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    parser.add_argument("--no-cache", action="store_true", help="不读写缓存")
+    args = parser.parse_args()
+
+    paths = args.paths or sorted(glob.glob(os.path.join(PROJECT_ROOT, "*", "log")))
+    files = find_log_files(paths)
+    result = analyze(files, None if args.no_cache else CACHE_FILEPATH)
+
+    if args.json:
+        days = sorted(result["days"])
+        if args.days:
+            days = days[-args.days :]  # noqa: E203
+        print(
+            json.dumps(
+                {
+                    "days": {
+                        day: {k: result["days"][day][k] for k in DAY_FIELDS}
+                        for day in days
+                    },
+                    "signatures": dict(result["signatures"].most_common(args.top)),
+                },
+                ensure_ascii=False,
+                indent=2,
+            )
+        )
+    else:
+        print(f"📂 {len(files)} files, {result['parsed']} parsed")
+        print_report(result, args.days, args.top)
+
+
+if __name__ == "__main__":
+    main()
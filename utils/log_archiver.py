@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+# @Author: Lewis Tian
+# @Date:   2026-10-19 20:31:08
+# @Desc:   后台压缩/清理轮转日志，logger.py 和 loguruer.py 共用
+
+import gzip
+import os
+import re
+import shutil
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+DATE_PATTERN = re.compile(r".*\.(\d{4}-\d{2}-\d{2})(\.gz)?$")
+
+# 后台维护线程：同一时间只跑一个维护任务，不阻塞写日志的线程
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="log-archiver")
+_pending: Dict[Tuple[str, str], Future] = {}
+_pending_lock = threading.Lock()
+
+
+def parse_date_from_filename(filename: str) -> Optional[date]:
+    match = DATE_PATTERN.match(filename)
+    if match:
+        try:
+            return datetime.strptime(match.group(1), "%Y-%m-%d").date()
+        except Exception:
+            return None
+    return None
+
+
+def find_expired_logs(
+    log_dir: str, base_name: str, compress_before_days: int, delete_before_days: int
+) -> Tuple[List[str], List[str]]:
+    """
+    找出需要压缩和需要删除的轮转日志
+
+    返回:
+        Tuple[List[str], List[str]]: (待压缩的 .log.YYYY-MM-DD, 待删除的 .gz)
+    """
+    today = datetime.today().date()
+    prefix = base_name + "."
+    to_compress, to_delete = [], []
+
+    for file_name in os.listdir(log_dir):
+        # 只处理当前 logger 生成的文件
+        if not file_name.startswith(prefix):
+            continue
+
+        file_date = parse_date_from_filename(file_name)
+        if not file_date:
+            continue
+
+        full_path = os.path.join(log_dir, file_name)
+        if not file_name.endswith(".gz"):
+            if (today - file_date).days > compress_before_days:
+                to_compress.append(full_path)
+        elif (today - file_date).days > delete_before_days:
+            to_delete.append(full_path)
+
+    return to_compress, to_delete
+
+
+def compress_file(filepath: str) -> str:
+    """
+    压缩为 filepath.gz 后删除原文件，先写临时文件，进程中途退出也不会留下损坏的 .gz
+    """
+    gz_filepath = filepath + ".gz"
+    tmp_filepath = gz_filepath + ".tmp"
+    with open(tmp_filepath, "wb") as f_raw:
+        if os.path.exists(gz_filepath):
+            # 同一天的日志已经压缩过一部分，追加为新的 gzip member
+            with open(gz_filepath, "rb") as f_old:
+                shutil.copyfileobj(f_old, f_raw, 1024 * 1024)
+        with open(filepath, "rb") as f_in, gzip.GzipFile(
+            fileobj=f_raw, mode="wb"
+        ) as f_out:
+            shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+    os.replace(tmp_filepath, gz_filepath)
+    os.remove(filepath)
+    return gz_filepath
+
+
+def compress_and_cleanup_logs(
+    log_dir: str,
+    base_name: str,
+    compress_before_days: int = 7,
+    delete_before_days: int = 30,
+    max_workers: Optional[int] = None,
+    log: Optional[Callable[[str], None]] = None,
+) -> None:
+    """
+    并行压缩过期日志并删除很旧的压缩日志
+
+    zlib 压缩时会释放 GIL，用线程池即可让多个文件同时在多个核上压缩。
+
+    参数:
+        log_dir (str): 日志目录
+        base_name (str): 日志文件名（如 sign.log）
+        compress_before_days (int): 超过多少天的日志压缩
+        delete_before_days (int): 超过多少天的压缩日志删除
+        max_workers (Optional[int]): 并行压缩的线程数，默认 min(4, CPU 数)
+        log (Optional[Callable[[str], None]]): 记录维护信息的回调
+    """
+    to_compress, to_delete = find_expired_logs(
+        log_dir, base_name, compress_before_days, delete_before_days
+    )
+
+    if to_compress:
+        max_workers = max_workers or min(4, os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for gz_filepath in pool.map(compress_file, to_compress):
+                if log:
+                    log(f"Compressed: {os.path.basename(gz_filepath)}")
+
+    for filepath in to_delete:
+        os.remove(filepath)
+        if log:
+            log(f"Deleted old log: {os.path.basename(filepath)}")
+
+
+def schedule_maintenance(
+    log_dir: str,
+    base_name: str,
+    compress_before_days: int = 7,
+    delete_before_days: int = 30,
+    log: Optional[Callable[[str], None]] = None,
+) -> Future:
+    """
+    在后台线程中执行 compress_and_cleanup_logs，立即返回 Future
+
+    同一个日志文件已有排队中的维护任务时直接复用，不会重复提交。
+    进程退出前会等待进行中的维护完成。
+    """
+    key = (os.path.abspath(log_dir), base_name)
+    with _pending_lock:
+        # run 开始执行时会把自己移出 _pending，这里只剩还在排队的任务
+        if key in _pending:
+            return _pending[key]
+
+        def run() -> None:
+            with _pending_lock:
+                _pending.pop(key, None)
+            try:
+                compress_and_cleanup_logs(
+                    log_dir,
+                    base_name,
+                    compress_before_days,
+                    delete_before_days,
+                    log=log,
+                )
+            except Exception as e:
+                if log:
+                    log(f"Log maintenance failed: {e}")
+
+        future = _executor.submit(run)
+        _pending[key] = future
+        return future
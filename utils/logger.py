@@ -2,18 +2,23 @@
 # @Author: Lewis Tian
 # @Date: 2025-04-22 00:17:16
 
-import gzip
-import inspect
+import atexit
 import logging
 import os
-import re
+import queue
 import shutil
+import sys
+import threading
+import time
 from datetime import datetime, timedelta
 from logging import Logger
-from logging.handlers import TimedRotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+from typing import Dict, List, Optional, Tuple
 
 import colorlog
 
+from utils.log_archiver import schedule_maintenance
+
 
 def is_beijing_time() -> bool:
     """
@@ -34,10 +39,9 @@ def is_beijing_time() -> bool:
 class SmartCompressAndCleanupTimedRotatingFileHandler(TimedRotatingFileHandler):
     """
     7天内的日志文件不压缩，超过7天的日志文件压缩为 .gz 格式，超过30天的日志文件删除。
+    压缩和清理在后台线程中进行，不阻塞写日志的线程。
     """
 
-    DATE_PATTERN = re.compile(r".*\.(\d{4}-\d{2}-\d{2})(\.gz)?$")
-
     def __init__(
         self, *args, backupCount=7, compressBeforeDays=7, deleteBeforeDays=30, **kwargs
     ):
@@ -45,57 +49,66 @@ class SmartCompressAndCleanupTimedRotatingFileHandler(TimedRotatingFileHandler):
         self.compressBeforeDays = compressBeforeDays
         self.deleteBeforeDays = deleteBeforeDays
 
-        self.doRollover()
+        # 只有日期真正变化时才轮转
+        self.rollover_stale_file()
+        self.schedule_maintenance()
 
     def doRollover(self):
         super().doRollover()
-        self.compress_old_logs()
-        self.cleanup_very_old_logs()
-
-    def parse_date_from_filename(self, filename):
-        match = self.DATE_PATTERN.match(filename)
-        if match:
-            try:
-                return datetime.strptime(match.group(1), "%Y-%m-%d").date()
-            except Exception:
-                return None
-        return None
-
-    def compress_old_logs(self):
-        dirName, baseName = os.path.split(self.baseFilename)
-        fileNames = os.listdir(dirName)
-        prefix = baseName + "."
-        today = datetime.today().date()
-
-        for fileName in fileNames:
-            if fileName.startswith(prefix) and not fileName.endswith(".gz"):
-                suffix = fileName[len(prefix) :]  # noqa: E203
-                if self.extMatch.match(suffix):
-                    fullPath = os.path.join(dirName, fileName)
-                    file_date = self.parse_date_from_filename(fileName)
-                    if file_date and (today - file_date).days > self.compressBeforeDays:
-                        gz_filepath = fullPath + ".gz"
-                        self._log_internal(f"Compressing log: {fileName}")
-                        if not os.path.exists(gz_filepath):
-                            with open(fullPath, "rb") as f_in, gzip.open(
-                                gz_filepath, "wb"
-                            ) as f_out:
-                                shutil.copyfileobj(f_in, f_out)
-                            os.remove(fullPath)
-                            self._log_internal(f"Compressed: {gz_filepath}")
-
-    def cleanup_very_old_logs(self):
+        self.schedule_maintenance()
+
+    def read_first_date(self):
+        """
+        读取当前日志文件第一行的日期，文件为空或格式不符时返回 None
+
+        CI 每次 checkout 都会重置文件的 mtime，不能用 mtime 判断日志属于哪一天
+        """
+        try:
+            with open(self.baseFilename, "rb") as f:
+                line = f.readline(64).decode("utf-8", errors="ignore")
+            return datetime.strptime(line[:10], "%Y-%m-%d").date()
+        except (OSError, ValueError):
+            return None
+
+    def rollover_stale_file(self):
+        """
+        启动时若日志文件第一行早于今天，按第一行的日期归档
+        """
+        first_date = self.read_first_date()
+        if not first_date or first_date >= datetime.today().date():
+            return
+
+        dfn = self.rotation_filename(
+            self.baseFilename + "." + first_date.strftime(self.suffix)
+        )
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+
+        if os.path.exists(dfn):
+            # 同一天已经归档过一部分，追加到已有文件末尾
+            with open(self.baseFilename, "rb") as f_in, open(dfn, "ab") as f_out:
+                shutil.copyfileobj(f_in, f_out)
+            os.remove(self.baseFilename)
+        else:
+            self.rotate(self.baseFilename, dfn)
+
+        if self.backupCount > 0:
+            for s in self.getFilesToDelete():
+                os.remove(s)
+        if not self.delay:
+            self.stream = self._open()
+        self.rolloverAt = self.computeRollover(int(time.time()))
+
+    def schedule_maintenance(self):
         dirName, baseName = os.path.split(self.baseFilename)
-        fileNames = os.listdir(dirName)
-        today = datetime.today().date()
-
-        for fileName in fileNames:
-            if fileName.startswith(baseName) and fileName.endswith(".gz"):
-                fullPath = os.path.join(dirName, fileName)
-                file_date = self.parse_date_from_filename(fileName)
-                if file_date and (today - file_date).days > self.deleteBeforeDays:
-                    os.remove(fullPath)
-                    self._log_internal(f"Deleted old log: {fileName}")
+        schedule_maintenance(
+            dirName,
+            baseName,
+            self.compressBeforeDays,
+            self.deleteBeforeDays,
+            log=self._log_internal,
+        )
 
     def _log_internal(self, message):
         logger = logging.getLogger("log.maintenance")
@@ -108,18 +121,191 @@ class SmartCompressAndCleanupTimedRotatingFileHandler(TimedRotatingFileHandler):
         logger.info(message)
 
 
+class BoundedQueueHandler(QueueHandler):
+    """
+    写入有界队列的 QueueHandler，队列满时按 overflow 策略处理：
+    - block: 阻塞等待队列有空位（不丢日志）
+    - drop_new: 丢弃当前这条日志
+    - drop_oldest: 丢弃队列中最旧的一条，再放入当前日志
+    """
+
+    OVERFLOW_POLICIES = ("block", "drop_new", "drop_oldest")
+
+    def __init__(self, log_queue: queue.Queue, overflow: str = "block"):
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"invalid overflow policy: {overflow}")
+        super().__init__(log_queue)
+        self.overflow = overflow
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.overflow == "block":
+            self.queue.put(record)
+            return
+
+        while True:
+            try:
+                self.queue.put_nowait(record)
+                return
+            except queue.Full:
+                self.dropped += 1
+                if self.overflow == "drop_new":
+                    return
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                pass
+
+
+def _stop_listener(listener: QueueListener, handler: BoundedQueueHandler) -> None:
+    """
+    进程退出时写完队列中剩余的日志，并记录被丢弃的日志数量
+    """
+    listener.stop()
+    if handler.dropped:
+        record = logging.LogRecord(
+            "log.queue",
+            logging.WARNING,
+            __file__,
+            0,
+            f"⚠️ Log queue overflow, dropped {handler.dropped} records",
+            None,
+            None,
+        )
+        for h in listener.handlers:
+            h.handle(record)
+
+
+class LogSampler:
+    """
+    高频日志的采样与限流，被抑制的日志不会格式化：
+    - every: 每个调用位置每 N 条输出 1 条（第 1 条总会输出）
+    - per_second: 每个 key 每秒最多输出 K 条，key 默认是未格式化的消息模板
+
+    日志参数使用 % 风格（logger.info("%s", x)），只有真正输出时才格式化。
+    进程退出时输出各调用位置被抑制的条数。
+    """
+
+    def __init__(self, logger: Logger, every: int = 1, per_second: float = 0):
+        self.logger = logger
+        self.every = every
+        self.per_second = per_second
+        self.lock = threading.Lock()
+        # 调用位置 -> [总条数, 被抑制条数]
+        self.sites: Dict[Tuple[str, int], List[int]] = {}
+        # 限流 key -> [窗口开始时间, 窗口内已输出条数]
+        self.windows: Dict[object, List[float]] = {}
+
+    def allow(
+        self, site: Tuple[str, int], key: object, every: int, per_second: float
+    ) -> bool:
+        with self.lock:
+            counts = self.sites.setdefault(site, [0, 0])
+            counts[0] += 1
+            allowed = (counts[0] - 1) % every == 0
+
+            if allowed and per_second > 0:
+                now = time.monotonic()
+                window = self.windows.setdefault(key, [now, 0])
+                if now - window[0] >= 1:
+                    window[0], window[1] = now, 0
+                if window[1] >= per_second:
+                    allowed = False
+                else:
+                    window[1] += 1
+
+            if not allowed:
+                counts[1] += 1
+            return allowed
+
+    def log(
+        self,
+        level: int,
+        msg: str,
+        *args,
+        key: object = None,
+        every: Optional[int] = None,
+        per_second: Optional[float] = None,
+        stacklevel: int = 1,
+        **kwargs,
+    ) -> None:
+        if not self.logger.isEnabledFor(level):
+            return
+        frame = sys._getframe(stacklevel)
+        site = (frame.f_code.co_filename, frame.f_lineno)
+        every = every or self.every
+        per_second = self.per_second if per_second is None else per_second
+        if self.allow(site, msg if key is None else key, every, per_second):
+            self.logger.log(level, msg, *args, stacklevel=stacklevel + 1, **kwargs)
+
+    def debug(self, msg: str, *args, **kwargs) -> None:
+        self.log(logging.DEBUG, msg, *args, stacklevel=2, **kwargs)
+
+    def info(self, msg: str, *args, **kwargs) -> None:
+        self.log(logging.INFO, msg, *args, stacklevel=2, **kwargs)
+
+    def warning(self, msg: str, *args, **kwargs) -> None:
+        self.log(logging.WARNING, msg, *args, stacklevel=2, **kwargs)
+
+    def error(self, msg: str, *args, **kwargs) -> None:
+        self.log(logging.ERROR, msg, *args, stacklevel=2, **kwargs)
+
+    def summary(self) -> None:
+        with self.lock:
+            sites = sorted(self.sites.items())
+        for (filename, lineno), (total, suppressed) in sites:
+            if suppressed:
+                self.logger.info(
+                    "🔇 %s:%d suppressed %d/%d log lines",
+                    os.path.basename(filename),
+                    lineno,
+                    suppressed,
+                    total,
+                )
+
+
+_samplers: Dict[str, LogSampler] = {}
+_samplers_lock = threading.Lock()
+
+
+def get_sampler(logger: Logger, every: int = 1, per_second: float = 0) -> LogSampler:
+    """
+    获取 logger 对应的 LogSampler，同一个 logger 共用一个，进程退出时输出抑制统计
+
+    Args:
+        logger (Logger): 实际输出日志的 Logger。
+        every (int): 默认每个调用位置每 N 条输出 1 条，可在调用时用 every= 覆盖。
+        per_second (float): 默认每个 key 每秒最多输出的条数，0 表示不限。
+
+    Returns:
+        LogSampler: 采样器。
+    """
+    with _samplers_lock:
+        sampler = _samplers.get(logger.name)
+        if sampler is None:
+            sampler = LogSampler(logger, every, per_second)
+            _samplers[logger.name] = sampler
+            # 在 get_logger 注册的 _stop_listener 之前执行，摘要仍能写入队列
+            atexit.register(sampler.summary)
+        return sampler
+
+
 def get_logger(
     name: str = "",
     when: str = "midnight",
     interval: int = 1,
     backup_count: int = 7,
     encoding: str = "utf-8",
+    use_queue: bool = False,
+    queue_size: int = 10000,
+    overflow: str = "block",
 ) -> Logger:
     """
     获取一个预配置的 Logger：
     - 控制台输出（INFO及以上）
     - 文件输出（DEBUG及以上）
     - 日志每天轮转，轮转后自动压缩并清理超时日志
+    - use_queue 时调用方只把日志放入队列，格式化和写文件由后台线程完成
 
     Args:
         name (str): Logger 名称，默认取调用脚本文件名。
@@ -127,13 +313,16 @@ def get_logger(
         interval (int): 轮转间隔数量，配合 when 使用。
         backup_count (int): 文件保留数量，超过后触发压缩。
         encoding (str): 写日志文件的编码，默认 utf-8。
+        use_queue (bool): 是否使用 QueueHandler/QueueListener 异步输出日志。
+        queue_size (int): 日志队列长度上限，仅 use_queue 时生效。
+        overflow (str): 队列满时的策略：block / drop_new / drop_oldest。
 
     Returns:
         Logger: 配置好的 Logger 对象。
     """
     # 获取调用者文件路径
-    frame = inspect.stack()[1]
-    caller_file = frame.filename
+    # 只取调用者的代码对象，inspect.stack() 会为整个调用栈读取源码上下文
+    caller_file = sys._getframe(1).f_code.co_filename
     caller_dir = os.path.dirname(os.path.abspath(caller_file))
 
     # 日志目录
@@ -169,7 +358,6 @@ def get_logger(
         console_handler = logging.StreamHandler()
         console_handler.setLevel(logging.INFO)
         console_handler.setFormatter(colorlog_formatter)
-        logger.addHandler(console_handler)
 
         # 文件 handler
         file_handler = SmartCompressAndCleanupTimedRotatingFileHandler(
@@ -182,7 +370,22 @@ def get_logger(
         file_handler.setLevel(logging.DEBUG)
         file_handler.setFormatter(formatter)
         file_handler.suffix = "%Y-%m-%d"  # 文件名日期后缀
-        logger.addHandler(file_handler)
+
+        if use_queue:
+            # 调用方线程只负责入队，格式化和文件写入都在监听线程中进行
+            queue_handler = BoundedQueueHandler(queue.Queue(queue_size), overflow)
+            listener = QueueListener(
+                queue_handler.queue,
+                console_handler,
+                file_handler,
+                respect_handler_level=True,
+            )
+            listener.start()
+            atexit.register(_stop_listener, listener, queue_handler)
+            logger.addHandler(queue_handler)
+        else:
+            logger.addHandler(console_handler)
+            logger.addHandler(file_handler)
 
         # 日志归档/清理日志使用同一个 handler
         maintenance_logger = logging.getLogger("log.maintenance")
@@ -1,52 +1,24 @@
 # log_utils.py
 
-import gzip
-import inspect
 import os
-import re
-import shutil
 import sys
-from datetime import datetime
 
 from loguru import logger
 
-DATE_PATTERN = re.compile(r".*\.(\d{4}-\d{2}-\d{2})(\.gz)?$")
+from utils.log_archiver import schedule_maintenance
 
 
 def compress_and_cleanup_logs(
     log_dir, base_name, compress_before_days=7, delete_before_days=30
 ):
-    today = datetime.today().date()
-
-    for file_name in os.listdir(log_dir):
-        # 只处理当前 logger 生成的文件
-        if not file_name.startswith(base_name):
-            continue
-
-        full_path = os.path.join(log_dir, file_name)
-        match = DATE_PATTERN.match(file_name)
-        if not match:
-            continue
-
-        try:
-            file_date = datetime.strptime(match.group(1), "%Y-%m-%d").date()
-        except Exception:
-            continue
-
-        if not file_name.endswith(".gz"):
-            if (today - file_date).days > compress_before_days:
-                gz_path = full_path + ".gz"
-                if not os.path.exists(gz_path):
-                    with open(full_path, "rb") as f_in, gzip.open(
-                        gz_path, "wb"
-                    ) as f_out:
-                        shutil.copyfileobj(f_in, f_out)
-                    os.remove(full_path)
-                    logger.info(f"Compressed: {file_name}")
-        else:
-            if (today - file_date).days > delete_before_days:
-                os.remove(full_path)
-                logger.info(f"Deleted old log: {file_name}")
+    # 在后台线程中并行压缩/清理，不阻塞启动
+    return schedule_maintenance(
+        log_dir,
+        base_name,
+        compress_before_days,
+        delete_before_days,
+        log=logger.info,
+    )
 
 
 def get_loguru_logger(
@@ -57,8 +29,8 @@ def get_loguru_logger(
     delete_before_days: int = 30,
     encoding: str = "utf-8",
 ):
-    frame = inspect.stack()[1]
-    caller_file = frame.filename
+    # 只取调用者的代码对象，inspect.stack() 会为整个调用栈读取源码上下文
+    caller_file = sys._getframe(1).f_code.co_filename
     caller_dir = os.path.dirname(os.path.abspath(caller_file))
 
     log_dir = os.path.join(caller_dir, "log")
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+# @Author: Lewis Tian
+# @Date:   2026-10-20 14:21:09
+# @Desc:   准点发送请求：用 Date 头估计服务器时钟偏差，提前建立连接，睡眠 + 忙等到目标时刻
+#
+# Date 头只精确到秒，单次探测的误差达 ±0.5s。每次探测都给出一个偏差区间
+# [date - 收到响应的时间, date + 1 - 发出请求的时间]，取各次的交集。之后每次探测都安排在
+# 按当前区间中点估计的服务器整秒时刻到达，结果落在整秒前或后都会把区间减半，
+# 8 次探测后误差接近单程耗时。
+
+import math
+import statistics
+import time
+from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from utils.lazy import lazy_import
+
+asyncio = lazy_import("asyncio")
+aiohttp = lazy_import("aiohttp")
+
+PROBES = 8
+# 提前多久发送预热请求，需小于 aiohttp 连接的空闲超时（15s）
+WARM_BEFORE = 3.0
+# 最后这段时间用忙等代替 sleep，sleep 的唤醒误差通常在毫秒级
+BUSY_WAIT = 0.02
+# 请求到达服务器的时间比目标时刻晚这么多（另加上时钟偏差的误差），宁晚勿早
+ARRIVAL_MARGIN = 0.005
+# 目标时刻太远时不等待，直接发送
+MAX_LEAD = 300
+TIMEZONE = ZoneInfo("Asia/Shanghai")
+
+
+class ClockEstimate(NamedTuple):
+    offset: float  # 服务器时间 - 本地时间（秒）
+    error: float  # 偏差的误差范围（±秒），无法估计时为 inf
+    rtt: float  # 最小往返时间（秒）
+
+
+def next_fire_at(clock: str, now: Optional[float] = None) -> float:
+    """
+    返回北京时间下一个 HH:MM[:SS] 的时间戳，如 "00:00" 为下一个零点
+    """
+    parts = [int(p) for p in clock.split(":")]
+    if len(parts) not in (2, 3):
+        raise ValueError(f"invalid time, expect HH:MM[:SS]: {clock}")
+    hour, minute, second = (parts + [0])[:3]
+
+    current = datetime.fromtimestamp(now if now is not None else time.time(), TIMEZONE)
+    target = current.replace(hour=hour, minute=minute, second=second, microsecond=0)
+    if target <= current:
+        target += timedelta(days=1)
+    return target.timestamp()
+
+
+async def probe(
+    session: "aiohttp.ClientSession", url: str
+) -> Tuple[float, float, Optional[float]]:
+    """
+    发送一个 HEAD 请求
+
+    返回:
+        Tuple[float, float, Optional[float]]: (发出时间, 收到时间, Date 头的时间戳)
+    """
+    sent = time.time()
+    async with session.head(url, allow_redirects=False) as resp:
+        await resp.read()
+        received = time.time()
+        date = resp.headers.get("Date")
+    try:
+        return sent, received, parsedate_to_datetime(date).timestamp()
+    except (TypeError, ValueError):
+        return sent, received, None
+
+
+async def estimate_clock(
+    session: "aiohttp.ClientSession", url: str, probes: int = PROBES
+) -> ClockEstimate:
+    """
+    多次探测估计服务器时钟偏差，探测请求同时也完成了 DNS 解析和 TLS 握手
+    """
+    lo, hi = float("-inf"), float("inf")
+    mids: List[float] = []
+    rtts: List[float] = []
+    for _ in range(probes):
+        if mids and lo <= hi:
+            # 让请求在按区间中点估计的服务器整秒时刻到达
+            mid = (lo + hi) / 2
+            boundary = math.ceil(time.time() + mid + min(rtts) + BUSY_WAIT)
+            await sleep_until(boundary - mid - min(rtts) / 2)
+        sent, received, server = await probe(session, url)
+        rtts.append(received - sent)
+        if server is not None:
+            lo = max(lo, server - received)
+            hi = min(hi, server + 1 - sent)
+            mids.append(server + 0.5 - (sent + received) / 2)
+
+    if not mids:
+        return ClockEstimate(0.0, float("inf"), min(rtts))
+    if lo <= hi:
+        return ClockEstimate((lo + hi) / 2, (hi - lo) / 2, min(rtts))
+    # 区间不相交（服务器集群时钟不一致等），退化为取中位数
+    return ClockEstimate(statistics.median(mids), 0.5 + max(rtts) / 2, min(rtts))
+
+
+async def warm_up(session: "aiohttp.ClientSession", url: str, connections: int) -> None:
+    """
+    并发发送 connections 个请求，让连接池中保留这么多个已建立的连接
+    """
+    results = await asyncio.gather(
+        *(probe(session, url) for _ in range(connections)), return_exceptions=True
+    )
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+
+async def sleep_until(deadline: float) -> float:
+    """
+    睡眠到接近 deadline，再忙等到 deadline，返回实际时间
+    """
+    remaining = deadline - time.time()
+    if remaining > BUSY_WAIT:
+        await asyncio.sleep(remaining - BUSY_WAIT)
+    while True:
+        now = time.time()
+        if now >= deadline:
+            return now
+
+
+async def prepare_fire(
+    session: "aiohttp.ClientSession",
+    logger,
+    url: str,
+    target: float,
+    connections: int = 1,
+) -> Optional[ClockEstimate]:
+    """
+    估计时钟偏差、预热连接并等待到发送时刻：请求预计在服务器时间 target 后
+    ARRIVAL_MARGIN 秒到达
+
+    参数:
+        target (float): 服务器时间的目标时间戳
+
+    返回:
+        Optional[ClockEstimate]: 时钟估计，目标太远或探测失败时不等待，返回 None
+    """
+    lead = target - time.time()
+    if not 0 < lead <= MAX_LEAD:
+        logger.warning(f"⚠️ 目标时刻在 {lead:.0f}s 后，超出 (0, {MAX_LEAD}]，立即发送")
+        return None
+
+    try:
+        clock = await estimate_clock(session, url)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.warning(f"⚠️ 时钟探测失败，立即发送: {e}")
+        return None
+    logger.info(
+        f"⏱️ 服务器时钟偏差 {clock.offset * 1000:+.1f}ms "
+        f"(±{clock.error * 1000:.1f}ms)，最小往返 {clock.rtt * 1000:.1f}ms"
+    )
+
+    # 目标时刻换算为本地时间，减去单程耗时；偏差的误差算作余量，保证不早于目标时刻到达
+    margin = ARRIVAL_MARGIN + (clock.error if math.isfinite(clock.error) else 0)
+    deadline = target - clock.offset - clock.rtt / 2 + margin
+    await sleep_until(deadline - WARM_BEFORE)
+    try:
+        await warm_up(session, url, connections)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.warning(f"⚠️ 预热连接失败: {e}")
+    fired = await sleep_until(deadline)
+    logger.info(f"🎯 发送时刻比计划晚 {(fired - deadline) * 1000:.2f}ms")
+    return clock
+
+
+class FireReport(NamedTuple):
+    target: float  # 服务器时间的目标时间戳
+    clock: ClockEstimate
+    timings: Dict[str, Tuple[float, float]]  # 名称 -> (本地发出时间, 本地完成时间)
+
+    def send_delays(self) -> Dict[str, float]:
+        """各请求按服务器时间比目标时刻晚发出的秒数"""
+        return {
+            name: sent + self.clock.offset - self.target
+            for name, (sent, _) in self.timings.items()
+        }
+
+    def log(self, logger) -> None:
+        delays = self.send_delays()
+        for name, (sent, done) in self.timings.items():
+            logger.info(
+                f"🎯 [{name}] 发出 {delays[name] * 1000:+.1f}ms，"
+                f"耗时 {(done - sent) * 1000:.1f}ms"
+            )
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# @Author: Lewis Tian
+# @Date:   2026-10-20 19:10:37
+# @Desc:   进程内共用的请求限速（令牌桶），同一站点的各个线程共用一个桶
+
+import threading
+import time
+from typing import Dict
+
+
+class TokenBucket:
+    """
+    令牌桶：平均每秒 rate 个请求，空闲后最多连续放行 burst 个
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        取一个令牌，返回需要等待的秒数；令牌可以透支，等待的线程按取令牌的先后放行
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+    def acquire(self) -> None:
+        """阻塞直到可以发出下一个请求"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_rate_limiter(name: str, rate: float, burst: int = 1) -> TokenBucket:
+    """
+    获取进程内共用的令牌桶，rate / burst 仅在首次创建时生效
+
+    参数:
+        name (str): 桶的名称，通常是站点，如 pixiv
+        rate (float): 每秒请求数
+        burst (int): 最多连续放行的请求数
+    """
+    with _buckets_lock:
+        if name not in _buckets:
+            _buckets[name] = TokenBucket(rate, burst)
+        return _buckets[name]
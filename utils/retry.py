@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# @Author: Lewis Tian
+# @Date:   2026-10-20 13:02:44
+# @Desc:   HTTP 请求的重试策略：可重试的状态码、指数退避、Retry-After
+
+import random
+from typing import Optional
+
+# 这些状态码值得重试，其余 4xx 直接判定失败
+RETRY_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class RetryPolicy:
+    """
+    指数退避 + 抖动：第 n 次重试等待 base * 2^(n-1) 的 [50%, 100%]，不超过 max_delay
+
+    max_retries 是首次请求失败后最多重试的次数，即最多请求 attempts = max_retries + 1 次；
+    调用方统一写成 for attempt in range(1, retry.attempts + 1)，
+    attempt < retry.attempts 时等待 delay(attempt) 后重试
+    """
+
+    def __init__(
+        self, max_retries: int = 3, base_delay: float = 0.5, max_delay: float = 30.0
+    ):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @property
+    def attempts(self) -> int:
+        """最多请求的次数，含首次请求"""
+        return self.max_retries + 1
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        backoff = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        backoff = backoff / 2 + random.uniform(0, backoff / 2)
+        if retry_after is not None:
+            backoff = max(backoff, min(retry_after, self.max_delay))
+        return backoff
+
+
+def parse_retry_after(headers) -> Optional[float]:
+    """解析 Retry-After 头（仅支持秒数）"""
+    value = headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+# @Author: Lewis Tian
+# @Date:   2026-10-20 10:48:31
+# @Desc:   cron 表达式解析与常驻进程的调度配置
+#
+# 支持标准的 5 段 cron（分 时 日 月 周）：* / , - 以及 @hourly 等别名。
+# 与 cron 一致，日和周都被限定时二者满足其一即可。
+
+import json
+from datetime import datetime, timedelta
+from typing import Dict, FrozenSet, List, NamedTuple, Tuple
+
+# 字段名, 最小值, 最大值
+FIELDS = [
+    ("minute", 0, 59),
+    ("hour", 0, 23),
+    ("day", 1, 31),
+    ("month", 1, 12),
+    ("weekday", 0, 7),  # 0 和 7 都是周日
+]
+ALIASES = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+    "@yearly": "0 0 1 1 *",
+}
+# 找不到匹配时间时放弃，例如 2 月 31 日
+MAX_SEARCH_DAYS = 366 * 5
+DEFAULT_TIMEZONE = "Asia/Shanghai"
+
+
+def parse_field(text: str, lo: int, hi: int) -> FrozenSet[int]:
+    """
+    解析 cron 的一个字段，返回匹配的取值集合
+    """
+    values = set()
+    for part in text.split(","):
+        body, _, step_text = part.partition("/")
+        step = int(step_text) if step_text else 1
+        if step < 1:
+            raise ValueError(f"invalid step in cron field: {part}")
+
+        if body == "*":
+            start, end = lo, hi
+        elif "-" in body:
+            start_text, end_text = body.split("-", 1)
+            start, end = int(start_text), int(end_text)
+        else:
+            start = int(body)
+            # a/n 表示从 a 开始每 n 个
+            end = hi if step_text else start
+
+        if start < lo or end > hi or start > end:
+            raise ValueError(f"cron field out of range [{lo}, {hi}]: {part}")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+class CronExpr(NamedTuple):
+    text: str
+    minutes: FrozenSet[int]
+    hours: FrozenSet[int]
+    days: FrozenSet[int]
+    months: FrozenSet[int]
+    weekdays: FrozenSet[int]  # 0 为周日
+    day_any: bool  # 日字段为 *
+    weekday_any: bool  # 周字段为 *
+
+    @classmethod
+    def parse(cls, text: str) -> "CronExpr":
+        expr = ALIASES.get(text.strip(), text)
+        parts = expr.split()
+        if len(parts) != len(FIELDS):
+            raise ValueError(f"cron expression needs 5 fields: {text!r}")
+        fields = [parse_field(p, lo, hi) for p, (_, lo, hi) in zip(parts, FIELDS)]
+        fields[4] = frozenset(v % 7 for v in fields[4])
+        return cls(text, *fields, parts[2] == "*", parts[4] == "*")
+
+    def match_day(self, dt: datetime) -> bool:
+        in_days = dt.day in self.days
+        # datetime.weekday() 以周一为 0，cron 以周日为 0
+        in_weekdays = (dt.weekday() + 1) % 7 in self.weekdays
+        if self.day_any or self.weekday_any:
+            return in_days and in_weekdays
+        return in_days or in_weekdays
+
+    def next_after(self, dt: datetime) -> datetime:
+        """
+        返回严格晚于 dt 的下一个匹配时间（精确到分钟，保留 dt 的时区）
+        """
+        current = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = current + timedelta(days=MAX_SEARCH_DAYS)
+        while current < limit:
+            if current.month not in self.months:
+                # 跳到下个月 1 日零点
+                year = current.year + current.month // 12
+                month = current.month % 12 + 1
+                current = current.replace(
+                    year=year, month=month, day=1, hour=0, minute=0
+                )
+                continue
+            if not self.match_day(current):
+                current = current.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if current.hour not in self.hours:
+                current = current.replace(minute=0) + timedelta(hours=1)
+                continue
+            if current.minute not in self.minutes:
+                current += timedelta(minutes=1)
+                continue
+            return current
+        raise ValueError(f"cron expression never matches: {self.text!r}")
+
+
+class ScheduleEntry(NamedTuple):
+    name: str
+    cron: CronExpr
+    jobs: Tuple[str, ...]  # 任务名，依赖的任务会一起执行
+    jitter: float = 0  # 在 cron 时间之后随机推迟 [0, jitter] 秒，避免固定时刻请求
+
+
+class ScheduleConfig(NamedTuple):
+    entries: List[ScheduleEntry]
+    timezone: str = DEFAULT_TIMEZONE
+    max_workers: int = 4
+    group_limits: Dict[str, int] = {}
+
+
+def load_schedule(path: str) -> ScheduleConfig:
+    """
+    读取调度配置，格式见项目根目录的 schedule.json
+
+    参数:
+        path (str): 配置文件路径
+
+    返回:
+        ScheduleConfig: 配置有误时抛出 ValueError
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"invalid json in {path}: {e}") from e
+
+    entries = []
+    names = set()
+    for item in data.get("entries", []):
+        try:
+            name, cron, jobs = item["name"], item["cron"], item["jobs"]
+        except KeyError as e:
+            raise ValueError(f"schedule entry missing {e}: {item}") from e
+        if name in names:
+            raise ValueError(f"duplicate schedule entry: {name}")
+        names.add(name)
+        entries.append(
+            ScheduleEntry(
+                name, CronExpr.parse(cron), tuple(jobs), float(item.get("jitter", 0))
+            )
+        )
+
+    return ScheduleConfig(
+        entries,
+        data.get("timezone", DEFAULT_TIMEZONE),
+        int(data.get("max_workers", 4)),
+        {k: int(v) for k, v in data.get("group_limits", {}).items()},
+    )
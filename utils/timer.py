@@ -20,6 +20,12 @@ def get_today_timestamp() -> int:
     return int(zero_time.timestamp())
 
 
+def date_to_timestamp(date_str: str, fmt: str = "%Y-%m-%d") -> int:
+    # 将北京时间的日期字符串转换为当天零点的时间戳
+    dt = datetime.strptime(date_str, fmt).replace(tzinfo=ZoneInfo("Asia/Shanghai"))
+    return int(dt.timestamp())
+
+
 def to_beijing_time_str(timestamp: int) -> str:
     return datetime.fromtimestamp(timestamp, ZoneInfo("Asia/Shanghai")).strftime(
         "%Y-%m-%d %H:%M:%S"
@@ -0,0 +1,502 @@
+# -*- coding: utf-8 -*-
+# @Author: Lewis Tian
+# @Date:   2026-10-19 22:20:16
+# @Desc:   追加写入的二进制时间序列存储，替代每次读写整个 CSV 的 save_and_clean；
+#           原始数据只保留 N 天，更早的数据以日/周/月聚合长期保留
+
+from __future__ import annotations
+
+import bisect
+import json
+import logging
+import os
+import struct
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from utils.csver import append_csv, read_csv, read_csv_head, write_csv
+from utils.lazy import lazy_import
+
+if TYPE_CHECKING:
+    import numpy as np
+else:
+    # 只有聚合层用到 numpy，导入约 50ms，延迟到第一次使用
+    np = lazy_import("numpy")
+
+META_FILENAME = "meta.json"
+SEGMENT_SUFFIX = ".bin"
+DAY_SECONDS = 86400
+# 按北京时间划分日/周/月
+TZ_OFFSET = 8 * 3600
+
+# 聚合层：名称 -> (桶的大致宽度秒数, 保留的桶数量，None 表示永久保留)
+TIERS = {
+    "daily": (DAY_SECONDS, 366),
+    "weekly": (7 * DAY_SECONDS, 260),
+    "monthly": (31 * DAY_SECONDS, None),
+}
+
+Record = Tuple[int, Tuple[float, ...]]
+
+
+def aggregate_dtype(columns: int) -> np.dtype:
+    """聚合桶：起始时间、条数、最后一条的时间，以及每列的 min/max/sum/last"""
+    return np.dtype(
+        [
+            ("start", "<i8"),
+            ("count", "<i8"),
+            ("last_ts", "<i8"),
+            ("min", "<f8", (columns,)),
+            ("max", "<f8", (columns,)),
+            ("sum", "<f8", (columns,)),
+            ("last", "<f8", (columns,)),
+        ]
+    )
+
+
+def bucket_starts(tier: str, timestamps: np.ndarray) -> np.ndarray:
+    """
+    计算每个时间戳所在桶的起始时间戳（北京时间的日/周一/月初零点）
+    """
+    local = np.asarray(timestamps, dtype=np.int64) + TZ_OFFSET
+    if tier == "daily":
+        starts = local - local % DAY_SECONDS
+    elif tier == "weekly":
+        days = local // DAY_SECONDS
+        # 1970-01-01 是周四，(days + 3) % 7 为距离周一的天数
+        starts = (days - (days + 3) % 7) * DAY_SECONDS
+    elif tier == "monthly":
+        months = local.astype("datetime64[s]").astype("datetime64[M]")
+        starts = months.astype("datetime64[s]").astype(np.int64)
+    else:
+        raise ValueError(f"unknown tier: {tier}")
+    return starts - TZ_OFFSET
+
+
+def aggregate(
+    tier: str, timestamps: np.ndarray, values: np.ndarray, columns: int
+) -> np.ndarray:
+    """
+    把按时间排序的原始记录一次性聚合成 tier 的桶
+    """
+    result = np.zeros(0, dtype=aggregate_dtype(columns))
+    if not len(timestamps):
+        return result
+
+    starts = bucket_starts(tier, timestamps)
+    first = np.flatnonzero(np.r_[True, starts[1:] != starts[:-1]])
+    last = np.r_[first[1:] - 1, len(starts) - 1]
+
+    result = np.zeros(len(first), dtype=result.dtype)
+    result["start"] = starts[first]
+    result["count"] = np.diff(np.r_[first, len(starts)])
+    result["last_ts"] = timestamps[last]
+    result["min"] = np.minimum.reduceat(values, first, axis=0)
+    result["max"] = np.maximum.reduceat(values, first, axis=0)
+    result["sum"] = np.add.reduceat(values, first, axis=0)
+    result["last"] = values[last]
+    return result
+
+
+class TimeSeriesStore:
+    """
+    按时间分段的二进制时间序列：
+    - 每条记录为 int64 时间戳 + 每列一个 float64，定长追加写入 segment 文件
+    - segment 文件以起始时间戳命名，按文件名即可定位时间范围
+    - 时间戳严格递增，判重只需和最后一条记录比较，O(1)
+    - 过期数据按 segment 整个删除，不重写文件
+    - 每次写入时增量更新日/周/月聚合（tier），原始数据过期后仍可查询长期趋势
+    """
+
+    def __init__(
+        self,
+        dirpath: str,
+        columns: Sequence[str],
+        retention_days: int = 14,
+        segment_days: int = 1,
+    ):
+        self.dirpath = dirpath
+        self.columns = list(columns)
+        self.retention = retention_days * DAY_SECONDS
+        self.segment_seconds = segment_days * DAY_SECONDS
+        self.record = struct.Struct("<q" + "d" * len(self.columns))
+
+        os.makedirs(dirpath, exist_ok=True)
+        self.check_meta()
+        self.segments = self.list_segments()
+        self.last_timestamp = self.read_last_timestamp()
+        self.tiers = self.load_tiers()
+
+    @classmethod
+    def load(cls, dirpath: str, retention_days: int = 14) -> "TimeSeriesStore":
+        """
+        按 meta.json 中的列名打开已有的时间序列，不存在时抛出 FileNotFoundError
+        """
+        with open(os.path.join(dirpath, META_FILENAME), "r", encoding="utf-8") as f:
+            columns = json.load(f)["columns"]
+        return cls(dirpath, columns, retention_days=retention_days)
+
+    def check_meta(self) -> None:
+        meta_path = os.path.join(self.dirpath, META_FILENAME)
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("columns") != self.columns:
+                raise ValueError(
+                    f"columns mismatch in {self.dirpath}: "
+                    f"{meta.get('columns')} != {self.columns}"
+                )
+            self.segment_seconds = meta.get("segment_seconds", self.segment_seconds)
+            return
+
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"columns": self.columns, "segment_seconds": self.segment_seconds}, f
+            )
+
+    def list_segments(self) -> List[int]:
+        starts = []
+        for name in os.listdir(self.dirpath):
+            stem, ext = os.path.splitext(name)
+            if ext == SEGMENT_SUFFIX and stem.lstrip("-").isdigit():
+                starts.append(int(stem))
+        return sorted(starts)
+
+    def segment_path(self, start: int) -> str:
+        return os.path.join(self.dirpath, f"{start}{SEGMENT_SUFFIX}")
+
+    def read_last_timestamp(self) -> Optional[int]:
+        """
+        读取最后一条记录的时间戳，顺带截掉进程中断留下的半条记录
+        """
+        size = self.record.size
+        while self.segments:
+            path = self.segment_path(self.segments[-1])
+            with open(path, "r+b") as f:
+                length = f.seek(0, os.SEEK_END)
+                if length % size:
+                    length -= length % size
+                    f.truncate(length)
+                if length:
+                    f.seek(length - size)
+                    return self.record.unpack(f.read(size))[0]
+            # 空文件直接删除
+            os.remove(path)
+            self.segments.pop()
+        return None
+
+    def append(self, timestamp: int, values: Sequence[float]) -> bool:
+        """
+        追加一条记录，时间戳不大于最后一条时跳过
+
+        返回:
+            bool: 是否写入
+        """
+        if len(values) != len(self.columns):
+            raise ValueError(f"expect {len(self.columns)} values, got {len(values)}")
+        if self.last_timestamp is not None and timestamp <= self.last_timestamp:
+            return False
+
+        start = timestamp - timestamp % self.segment_seconds
+        with open(self.segment_path(start), "ab") as f:
+            f.write(self.record.pack(timestamp, *map(float, values)))
+        if not self.segments or self.segments[-1] != start:
+            self.segments.append(start)
+        self.last_timestamp = timestamp
+
+        self.rollup(timestamp, values)
+        self.expire(timestamp - self.retention)
+        return True
+
+    def tier_path(self, tier: str) -> str:
+        return os.path.join(self.dirpath, f"{tier}.npy")
+
+    def load_tiers(self) -> Dict[str, np.ndarray]:
+        """
+        读取各层聚合；缺失时（如升级前创建的目录）用现有原始数据重建
+        """
+        dtype = aggregate_dtype(len(self.columns))
+        tiers = {}
+        missing = []
+        for tier in TIERS:
+            path = self.tier_path(tier)
+            if os.path.exists(path):
+                tiers[tier] = np.load(path).astype(dtype)
+            else:
+                missing.append(tier)
+
+        if missing:
+            raw = self.read_array()
+            for tier in missing:
+                tiers[tier] = aggregate(
+                    tier, raw["ts"], raw["values"], len(self.columns)
+                )
+                self.save_tier(tier, tiers[tier])
+        return tiers
+
+    def save_tier(self, tier: str, data: np.ndarray) -> None:
+        path = self.tier_path(tier)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, data)
+        os.replace(tmp_path, path)
+
+    def rollup(self, timestamp: int, values: Sequence[float]) -> None:
+        """
+        把一条新记录合并进各层的最后一个桶，跨桶时新开一个桶
+        """
+        row = np.asarray(values, dtype=np.float64)
+        for tier, (_, keep) in TIERS.items():
+            data = self.tiers[tier]
+            start = int(bucket_starts(tier, np.array([timestamp]))[0])
+            if len(data) and data["start"][-1] == start:
+                data["count"][-1] += 1
+                data["last_ts"][-1] = timestamp
+                data["min"][-1] = np.minimum(data["min"][-1], row)
+                data["max"][-1] = np.maximum(data["max"][-1], row)
+                data["sum"][-1] += row
+                data["last"][-1] = row
+            else:
+                bucket = np.zeros(1, dtype=data.dtype)
+                bucket["start"] = start
+                bucket["count"] = 1
+                bucket["last_ts"] = timestamp
+                for field in ("min", "max", "sum", "last"):
+                    bucket[field] = row
+                data = np.concatenate([data, bucket])
+                if keep is not None:
+                    data = data[-keep:]
+                self.tiers[tier] = data
+            self.save_tier(tier, data)
+
+    def expire(self, cutoff: int) -> int:
+        """
+        删除所有记录都早于 cutoff 的 segment，返回删除的文件数
+        """
+        removed = 0
+        while self.segments and self.segments[0] + self.segment_seconds <= cutoff:
+            os.remove(self.segment_path(self.segments.pop(0)))
+            removed += 1
+        return removed
+
+    def read_segment(self, start: int) -> Iterator[Record]:
+        with open(self.segment_path(start), "rb") as f:
+            data = f.read()
+        data = data[: len(data) - len(data) % self.record.size]
+        for timestamp, *values in self.record.iter_unpack(data):
+            yield timestamp, tuple(values)
+
+    def query(
+        self, start: Optional[int] = None, end: Optional[int] = None
+    ) -> Iterator[Record]:
+        """
+        按时间顺序返回 [start, end) 内的记录，只读取覆盖该范围的 segment
+        """
+        first = 0
+        if start is not None:
+            first = max(bisect.bisect_right(self.segments, start) - 1, 0)
+        for seg_start in self.segments[first:]:
+            if end is not None and seg_start >= end:
+                break
+            for timestamp, values in self.read_segment(seg_start):
+                if start is not None and timestamp < start:
+                    continue
+                if end is not None and timestamp >= end:
+                    return
+                yield timestamp, values
+
+    def read_array(
+        self, start: Optional[int] = None, end: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        以结构化数组读取 [start, end) 内的原始记录，字段为 ts 和 values
+        """
+        dtype = np.dtype([("ts", "<i8"), ("values", "<f8", (len(self.columns),))])
+        first = 0
+        if start is not None:
+            first = max(bisect.bisect_right(self.segments, start) - 1, 0)
+        parts = []
+        for seg_start in self.segments[first:]:
+            if end is not None and seg_start >= end:
+                break
+            with open(self.segment_path(seg_start), "rb") as f:
+                data = f.read()
+            usable = len(data) - len(data) % dtype.itemsize
+            parts.append(np.frombuffer(data[:usable], dtype))
+
+        raw = np.concatenate(parts) if parts else np.zeros(0, dtype=dtype)
+        mask = np.ones(len(raw), dtype=bool)
+        if start is not None:
+            mask &= raw["ts"] >= start
+        if end is not None:
+            mask &= raw["ts"] < end
+        return raw[mask]
+
+    def query_tier(
+        self, tier: str, start: Optional[int] = None, end: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        返回 tier 中起始时间在 [start, end) 内的桶，mean 为 sum / count
+        """
+        data = self.tiers[tier]
+        lo = 0 if start is None else np.searchsorted(data["start"], start, "left")
+        hi = len(data) if end is None else np.searchsorted(data["start"], end, "left")
+        return data[lo:hi]
+
+    def pick_tier(
+        self, start: int, end: Optional[int] = None, max_points: int = 400
+    ) -> str:
+        """
+        选择能覆盖 start 的最细粒度：原始数据仍在保留期内时用原始数据，
+        否则选第一个覆盖 start 且点数不超过 max_points 的聚合层；
+        各层都没有那么早的数据时（如刚开始记录），选点数不超过 max_points 的最细一层
+        """
+        end = end if end is not None else (self.last_timestamp or start) + 1
+        if self.last_timestamp is None or start >= self.last_timestamp - self.retention:
+            return "raw"
+        fits = [
+            t for t, (width, _) in TIERS.items() if (end - start) / width <= max_points
+        ]
+        for tier in fits:
+            data = self.tiers[tier]
+            if len(data) and data["start"][0] <= start:
+                return tier
+        return fits[0] if fits else "monthly"
+
+    def query_range(
+        self, start: int, end: Optional[int] = None, max_points: int = 400
+    ) -> Tuple[str, np.ndarray]:
+        """
+        按时间范围查询，只读取匹配的一层
+
+        返回:
+            Tuple[str, np.ndarray]: (层名 raw/daily/weekly/monthly, 数据)
+        """
+        tier = self.pick_tier(start, end, max_points)
+        if tier == "raw":
+            return tier, self.read_array(start, end)
+        return tier, self.query_tier(tier, start, end)
+
+    def recent(self, days: int, max_points: int = 400) -> Iterator[Record]:
+        """
+        最近 days 天（以最后一条记录的时间为基准）的数据，经 query_range 只读取匹配的一层；
+        读取聚合层时每个桶返回 (桶的起始时间, 最后一条的值)
+        """
+        if self.last_timestamp is None:
+            return iter(())
+        start = self.last_timestamp - days * DAY_SECONDS
+        tier, data = self.query_range(start, max_points=max_points)
+        if tier == "raw":
+            return ((int(r["ts"]), tuple(r["values"].tolist())) for r in data)
+        return ((int(b["start"]), tuple(b["last"].tolist())) for b in data)
+
+    def latest(self) -> Iterator[Record]:
+        """
+        保留期内的记录（以最后一条记录的时间为基准）
+        """
+        if self.last_timestamp is None:
+            return iter(())
+        return self.query(self.last_timestamp - self.retention)
+
+    def import_csv(self, csv_path: str) -> int:
+        """
+        从 save_and_clean 生成的 CSV 导入数据，返回导入条数
+        """
+        if not os.path.exists(csv_path):
+            return 0
+        _, rows = read_csv(csv_path)
+        count = 0
+        for row in rows:
+            if self.append(int(row[0]), [float(x) for x in row[1:]]):
+                count += 1
+        return count
+
+    def export_csv(self, csv_path: str, header: Sequence[str]) -> None:
+        """
+        导出保留期内的数据为 CSV，格式与 save_and_clean 一致
+        """
+        rows = [
+            [timestamp] + [format_value(v) for v in values]
+            for timestamp, values in self.latest()
+        ]
+        write_csv(csv_path, header, rows)
+
+    def append_csv(
+        self,
+        csv_path: str,
+        header: Sequence[str],
+        timestamp: int,
+        values: Sequence[float],
+    ) -> None:
+        """
+        把刚写入的一条记录追加到 export_csv 导出的 CSV 末尾，不重写整个文件；
+        CSV 中最早的记录过期超过一天（或表头不一致）时才整体重新导出一次，
+        因此 CSV 最多比保留期多留一天的数据
+        """
+        csv_header, first = read_csv_head(csv_path)
+        cutoff = timestamp - self.retention - DAY_SECONDS
+        try:
+            stale = first is None or int(first[0]) < cutoff
+        except (ValueError, IndexError):
+            stale = True
+        if stale or csv_header != list(header):
+            self.export_csv(csv_path, header)
+            return
+        append_csv(csv_path, [[timestamp] + [format_value(float(v)) for v in values]])
+
+
+def format_value(value: float) -> str:
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def save_and_export(
+    dirpath: str,
+    csv_path: str,
+    logger: logging.Logger,
+    header: List[str],
+    data: List[float],
+    expire: int = 14,
+) -> bool:
+    """
+    写入一条数据到 dirpath 的时间序列，并追加到导出的 csv_path（过期数据延迟清理）
+
+    首次使用时自动导入 csv_path 中已有的数据。
+
+    参数:
+        dirpath (str): 时间序列目录。
+        csv_path (str): 导出的 CSV 文件路径。
+        logger (logging.Logger): 用于记录信息和警告。
+        header (List[str]): 表头，第一列为时间戳，其余为数值列。
+        data (List[float]): 一条待写入的数据，第一项为 int 类型的 Unix 时间戳。
+        expire (int): 数据保留的天数（默认 14 天）。
+
+    返回:
+        bool: 是否写入了新数据
+    """
+    if len(header) != len(data):
+        logger.warning("Header 和 data 长度不一致，写入被跳过")
+        return False
+
+    timestamp = data[0]
+    if not isinstance(timestamp, int):
+        logger.warning("data[0] 必须为 int 类型的 Unix 时间戳")
+        return False
+
+    try:
+        values = [float(x) for x in data[1:]]
+    except (TypeError, ValueError):
+        logger.warning(f"数据必须为数值，写入被跳过：{data}")
+        return False
+
+    store = TimeSeriesStore(dirpath, header[1:], retention_days=expire)
+    if store.last_timestamp is None:
+        imported = store.import_csv(csv_path)
+        if imported:
+            logger.info(f"已从 {csv_path} 导入 {imported} 条数据")
+
+    if not store.append(timestamp, values):
+        logger.warning(f"{timestamp} 已存在，跳过写入")
+        return False
+
+    logger.info(f"写入成功：{data}")
+    store.append_csv(csv_path, header, timestamp, values)
+    return True
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+# @Author: Lewis Tian
+# @Date:   2026-10-19 17:20:41
+# @Desc:   大缓冲区下载写入：按 Content-Length 预分配文件，复用缓冲区读取，自适应块大小
+
+import asyncio
+import os
+from typing import BinaryIO, Callable, Mapping, Optional, Protocol
+
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 1024 * 1024
+PART_SUFFIX = ".part"
+
+# 进度回调：参数为本次写入的字节数
+ProgressHook = Optional[Callable[[int], None]]
+
+
+class ReadIntoStream(Protocol):
+    def readinto(self, b: memoryview) -> Optional[int]: ...
+
+
+class AsyncStream(Protocol):
+    async def readany(self) -> bytes: ...
+
+
+class AdaptiveChunkSize:
+    """
+    自适应块大小：读满一整块就翻倍，连续读不满四分之一就减半
+    """
+
+    def __init__(self, min_size: int = MIN_CHUNK_SIZE, max_size: int = MAX_CHUNK_SIZE):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.size = min_size
+
+    def update(self, n: int) -> None:
+        if n >= self.size:
+            self.size = min(self.size * 2, self.max_size)
+        elif n < self.size // 4:
+            self.size = max(self.size // 2, self.min_size)
+
+
+def get_content_length(headers: Mapping[str, str]) -> Optional[int]:
+    """
+    从响应头中解析 Content-Length，缺失或非法时返回 None
+    """
+    value = headers.get("content-length") or headers.get("Content-Length")
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def open_preallocated(save_path: str, content_length: Optional[int]) -> BinaryIO:
+    """
+    打开临时文件 save_path + .part，并按 Content-Length 预分配磁盘空间
+
+    使用无缓冲的文件对象，write 直接写入文件描述符，不再经过一次用户态拷贝。
+    """
+    os.makedirs(os.path.dirname(save_path), exist_ok=True)
+    f = open(save_path + PART_SUFFIX, "wb", buffering=0)
+    if content_length and content_length > 0:
+        try:
+            os.posix_fallocate(f.fileno(), 0, content_length)
+        except (AttributeError, OSError):
+            # 非 POSIX 系统或文件系统不支持 fallocate 时退化为 truncate
+            f.truncate(content_length)
+    return f
+
+
+def write_all(f: BinaryIO, view: memoryview) -> None:
+    # 无缓冲写入可能只写入一部分，需要循环写完
+    while view:
+        n = f.write(view)
+        view = view[n:]
+
+
+def finish_file(f: BinaryIO, save_path: str, written: int) -> None:
+    """
+    截断预分配多出的空间，关闭文件并把 .part 替换为正式文件
+    """
+    try:
+        if os.fstat(f.fileno()).st_size != written:
+            f.truncate(written)
+    finally:
+        f.close()
+    os.replace(save_path + PART_SUFFIX, save_path)
+
+
+def discard_file(f: BinaryIO, save_path: str) -> None:
+    f.close()
+    try:
+        os.remove(save_path + PART_SUFFIX)
+    except OSError:
+        pass
+
+
+def write_stream(
+    stream: ReadIntoStream,
+    save_path: str,
+    content_length: Optional[int] = None,
+    progress: ProgressHook = None,
+) -> int:
+    """
+    同步写入：用 readinto 把数据读进复用的缓冲区，再写入预分配的文件
+
+    参数:
+        stream: 支持 readinto 的流，例如 requests 的 response.raw
+        save_path (str): 保存路径，写入完成前为 save_path + .part
+        content_length (Optional[int]): 预期大小，用于预分配
+        progress (ProgressHook): 每写入一块调用一次
+
+    返回:
+        int: 写入的字节数
+    """
+    buffer = memoryview(bytearray(MAX_CHUNK_SIZE))
+    chunk_size = AdaptiveChunkSize()
+    f = open_preallocated(save_path, content_length)
+    written = 0
+    try:
+        while True:
+            n = stream.readinto(buffer[: chunk_size.size])
+            if not n:
+                break
+            write_all(f, buffer[:n])
+            written += n
+            chunk_size.update(n)
+            if progress:
+                progress(n)
+    except BaseException:
+        discard_file(f, save_path)
+        raise
+
+    finish_file(f, save_path, written)
+    return written
+
+
+async def write_stream_async(
+    stream: AsyncStream,
+    save_path: str,
+    content_length: Optional[int] = None,
+    progress: ProgressHook = None,
+) -> int:
+    """
+    异步写入：网络数据拷贝进两块交替使用的缓冲区，写满一块就交给线程池写盘，
+    写盘期间继续接收下一块，磁盘 IO 不会阻塞事件循环
+
+    参数:
+        stream: 支持 readany 的流，例如 aiohttp 的 resp.content
+        save_path (str): 保存路径，写入完成前为 save_path + .part
+        content_length (Optional[int]): 预期大小，用于预分配
+        progress (ProgressHook): 每交给线程池写入一块调用一次
+
+    返回:
+        int: 写入的字节数
+    """
+    loop = asyncio.get_running_loop()
+    f = await loop.run_in_executor(None, open_preallocated, save_path, content_length)
+
+    buffers = [memoryview(bytearray(MAX_CHUNK_SIZE)) for _ in range(2)]
+    current = 0
+    filled = 0
+    written = 0
+    pending: Optional[asyncio.Future] = None
+    chunk_size = AdaptiveChunkSize()
+
+    async def flush() -> None:
+        nonlocal current, filled, pending, written
+        if pending is not None:
+            await pending
+        pending = loop.run_in_executor(None, write_all, f, buffers[current][:filled])
+        written += filled
+        chunk_size.update(filled)
+        if progress:
+            progress(filled)
+        current ^= 1
+        filled = 0
+
+    try:
+        while True:
+            data = await stream.readany()
+            if not data:
+                break
+            view = memoryview(data)
+            while view:
+                n = min(len(view), chunk_size.size - filled)
+                buffers[current][filled : filled + n] = view[:n]  # noqa: E203
+                filled += n
+                view = view[n:]
+                if filled >= chunk_size.size:
+                    await flush()
+        if filled:
+            await flush()
+        if pending is not None:
+            await pending
+    except BaseException:
+        if pending is not None:
+            await asyncio.gather(pending, return_exceptions=True)
+        await loop.run_in_executor(None, discard_file, f, save_path)
+        raise
+
+    await loop.run_in_executor(None, finish_file, f, save_path, written)
+    return written
@@ -6,15 +6,17 @@
 
 import argparse
 import asyncio
+import itertools
 import json
+import math
 import os
 import sys
 from logging import Logger
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
 
 import aiohttp
-import requests
 from aiohttp import ClientSession
+from pydantic import ValidationError
 
 # 添加项目根目录到 sys.path，确保能导入 bootstrap.py
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
@@ -22,117 +24,417 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 import bootstrap  # noqa: F401, E402
-from model.weibo_album import AlbumItem, AlbumResponse  # noqa: E402
+from model.weibo_album import (  # noqa: E402
+    AlbumBackfillCheckpoint,
+    AlbumCursor,
+    AlbumData,
+    AlbumItem,
+    AlbumResponse,
+)
+from utils.capture import CapturedBody  # noqa: E402
+from utils.downloader import AsyncDownloader, RetryPolicy  # noqa: E402
+from utils.jobs import job  # noqa: E402
+from utils.jsoner import decode  # noqa: E402
 from utils.logger import get_logger  # noqa: E402
-from utils.timer import get_today_timestamp, to_beijing_time  # noqa: E402
+from utils.timer import (  # noqa: E402
+    date_to_timestamp,
+    get_today_timestamp,
+    to_beijing_time,
+)
 from utils.timer import to_beijing_time_str as bj_time_str  # noqa: E402
 
 MAX_RETRIES = 3
+MAX_PAGE = 9
+PAGE_SIZE = 30
 CONCURRENT_LIMIT = 10
+BACKFILL_CONCURRENT_PAGES = 5
+BACKFILL_MAX_FAILURES = 10
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=10)
+CURSOR_FILEPATH = os.path.join(os.path.dirname(__file__), "album_cursor.json")
+BACKFILL_DIRPATH = os.path.join(os.path.dirname(__file__), "backfill")
+DOWNLOAD_QUEUE_FILEPATH = os.path.join(os.path.dirname(__file__), "download_queue.json")
 
+# 萌宠
+UID_ANIMAL = ["3186116445", "1749139802"]
+# 明星
+UID_STAR = ["1669879400", "3261134763", "1676082433"]
+# 表情包
+UID_MEME = ["2632260340", "5553432114"]
+DEFAULT_UIDS = UID_ANIMAL + UID_STAR + UID_MEME
 
-async def download_image(
-    logger: Logger,
-    session: ClientSession,
-    url: str,
-    save_path: str,
-    sem: asyncio.Semaphore,
-):
-    async with sem:
-        for attempt in range(1, MAX_RETRIES + 1):
-            try:
-                async with session.get(url) as resp:
-                    if resp.status != 200:
-                        logger.warning(f"⚠️ 状态码 {resp.status}，第 {attempt} 次重试: {url}")
-                        continue
-                    os.makedirs(os.path.dirname(save_path), exist_ok=True)
-                    with open(save_path, "wb") as f:
-                        while True:
-                            chunk = await resp.content.read(1024)
-                            if not chunk:
-                                break
-                            f.write(chunk)
-                    logger.info(f"✅ 下载成功: {os.path.basename(save_path)}")
-                    return
-            except Exception as e:
-                logger.error(f"⚠️ 异常: {url}，第 {attempt} 次重试，错误: {e}")
-            await asyncio.sleep(0.5)  # 防止过快重试
-
-        logger.error(f"❌ 最终失败: {url}")
-
-
-async def download_all_images(logger: Logger, ual: List[AlbumItem], uid: str):
-    sem = asyncio.Semaphore(CONCURRENT_LIMIT)
+# 下载队列中的元素：(uid, 图片信息)
+DownloadTask = Tuple[str, AlbumItem]
+
+
+def get_downloader(logger: Logger) -> AsyncDownloader:
+    """
+    创建下载器，列表请求和图片下载共用它的 aiohttp 会话和连接池
+    """
+    return AsyncDownloader(
+        logger,
+        max_concurrency=CONCURRENT_LIMIT,
+        retry=RetryPolicy(max_retries=MAX_RETRIES),
+        queue_path=DOWNLOAD_QUEUE_FILEPATH,
+    )
+
+
+def get_image_save_path(uid: str, item: AlbumItem) -> Tuple[str, str]:
+    """
+    根据图片信息生成下载链接和保存路径：images/{uid}/{YYYYMM}/{timestamp}_{pic_name}
+    """
     current_directory = os.path.dirname(__file__)
-    async with aiohttp.ClientSession() as session:
-        tasks = []
-        for item in ual:
-            url = f"{item.pic_host}/large/{item.pic_name}"
-            dt = to_beijing_time(item.timestamp)
-            save_dir = os.path.join(
-                current_directory, "images", uid, dt.strftime("%Y%m")
-            )
-            save_path = os.path.join(save_dir, f"{item.timestamp}_{item.pic_name}")
-            tasks.append(download_image(logger, session, url, save_path, sem))
-        await asyncio.gather(*tasks)
+    url = f"{item.pic_host}/large/{item.pic_name}"
+    dt = to_beijing_time(item.timestamp)
+    save_dir = os.path.join(current_directory, "images", uid, dt.strftime("%Y%m"))
+    save_path = os.path.join(save_dir, f"{item.timestamp}_{item.pic_name}")
+    return url, save_path
 
 
-def get_user_album(
-    logger: Logger, uid: str, cookie: str, sart_time: int, end_time: int
-) -> List[AlbumItem]:
-    session = requests.Session()
-    if len(uid) == 0 or len(cookie) == 0:
-        logger.warning("Empty uid or cookie!")
-        return []
+async def download_worker(
+    queue: "asyncio.Queue[DownloadTask]", downloader: AsyncDownloader
+) -> None:
+    """
+    从队列中取出图片并下载，直到被取消
+    """
+    while True:
+        uid, item = await queue.get()
+        try:
+            url, save_path = get_image_save_path(uid, item)
+            await downloader.download(url, save_path)
+        finally:
+            queue.task_done()
 
+
+async def fetch_album_page(
+    logger: Logger, session: ClientSession, uid: str, cookie: str, page: int
+) -> Optional[AlbumData]:
+    """
+    获取用户相册的某一页，失败返回 None
+    """
     headers = {
         "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
         "cookie": cookie,
     }
+    url = "https://photo.weibo.com/photos/get_all"
+    payload = {"uid": uid, "count": PAGE_SIZE, "page": page, "type": 3}
 
-    logger.info(f"sart_time: {sart_time}, end_time: {end_time}")
-    wb_album_list = []
-    for p in range(1, 10):
-        url = (
-            f"https://photo.weibo.com/photos/get_all?uid={uid}&count=30&page={p}&type=3"
+    try:
+        async with session.post(
+            url, params=payload, headers=headers, timeout=REQUEST_TIMEOUT
+        ) as resp:
+            text = await resp.text()
+            logger.info(f"Request URL: {resp.url}")
+            logger.info("Response Text: %s", CapturedBody(text))
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.error(f"Request failed: {e}")
+        return None
+
+    if not text.strip():
+        logger.warning("Empty response.")
+        return None
+
+    try:
+        return decode(text, AlbumResponse).data
+    except ValidationError as e:
+        logger.error(f"Failed to parse album page: {e}")
+        return None
+
+
+def load_cursors(logger: Logger) -> Dict[str, AlbumCursor]:
+    """
+    读取每个 uid 已入库的最新图片游标
+    """
+    if not os.path.exists(CURSOR_FILEPATH):
+        return {}
+
+    try:
+        with open(CURSOR_FILEPATH, "rb") as f:
+            return decode(f.read(), Dict[str, AlbumCursor])
+    except Exception as e:
+        logger.error(f"❌ Failed to load cursor file {CURSOR_FILEPATH}: {e}")
+        return {}
+
+
+def save_json(filepath: str, data: Any) -> None:
+    # 先写临时文件再替换，避免中断时留下不完整的 JSON
+    tmp_filepath = filepath + ".tmp"
+    with open(tmp_filepath, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=0)
+    os.replace(tmp_filepath, filepath)
+
+
+def save_cursors(cursors: Dict[str, AlbumCursor]) -> None:
+    data = {uid: c.model_dump() for uid, c in sorted(cursors.items())}
+    save_json(CURSOR_FILEPATH, data)
+
+
+async def get_user_album(
+    logger: Logger,
+    session: ClientSession,
+    queue: "asyncio.Queue[DownloadTask]",
+    uid: str,
+    cookie: str,
+    cursor: Optional[AlbumCursor],
+    since: int,
+) -> Tuple[int, Optional[AlbumCursor]]:
+    """
+    从最新一页开始翻页，把游标之后的新图片放入下载队列，遇到游标所在页即停止。
+    没有游标的 uid（首次运行）只取 since 之后的图片。
+    新图片超过 MAX_PAGE 页（如漏跑了几天）时继续翻页直到游标，游标不会越过未取到的图片。
+
+    返回:
+        Tuple[int, Optional[AlbumCursor]]: 放入下载队列的图片数量，以及新的游标；
+        翻页中途失败时游标为 None，保持原游标不变，下次运行会重新补齐
+    """
+    if len(uid) == 0 or len(cookie) == 0:
+        logger.warning("Empty uid or cookie!")
+        return 0, None
+
+    if cursor:
+        logger.info(
+            f"uid: {uid}, cursor: {cursor.photo_id}, "
+            f"time: {bj_time_str(cursor.timestamp)}"
         )
+    else:
+        logger.info(f"uid: {uid}, no cursor, since: {bj_time_str(since)}")
+
+    count = 0
+    newest = cursor
+    # 相册按时间倒序，游标图片之后的图片（包括同一秒上传的）都已入库
+    passed = False
+    for p in itertools.count(1):
+        if p == MAX_PAGE + 1:
+            logger.warning(f"⚠️ {uid} has more than {MAX_PAGE} pages of new photos")
+        data = await fetch_album_page(logger, session, uid, cookie, p)
+        if data is None:
+            return count, None
+
+        reached = len(data.photo_list) == 0
+        for photo in data.photo_list:
+            if cursor is not None:
+                passed = passed or photo.photo_id == cursor.photo_id
+                seen = passed or cursor.reached(photo)
+            else:
+                seen = photo.timestamp < since
+            if seen:
+                reached = True
+                continue
+            queue.put_nowait((uid, photo))
+            count += 1
+            if newest is None or photo.timestamp > newest.timestamp:
+                newest = AlbumCursor(photo_id=photo.photo_id, timestamp=photo.timestamp)
+
+        # total 为相册图片总数，翻到最后一页也停止
+        if reached or (data.total > 0 and p >= math.ceil(data.total / PAGE_SIZE)):
+            break
+
+    return count, newest
+
+
+async def crawl_all_albums(
+    logger: Logger,
+    uids: List[str],
+    cookie: str,
+    cursors: Dict[str, AlbumCursor],
+    since: int,
+) -> Dict[str, Tuple[int, Optional[AlbumCursor]]]:
+    """
+    在同一个事件循环、同一个 aiohttp 会话中并发翻页所有用户的相册，
+    翻页的同时由下载协程从队列中取图下载，全局并发受信号量限制
+
+    返回:
+        Dict[str, Tuple[int, Optional[AlbumCursor]]]: 每个 uid 的新图片数量和新游标
+    """
+    queue: "asyncio.Queue[DownloadTask]" = asyncio.Queue()
+
+    async with get_downloader(logger) as downloader:
+        session = downloader.session
+        workers = [
+            asyncio.create_task(download_worker(queue, downloader))
+            for _ in range(CONCURRENT_LIMIT)
+        ]
         try:
-            response = session.post(url, headers=headers, timeout=10)
-            logger.info(f"Request URL: {response.url}")
-            logger.info(f"Response Text: {response.text.replace('\n', '')}")
-        except requests.RequestException as e:
-            logger.error(f"Request failed: {e}")
-            return []
+            # 先补上次中断或失败的下载，和本次翻页同时进行
+            resume = asyncio.create_task(downloader.download_all([], resume=True))
+            results = await asyncio.gather(
+                *(
+                    get_user_album(
+                        logger, session, queue, uid, cookie, cursors.get(uid), since
+                    )
+                    for uid in uids
+                )
+            )
+            await queue.join()
+            await resume
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        downloader.log_summary()
+
+    return dict(zip(uids, results))
+
 
+def get_backfill_checkpoint_path(uid: str, start_time: int) -> str:
+    return os.path.join(BACKFILL_DIRPATH, f"{uid}_{start_time}.json")
+
+
+def load_backfill_checkpoint(
+    logger: Logger, uid: str, start_time: int, end_time: Optional[int]
+) -> AlbumBackfillCheckpoint:
+    """
+    读取 (uid, start_time) 的回填进度，结束时间保存在进度中
+
+    end_time 为 None（未指定 --end）时沿用进度中的结束时间，隔天继续也不会从头开始；
+    没有进度时取今天零点。指定的 end_time 与进度中的不同时重新开始回填。
+    """
+    filepath = get_backfill_checkpoint_path(uid, start_time)
+    if os.path.exists(filepath):
         try:
-            resp = response.json()
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON decode failed: {e}")
-            return []
-
-        if not resp:
-            logger.warning("Empty response.")
-            return []
-
-        albumResponse = AlbumResponse.model_validate(resp)
-        local_wb_album_list = []
-        for photo in albumResponse.data.photo_list:
-            if photo.timestamp < sart_time or photo.timestamp > end_time:
-                logger.info(
-                    f"❌ skip: {photo.pic_name}, time: {bj_time_str(photo.timestamp)}"
+            with open(filepath, "r", encoding="utf-8") as f:
+                checkpoint = AlbumBackfillCheckpoint.model_validate(json.load(f))
+            if end_time is None or checkpoint.end_time == end_time:
+                return checkpoint
+            logger.info(
+                f"🔄 {uid} backfill end changed from "
+                f"{bj_time_str(checkpoint.end_time)}, start over"
+            )
+        except Exception as e:
+            logger.error(f"❌ Failed to load checkpoint {filepath}: {e}")
+
+    if end_time is None:
+        end_time = get_today_timestamp()
+    return AlbumBackfillCheckpoint(uid=uid, start_time=start_time, end_time=end_time)
+
+
+def save_backfill_checkpoint(checkpoint: AlbumBackfillCheckpoint) -> None:
+    os.makedirs(BACKFILL_DIRPATH, exist_ok=True)
+    filepath = get_backfill_checkpoint_path(checkpoint.uid, checkpoint.start_time)
+    save_json(filepath, checkpoint.model_dump())
+
+
+async def backfill_user_album(
+    logger: Logger,
+    session: ClientSession,
+    uid: str,
+    cookie: str,
+    checkpoint: AlbumBackfillCheckpoint,
+    page_sem: asyncio.Semaphore,
+    downloader: AsyncDownloader,
+) -> AlbumBackfillCheckpoint:
+    """
+    并发翻页回填某个用户 [start_time, end_time) 内的图片。
+    每页的图片全部下载成功后才记录该页完成，中断后重新运行会跳过已完成的页。
+    """
+    if checkpoint.finished:
+        logger.info(f"✅ {uid} backfill already finished, skip!")
+        return checkpoint
+    logger.info(
+        f"🚀 Backfill {uid}: {bj_time_str(checkpoint.start_time)} - "
+        f"{bj_time_str(checkpoint.end_time)}"
+    )
+
+    done = set(checkpoint.done_pages)
+    pages = itertools.count(1)
+    failed: List[int] = []
+
+    def update_last_page(page: int) -> None:
+        if checkpoint.last_page is None or page < checkpoint.last_page:
+            checkpoint.last_page = page
+
+    async def worker() -> None:
+        for p in pages:
+            if checkpoint.last_page is not None and p > checkpoint.last_page:
+                return
+            if len(failed) >= BACKFILL_MAX_FAILURES:
+                return
+            if p in done:
+                continue
+
+            async with page_sem:
+                data = await fetch_album_page(logger, session, uid, cookie, p)
+            if data is None:
+                failed.append(p)
+                continue
+
+            # total 为相册图片总数，据此可以得到最后一页
+            if data.total > 0:
+                update_last_page(math.ceil(data.total / PAGE_SIZE))
+            if len(data.photo_list) == 0:
+                update_last_page(p - 1)
+            elif max(x.timestamp for x in data.photo_list) < checkpoint.start_time:
+                # 相册按时间倒序，之后的页都早于开始时间
+                update_last_page(p)
+
+            photos = [
+                x
+                for x in data.photo_list
+                if checkpoint.start_time <= x.timestamp < checkpoint.end_time
+            ]
+            results = await asyncio.gather(
+                *(downloader.download(*get_image_save_path(uid, x)) for x in photos)
+            )
+            if not all(results):
+                # 有图片下载失败时该页不记为完成，重新运行时再处理
+                logger.warning(
+                    f"⚠️ {uid} page {p}: {results.count(False)} photos failed"
                 )
+                failed.append(p)
                 continue
-            local_wb_album_list.append(photo)
 
-        if len(local_wb_album_list) == 0:
-            break
+            done.add(p)
+            checkpoint.done_pages = sorted(done)
+            save_backfill_checkpoint(checkpoint)
+            logger.info(f"📄 {uid} page {p} done, photos: {len(photos)}")
+
+    await asyncio.gather(*(worker() for _ in range(BACKFILL_CONCURRENT_PAGES)))
 
-        wb_album_list += local_wb_album_list
+    checkpoint.finished = len(failed) == 0
+    save_backfill_checkpoint(checkpoint)
+    if failed:
+        logger.warning(f"⚠️ {uid} backfill failed pages: {sorted(failed)}")
+    return checkpoint
 
-    return wb_album_list
 
+async def backfill_albums(
+    logger: Logger,
+    uids: List[str],
+    cookie: str,
+    start_time: int,
+    end_time: Optional[int],
+) -> Dict[str, bool]:
+    """
+    回填多个用户在 [start_time, end_time) 内的图片，翻页和下载的并发都有上限；
+    end_time 为 None 时沿用各用户回填进度中的结束时间
 
-def get_and_save_photo(logger: Logger, uids: List[str]) -> None:
+    返回:
+        Dict[str, bool]: 每个 uid 是否回填完成
+    """
+    page_sem = asyncio.Semaphore(BACKFILL_CONCURRENT_PAGES)
+
+    async with get_downloader(logger) as downloader:
+        checkpoints = await asyncio.gather(
+            *(
+                backfill_user_album(
+                    logger,
+                    downloader.session,
+                    uid,
+                    cookie,
+                    load_backfill_checkpoint(logger, uid, start_time, end_time),
+                    page_sem,
+                    downloader,
+                )
+                for uid in uids
+            )
+        )
+        downloader.log_summary()
+
+    return {c.uid: c.finished for c in checkpoints}
+
+
+def get_and_save_photo(
+    logger: Logger, uids: List[str], argv: Optional[List[str]] = None
+) -> None:
     """
     获取微博图片并保存到本地
     """
@@ -141,30 +443,48 @@ def get_and_save_photo(logger: Logger, uids: List[str]) -> None:
         epilog="例如：python get_and_save_photo.py --cookie 'pt_key=xxx;pt_pin=yyy;'",
     )
     parser.add_argument("--cookie", required=False, help="WB Cookie，用于身份认证")
-    args = parser.parse_args()
+    parser.add_argument("--uid", action="append", help="只处理指定的 uid，可重复指定")
+    parser.add_argument("--start", help="回填开始日期 YYYY-MM-DD，指定后进入回填模式")
+    parser.add_argument(
+        "--end",
+        help="回填结束日期 YYYY-MM-DD（包含），默认昨天；继续未完成的回填时默认沿用上次的",
+    )
+    args = parser.parse_args(argv)
 
     cookie = args.cookie or os.getenv("WB_COOKIE", "")
-    today = get_today_timestamp()
-    yesterday = today - 24 * 60 * 60
-    for uid in uids:
-        ual = get_user_album(logger, uid, cookie, yesterday, today)
-        if not ual:
-            logger.warning(
-                f"range: {bj_time_str(yesterday)} - {bj_time_str(today)}, {uid} empty!"
-            )
-            continue
+    uids = args.uid or uids
+    if args.start:
+        start_time = date_to_timestamp(args.start)
+        end_time = None
+        if args.end:
+            end_time = date_to_timestamp(args.end) + 24 * 60 * 60
+        finished = asyncio.run(
+            backfill_albums(logger, uids, cookie, start_time, end_time)
+        )
+        for uid, ok in finished.items():
+            if not ok:
+                logger.warning(f"⚠️ {uid} backfill unfinished, rerun to resume")
+        return
+
+    # 没有游标的 uid 只取昨天零点之后的图片
+    yesterday = get_today_timestamp() - 24 * 60 * 60
+    cursors = load_cursors(logger)
+    results = asyncio.run(crawl_all_albums(logger, uids, cookie, cursors, yesterday))
+    for uid, (count, cursor) in results.items():
+        if count == 0:
+            logger.warning(f"{uid} has no new photos!")
+        if cursor:
+            cursors[uid] = cursor
+
+    save_cursors(cursors)
+
 
-        asyncio.run(download_all_images(logger, ual, uid))
+@job(timeout=2 * 60 * 60)
+def run() -> None:
+    # 调度器中运行时不解析命令行，Cookie 从环境变量读取
+    get_and_save_photo(get_logger(use_queue=True), DEFAULT_UIDS, [])
 
 
 if __name__ == "__main__":
-    # 萌宠
-    uid_animal = ["3186116445", "1749139802"]
-    # 明星
-    uid_star = ["1669879400", "3261134763", "1676082433"]
-    # 表情包
-    uid_meme = ["2632260340", "5553432114"]
-
-    uids = uid_animal + uid_star + uid_meme
-    logger = get_logger()
-    get_and_save_photo(logger, uids)
+    logger = get_logger(use_queue=True)
+    get_and_save_photo(logger, DEFAULT_UIDS)
@@ -2,16 +2,14 @@
 # @Author:  Lewis Tian
 # @Date:    2025-04-19 18:15:47
 # @Version: 3.13
-# @Desc:    监控小米13电池服务价格变化
+# @Desc:    导出小米13电池服务价格：价格由 prices.py 按 products.json 轮询，只在变化时
+#           写入 data/prices/13396/{goods_id}；这里把它导出为 csv/xiaomi13.csv 并更新 README
 
 import json
 import os
 import sys
-from datetime import datetime
-from typing import Dict
-from zoneinfo import ZoneInfo
-
-import requests
+from logging import Logger
+from typing import Dict, Iterable
 
 # 添加项目根目录到 sys.path，确保能导入 bootstrap.py
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
@@ -19,83 +17,55 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 import bootstrap  # noqa: F401, E402
-from utils.csver import save_and_clean  # noqa: E402
-from utils.filer import update_readme_with_table  # noqa: E402
+from utils.csver import write_csv  # noqa: E402
+from utils.filer import update_readme_with_series  # noqa: E402
 from utils.logger import get_logger  # noqa: E402
-from utils.timer import get_today_timestamp  # noqa: E402
-
-
-def battery_info() -> Dict[str, str]:
-    logger = get_logger()
-    session = requests.Session()
-    headers = {
-        "referer": "https://www.mi.com/",
-        "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
-    }
-
-    url = "https://api2.order.mi.com/product/view"
-    payload = {
-        "version": "2",
-        "product_id": "13396",
-        "t": str(int(datetime.now(ZoneInfo("Asia/Shanghai")).timestamp())),
-    }
-
-    try:
-        response = session.get(url, params=payload, headers=headers, timeout=10)
-        logger.info(f"Request URL: {response.url}")
-        resp = response.json()
-    except requests.RequestException as e:
-        logger.info(
-            f"Response Text: {response.text.replace('\n', '').replace('  ', '')}"
+from utils.timeseries import TimeSeriesStore, format_value  # noqa: E402
+
+BATTERY_PRODUCT_ID = "13396"
+BATTERY_GOODS = "Xiaomi 13 电池换新服务"
+CURRENT_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+# 与 prices.py 的 RETENTION_DAYS 一致，README 展示一年内的价格变化
+README_DAYS = 366
+
+
+def export_battery(
+    logger: Logger, directory: str, prices: Dict[str, dict], changed: Iterable[str]
+) -> None:
+    """
+    电池服务价格有变化（含首次记录）时，导出价格历史到 csv/xiaomi13.csv 并更新 README
+
+    参数:
+        directory (str): 价格数据目录 data/prices
+        prices (Dict[str, dict]): PriceBook.prices，{product_id}/{goods_id} -> 最新价格
+        changed (Iterable[str]): 本轮价格有变化的键
+    """
+    for key in changed:
+        product_id, _, goods_id = key.partition("/")
+        if product_id != BATTERY_PRODUCT_ID or prices[key]["name"] != BATTERY_GOODS:
+            continue
+
+        logger.info(f"✅ Xiaomi 13 电池换新服务价格：{prices[key]['price']:g}")
+        dirpath = os.path.join(directory, product_id, goods_id)
+        store = TimeSeriesStore.load(dirpath, README_DAYS)
+        rows = [[ts, format_value(values[0])] for ts, values in store.latest()]
+        csv_dir = os.path.join(CURRENT_DIRECTORY, "csv")
+        os.makedirs(csv_dir, exist_ok=True)
+        write_csv(os.path.join(csv_dir, "xiaomi13.csv"), ["timestamp", "price"], rows)
+
+        parent_directory = os.path.dirname(CURRENT_DIRECTORY)
+        update_readme_with_series(
+            logger,
+            dirpath,
+            f"{parent_directory}/README.md",
+            "xiaomi13battery",
+            README_DAYS,
         )
-        logger.error(f"Request failed: {e}")
-        return {}
-    except json.JSONDecodeError as e:
-        logger.error(f"JSON decode failed: {e}")
-        return {}
-
-    if not resp:
-        logger.warning("Empty response.")
-        return {}
-
-    data = resp.get("data", {})
-    goods_list = data.get("goods_list", [])
-
-    result = {}
-    for goods in goods_list:
-        info = goods.get("goods_info", {})
-        name = info.get("name", "")
-        price = info.get("price", "")
-        if name:
-            result[name] = price
-
-    return result
-
-
-def query_and_save_xiaomi13():
-    logger = get_logger()
-    binfo = battery_info()
-    key = "Xiaomi 13 电池换新服务"
-    price = binfo.get(key, "-1")
-    if price != "-1":
-        logger.info(f"✅ 今日 Xiaomi 13 电池换新服务价格：{price}")
-    else:
-        logger.warning("⚠️ 获取失败")
-        return
-
-    current_directory = os.path.dirname(__file__)
-    csv_dir = os.path.join(current_directory, "csv")
-    os.makedirs(csv_dir, exist_ok=True)
-    filepath = os.path.join(csv_dir, "xiaomi13.csv")
-    save_and_clean(
-        filepath, logger, ["timestamp", "price"], [get_today_timestamp(), price], 7
-    )
-
-    parent_directory = os.path.dirname(current_directory)
-    update_readme_with_table(
-        logger, filepath, f"{parent_directory}/README.md", "xiaomi13battery"
-    )
 
 
 if __name__ == "__main__":
-    query_and_save_xiaomi13()
+    # 手动重新导出当前记录的价格
+    directory = os.path.join(CURRENT_DIRECTORY, "data", "prices")
+    with open(os.path.join(directory, "latest.json"), "r", encoding="utf-8") as f:
+        prices = json.load(f)
+    export_battery(get_logger(), directory, prices, prices.keys())
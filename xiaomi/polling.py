@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+# @Author:  Lewis Tian
+# @Date:    2026-10-20 16:12:40
+# @Version: 3.13
+# @Desc:    价格监控的自适应轮询：价格稳定时逐渐放慢，变化后和促销时段内加快
+#
+# 每个商品页的状态保存在 data/prices/poll.json：
+# - interval / next_at：当前轮询间隔和下次轮询时间。价格变化后间隔回到 CHANGED_INTERVAL，
+#   之后每次未变化翻倍，最长 MAX_INTERVAL；促销时段（及开始前 SALE_LEAD 秒）内不超过
+#   SALE_INTERVAL，下次轮询时间也不会越过下一个促销时段的开始
+# - etag / last_modified：接口支持时用于条件请求，304 说明内容没有变化
+# - digest：响应内容的 hash，与上次相同时跳过 JSON 解析和写入
+
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+TIMEZONE = ZoneInfo("Asia/Shanghai")
+# 价格变化后的轮询间隔，之后每次未变化翻倍
+CHANGED_INTERVAL = 300
+MAX_INTERVAL = 4 * 3600
+SALE_INTERVAL = 60
+# 促销开始前多久进入快速轮询
+SALE_LEAD = 600
+# 请求失败后多久重试
+FAILED_INTERVAL = 300
+
+
+class SaleWindow(NamedTuple):
+    """
+    促销时段，两种写法：
+    - "20:00-22:00"：每天的时段，结束早于开始时跨过零点
+    - "2026-11-11 00:00/2026-11-12 00:00"：一次性的时段
+    """
+
+    text: str
+    start: datetime  # 每天的时段只用其时分
+    end: datetime
+    daily: bool
+
+    @classmethod
+    def parse(cls, text: str) -> "SaleWindow":
+        try:
+            if "/" in text:
+                start_text, end_text = text.split("/", 1)
+                start, end = (
+                    datetime.strptime(t.strip(), "%Y-%m-%d %H:%M").replace(
+                        tzinfo=TIMEZONE
+                    )
+                    for t in (start_text, end_text)
+                )
+                daily = False
+            else:
+                start_text, end_text = text.split("-", 1)
+                start, end = (
+                    datetime.strptime(t.strip(), "%H:%M").replace(tzinfo=TIMEZONE)
+                    for t in (start_text, end_text)
+                )
+                daily = True
+        except ValueError as e:
+            raise ValueError(f"invalid sale window: {text!r}") from e
+        if not daily and end <= start:
+            raise ValueError(f"sale window ends before it starts: {text!r}")
+        return cls(text, start, end, daily)
+
+    def next_range(self, now: float) -> Optional[Tuple[float, float]]:
+        """
+        返回正在进行或下一个时段的 (开始, 结束) 时间戳，一次性的时段已结束时返回 None
+        """
+        if not self.daily:
+            if now >= self.end.timestamp():
+                return None
+            return self.start.timestamp(), self.end.timestamp()
+
+        current = datetime.fromtimestamp(now, TIMEZONE)
+        # 从昨天开始找，跨零点的时段可能仍在进行
+        day = current.date() - timedelta(days=1)
+        for _ in range(3):
+            start = datetime.combine(day, self.start.time(), TIMEZONE)
+            end = datetime.combine(day, self.end.time(), TIMEZONE)
+            if end <= start:
+                end += timedelta(days=1)
+            if now < end.timestamp():
+                return start.timestamp(), end.timestamp()
+            day += timedelta(days=1)
+        return None
+
+
+def parse_windows(texts: Iterable[str]) -> Tuple[SaleWindow, ...]:
+    return tuple(SaleWindow.parse(t) for t in texts)
+
+
+class PollPlan:
+    """
+    各商品页的轮询状态，键为 product_id
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.states: Dict[str, dict] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.states = json.load(f)
+
+    def state(self, product_id: str) -> dict:
+        return self.states.setdefault(product_id, {})
+
+    def track_config(self, product_id: str, fingerprint: str) -> bool:
+        """
+        记录商品页的监控配置（如商品名的正则）。配置变化时清除 ETag / Last-Modified
+        和内容 hash 并立即到期，页面内容没变也会重新解析、匹配商品
+
+        返回:
+            bool: 配置是否变化
+        """
+        state = self.state(product_id)
+        if state.get("config") == fingerprint:
+            return False
+        for key in ("etag", "last_modified", "digest", "next_at"):
+            state.pop(key, None)
+        state["config"] = fingerprint
+        return True
+
+    def is_due(self, product_id: str, now: float) -> bool:
+        return self.states.get(product_id, {}).get("next_at", 0) <= now
+
+    def conditional_headers(self, product_id: str) -> Dict[str, str]:
+        state = self.states.get(product_id, {})
+        headers = {}
+        if state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+        if state.get("last_modified"):
+            headers["If-Modified-Since"] = state["last_modified"]
+        return headers
+
+    def reschedule(
+        self,
+        product_id: str,
+        now: float,
+        changed: Optional[bool],
+        windows: Iterable[SaleWindow] = (),
+    ) -> float:
+        """
+        按本次轮询的结果计算下次轮询时间
+
+        参数:
+            changed (Optional[bool]): 价格是否变化，请求失败为 None
+
+        返回:
+            float: 下次轮询的时间戳
+        """
+        state = self.state(product_id)
+        interval = state.get("interval", CHANGED_INTERVAL)
+        if changed is None:
+            wait = min(interval, FAILED_INTERVAL)
+        else:
+            interval = CHANGED_INTERVAL if changed else min(interval * 2, MAX_INTERVAL)
+            wait = interval
+
+        upcoming: List[float] = []
+        for window in windows:
+            time_range = window.next_range(now)
+            if time_range is None:
+                continue
+            start, _ = time_range
+            if start - SALE_LEAD <= now:
+                wait = min(wait, SALE_INTERVAL)
+                interval = min(interval, SALE_INTERVAL)
+            else:
+                upcoming.append(start - SALE_LEAD)
+
+        next_at = min([now + wait] + upcoming)
+        state["interval"] = interval
+        state["next_at"] = next_at
+        return next_at
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.states, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
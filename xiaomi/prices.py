@@ -0,0 +1,419 @@
+# -*- coding: utf-8 -*-
+# @Author:  Lewis Tian
+# @Date:    2026-10-20 15:02:11
+# @Version: 3.13
+# @Desc:    监控多个小米商品的价格：并发请求各商品页，只在价格变化时写入
+#
+# products.json 中每个商品给出 product_id 和要监控的商品名（正则），例如：
+#   {"product_id": "13396", "goods": ["Xiaomi 13 电池换新服务"]}
+# goods 为空时监控该商品页的全部商品。所有商品共用 get_session() 的连接池，
+# 一轮并发请求完成，每个商品页的 goods_list 只解析一次。
+#
+# 上次的价格记在 data/prices/latest.json 中，价格变化的商品才打开对应的时间序列
+# data/prices/{product_id}/{goods_id} 写入一条 (价格, 变化量)。
+#
+# 每次运行只请求到期的商品页，轮询间隔按价格是否变化和促销时段（sale_windows）调整，
+# 见 polling.py；调度器每分钟运行一次即可，没有到期的商品页时不发出请求。
+#
+# 小米13电池服务（product_id 13396）也在 products.json 中，价格变化时由 battery.py
+# 导出原来的 csv/xiaomi13.csv 和 README 表格。
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from logging import Logger
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from battery import export_battery
+from polling import PollPlan, SaleWindow, parse_windows
+
+# 添加项目根目录到 sys.path，确保能导入 bootstrap.py
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+import bootstrap  # noqa: F401, E402
+from utils.capture import CapturedBody  # noqa: E402
+from utils.httper import POOL_MAXSIZE, get_session  # noqa: E402
+from utils.jobs import job  # noqa: E402
+from utils.jsoner import loads  # noqa: E402
+from utils.lazy import lazy_import  # noqa: E402
+from utils.logger import get_logger  # noqa: E402
+from utils.retry import RETRY_STATUS, RetryPolicy, parse_retry_after  # noqa: E402
+from utils.timeseries import TimeSeriesStore  # noqa: E402
+
+requests = lazy_import("requests")
+
+PRODUCT_URL = "https://api2.order.mi.com/product/view"
+HEADERS = {
+    "referer": "https://www.mi.com/",
+    "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
+}
+REQUEST_TIMEOUT = 10
+CURRENT_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CONFIG = os.path.join(CURRENT_DIRECTORY, "products.json")
+PRICE_COLUMNS = ["price", "change"]
+# 价格只在变化时写入，数据量很小，保留一年的原始记录
+RETENTION_DAYS = 366
+# goods_id 会作为目录名，只接受这些字符
+GOODS_ID_PATTERN = re.compile(r"[\w-]+", re.ASCII)
+
+
+class Product(NamedTuple):
+    product_id: str
+    patterns: Tuple[re.Pattern, ...]  # 商品名的正则，为空时匹配全部商品
+    windows: Tuple[SaleWindow, ...] = ()  # 促销时段，含全局的 sale_windows
+
+
+class GoodsPrice(NamedTuple):
+    goods_id: str
+    name: str
+    price: str  # 接口返回的原始字符串，如 "199"
+
+
+def config_fingerprint(product: Product) -> str:
+    """商品名的正则，变化时需要重新解析商品页"""
+    return "\n".join(p.pattern for p in product.patterns)
+
+
+def load_products(path: str = DEFAULT_CONFIG) -> List[Product]:
+    """
+    读取要监控的商品列表，同一个 product_id 出现多次时合并商品名和促销时段
+
+    返回:
+        List[Product]: 配置有误时抛出 ValueError
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"invalid json in {path}: {e}") from e
+
+    shared_windows = parse_windows(data.get("sale_windows", []))
+    patterns: Dict[str, List[re.Pattern]] = {}
+    windows: Dict[str, List[SaleWindow]] = {}
+    for item in data.get("products", []):
+        try:
+            product_id = str(item["product_id"])
+        except KeyError as e:
+            raise ValueError(f"product missing {e}: {item}") from e
+        try:
+            compiled = [re.compile(p) for p in item.get("goods", [])]
+        except re.error as e:
+            raise ValueError(f"invalid goods pattern in {item}: {e}") from e
+        patterns.setdefault(product_id, []).extend(compiled)
+        windows.setdefault(product_id, list(shared_windows)).extend(
+            parse_windows(item.get("sale_windows", []))
+        )
+    return [Product(pid, tuple(p), tuple(windows[pid])) for pid, p in patterns.items()]
+
+
+def safe_goods_id(goods_id: str, name: str) -> str:
+    """
+    goods_id 用作 data/prices/{product_id}/ 下的目录名：没有 id 或含有其它字符时
+    改用名称的 hash，避免名称中的空格、中文、/ 产生嵌套或非法的目录
+    """
+    if GOODS_ID_PATTERN.fullmatch(goods_id):
+        return goods_id
+    return (
+        "name-"
+        + hashlib.blake2b((goods_id or name).encode(), digest_size=8).hexdigest()
+    )
+
+
+def parse_goods(resp: dict) -> List[GoodsPrice]:
+    """
+    解析商品页的 goods_list，跳过没有名称的商品
+    """
+    result = []
+    for goods in (resp.get("data") or {}).get("goods_list") or []:
+        info = goods.get("goods_info") or {}
+        name = info.get("name", "")
+        if not name:
+            continue
+        goods_id = safe_goods_id(str(info.get("goods_id") or ""), name)
+        result.append(GoodsPrice(goods_id, name, str(info.get("price", ""))))
+    return result
+
+
+def request_product(
+    logger: Logger,
+    product_id: str,
+    headers: Optional[Dict[str, str]] = None,
+    retry: Optional[RetryPolicy] = None,
+) -> Optional["requests.Response"]:
+    """
+    请求一个商品页，网络错误和可重试的状态码按 retry 退避重试
+
+    返回:
+        Optional[requests.Response]: 重试后仍失败时返回 None
+    """
+    retry = retry or RetryPolicy(max_retries=2)
+    session = get_session()
+    error = ""
+    for attempt in range(1, retry.attempts + 1):
+        retry_after = None
+        payload = {
+            "version": "2",
+            "product_id": product_id,
+            "t": str(int(datetime.now(ZoneInfo("Asia/Shanghai")).timestamp())),
+        }
+        try:
+            response = session.get(
+                PRODUCT_URL,
+                params=payload,
+                headers={**HEADERS, **(headers or {})},
+                timeout=REQUEST_TIMEOUT,
+            )
+            logger.info(f"Request URL: {response.url}")
+            if response.status_code not in RETRY_STATUS:
+                return response
+            error = f"HTTP {response.status_code}"
+            retry_after = parse_retry_after(response.headers)
+        except requests.RequestException as e:
+            error = str(e) or type(e).__name__
+
+        if attempt < retry.attempts:
+            delay = retry.delay(attempt, retry_after)
+            logger.warning(
+                f"[{product_id}] 请求失败: {error}，{delay:.1f}s 后重试第 {attempt} 次"
+            )
+            time.sleep(delay)
+
+    logger.error(f"[{product_id}] Request failed: {error}")
+    return None
+
+
+def decode_goods(
+    logger: Logger, product_id: str, response: "requests.Response"
+) -> Optional[List[GoodsPrice]]:
+    try:
+        return parse_goods(loads(response.content))
+    except (json.JSONDecodeError, AttributeError) as e:
+        logger.info("Response Text: %s", CapturedBody(response.text))
+        logger.error(f"[{product_id}] JSON decode failed: {e}")
+        return None
+
+
+def fetch_goods(
+    logger: Logger, product_id: str, retry: Optional[RetryPolicy] = None
+) -> Optional[List[GoodsPrice]]:
+    """
+    请求一个商品页并解析其中的全部商品
+
+    返回:
+        Optional[List[GoodsPrice]]: 请求或解析失败时返回 None
+    """
+    response = request_product(logger, product_id, retry=retry)
+    if response is None:
+        return None
+    return decode_goods(logger, product_id, response)
+
+
+class PollResult(NamedTuple):
+    status: str  # fetched / not_modified（304）/ duplicate（内容 hash 相同）/ failed
+    goods: Optional[List[GoodsPrice]] = None  # 仅 fetched 时有值，已按商品名筛选
+    etag: str = ""
+    last_modified: str = ""
+    digest: str = ""
+
+
+def poll_product(logger: Logger, product: Product, plan: PollPlan) -> PollResult:
+    """
+    带上次的 ETag / Last-Modified 发送条件请求；内容 hash 与上次相同时不解析
+    """
+    pid = product.product_id
+    response = request_product(logger, pid, plan.conditional_headers(pid))
+    if response is None:
+        return PollResult("failed")
+    if response.status_code == 304:
+        return PollResult("not_modified")
+
+    etag = response.headers.get("ETag", "")
+    last_modified = response.headers.get("Last-Modified", "")
+    digest = hashlib.blake2b(response.content, digest_size=16).hexdigest()
+    if digest == plan.state(pid).get("digest"):
+        return PollResult("duplicate", None, etag, last_modified, digest)
+
+    goods = decode_goods(logger, pid, response)
+    if goods is None:
+        return PollResult("failed")
+    return PollResult(
+        "fetched", match_goods(product, goods), etag, last_modified, digest
+    )
+
+
+def match_goods(product: Product, goods: List[GoodsPrice]) -> List[GoodsPrice]:
+    if not product.patterns:
+        return goods
+    return [g for g in goods if any(p.search(g.name) for p in product.patterns)]
+
+
+def poll_prices(
+    logger: Logger, products: List[Product], plan: PollPlan
+) -> Dict[str, PollResult]:
+    """
+    并发请求商品页，并发数不超过共用 Session 每个 host 的连接数
+
+    返回:
+        Dict[str, PollResult]: product_id -> 轮询结果
+    """
+    if not products:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(len(products), POOL_MAXSIZE)) as executor:
+        results = executor.map(lambda p: poll_product(logger, p, plan), products)
+        return {p.product_id: r for p, r in zip(products, results)}
+
+
+class PriceBook:
+    """
+    各商品上次记录的价格，键为 {product_id}/{goods_id}；
+    对比后只把变化的价格写入对应商品的时间序列
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path = os.path.join(directory, "latest.json")
+        self.prices: Dict[str, dict] = {}
+        # 本次运行中价格有变化的键
+        self.changed: List[str] = []
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.prices = json.load(f)
+
+    def update(
+        self,
+        logger: Logger,
+        timestamp: int,
+        product_id: str,
+        goods_list: List[GoodsPrice],
+    ) -> int:
+        """
+        记录一个商品页本轮的价格，返回价格变化（含首次出现）的商品数
+        """
+        changed = 0
+        for goods in goods_list:
+            try:
+                price = float(goods.price)
+            except ValueError:
+                logger.warning(f"[{product_id}] {goods.name} 价格无效: {goods.price!r}")
+                continue
+
+            key = f"{product_id}/{goods.goods_id}"
+            last = self.prices.get(key)
+            if last is not None and last["price"] == price:
+                continue
+
+            change = price - last["price"] if last is not None else 0.0
+            store = TimeSeriesStore(
+                os.path.join(self.directory, product_id, goods.goods_id),
+                PRICE_COLUMNS,
+                retention_days=RETENTION_DAYS,
+            )
+            if not store.append(timestamp, [price, change]):
+                continue
+            self.prices[key] = {
+                "name": goods.name,
+                "price": price,
+                "since": timestamp,
+            }
+            changed += 1
+            self.changed.append(key)
+            if last is None:
+                logger.info(f"🆕 [{product_id}] {goods.name}: {goods.price}")
+            else:
+                logger.info(
+                    f"💰 [{product_id}] {goods.name}: {last['price']:g} → {price:g}"
+                )
+        return changed
+
+    def save(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.prices, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def poll_and_save(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="并发监控多个小米商品的价格")
+    parser.add_argument("--config", default=DEFAULT_CONFIG, help="商品列表配置文件")
+    parser.add_argument(
+        "--force", action="store_true", help="忽略轮询间隔，请求全部商品页"
+    )
+    args = parser.parse_args(argv)
+
+    logger = get_logger()
+    products = load_products(args.config)
+    if not products:
+        logger.warning("⚠️ 没有要监控的商品")
+        return
+
+    directory = os.path.join(CURRENT_DIRECTORY, "data", "prices")
+    plan = PollPlan(os.path.join(directory, "poll.json"))
+    for product in products:
+        if plan.track_config(product.product_id, config_fingerprint(product)):
+            logger.info(f"🔧 [{product.product_id}] 监控的商品有变化，重新解析商品页")
+    now = time.time()
+    due = [p for p in products if args.force or plan.is_due(p.product_id, now)]
+    if not due:
+        next_at = min(plan.states[p.product_id]["next_at"] for p in products)
+        logger.info(f"⏳ 没有到期的商品页，{next_at - now:.0f}s 后轮询")
+        return
+
+    start = time.monotonic()
+    polled = poll_prices(logger, due, plan)
+    statuses: Dict[str, int] = {}
+    for result in polled.values():
+        statuses[result.status] = statuses.get(result.status, 0) + 1
+    logger.info(
+        f"✅ {len(due)}/{len(products)} 个商品页到期，耗时 "
+        f"{time.monotonic() - start:.2f}s: "
+        + ", ".join(f"{k} {v}" for k, v in sorted(statuses.items()))
+    )
+
+    book = PriceBook(directory)
+    changed = 0
+    for product in due:
+        result = polled[product.product_id]
+        state = plan.state(product.product_id)
+        if result.status == "failed":
+            logger.warning(f"⚠️ [{product.product_id}] 获取失败")
+            plan.reschedule(product.product_id, now, None, product.windows)
+            continue
+        if result.digest:
+            state.update(
+                etag=result.etag,
+                last_modified=result.last_modified,
+                digest=result.digest,
+            )
+
+        count = 0
+        if result.goods is not None:
+            count = book.update(logger, int(now), product.product_id, result.goods)
+            changed += count
+        if count:
+            state["changed_at"] = now
+        plan.reschedule(product.product_id, now, count > 0, product.windows)
+
+    if changed:
+        book.save()
+        export_battery(logger, directory, book.prices, book.changed)
+    plan.save()
+    logger.info(f"📝 {changed} 个商品价格有变化")
+
+
+@job(timeout=120)
+def run() -> None:
+    poll_and_save([])
+
+
+if __name__ == "__main__":
+    poll_and_save()